@@ -1,89 +1,337 @@
 import pandas as pd
+import numpy as np
 import os
 import glob
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pandas.tseries.api import guess_datetime_format
+
+from perf_utils import RunReport, current_rss_mb, format_rate
+from columnar_store import PartitionedWriter, require_pyarrow
+from pincode_parse import detect_pincode_column
 
 # --- 1. CONFIGURATION ---
 input_folders = ["Biometric", "Demographics", "Enrolment"]
 output_base_folder = "Cleaned_Data"
 raw_base_folder = "raw_data"  # <--- NEW: Define where the raw files live
 
-# --- 2. THE CLEANING LOGIC (Unchanged) ---
-def clean_dataset(df):
-    # A. DATE HANDLING
-    date_col = None
+# --- 2. THE CLEANING LOGIC ---
+STATE_FIXES = {
+    '100000': None, 'Select': None,
+    'Westbengal': 'West Bengal', 'West Bangal': 'West Bengal',
+    'Orissa': 'Odisha', 'Pondicherry': 'Puducherry',
+    'Dadra & Nagar Haveli': 'Dadra and Nagar Haveli and Daman and Diu',
+    'Daman & Diu': 'Dadra and Nagar Haveli and Daman and Diu',
+    'Jammu & Kashmir': 'Jammu and Kashmir',
+    'Andaman & Nicobar Islands': 'Andaman and Nicobar Islands'
+}
+
+DISTRICT_FIXES = {
+    'Namakkal *': 'Namakkal', 'Tuticorin': 'Thoothukkudi',
+    'Kancheepuram': 'Kanchipuram', 'Viluppuram': 'Villupuram',
+    'Thiruvallur': 'Tiruvallur', 'The Nilgiris': 'Nilgiris'
+}
+
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June", "July",
+               "August", "September", "October", "November", "December"]
+
+# Day-first formats tried on a sample of each file. Anything else (e.g. ISO dates,
+# which dayfirst=True reads as year-day-month) keeps the original inferred parsing,
+# pinned to the format pandas infers from the file's first date.
+DATE_FORMATS = ["%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y", "%d-%m-%y", "%d/%m/%y",
+                "%d-%m-%Y %H:%M:%S", "%d/%m/%Y %H:%M:%S",
+                "%d-%b-%Y", "%d %b %Y", "%d-%B-%Y", "%d %B %Y"]
+DATE_SAMPLE_ROWS = 1000
+
+# Raw name -> canonical name, kept for the whole process so later files and
+# chunks only normalize names they have not seen yet
+NAME_CACHE = {'state': {}, 'district': {}}
+
+
+def canonical_name(value, fixes):
+    # Same steps as astype(str).str.strip().str.title() followed by replace(fixes)
+    name = value.strip().title()
+    return fixes.get(name, name)
+
+
+# Normalizes a name column once per distinct value instead of once per row.
+# Returns a categorical; missing names and names fixed to None are missing values.
+def normalize_names(series, fixes, cache):
+    cat = series.astype('category')
+    raw = [str(value) for value in cat.cat.categories]
+    for value in raw:
+        if value not in cache:
+            cache[value] = canonical_name(value, fixes)
+    codes, names = pd.factorize(pd.Series([cache[value] for value in raw], dtype=object))
+    row_codes = cat.cat.codes.to_numpy()
+    new_codes = np.where(row_codes < 0, -1, codes[row_codes] if len(codes) else -1)
+    return pd.Series(pd.Categorical.from_codes(new_codes, categories=names),
+                     index=series.index, name=series.name)
+
+
+def find_date_column(df):
     for col in df.columns:
         if "date" in col.lower():
-            date_col = col
-            break
-    
+            return col
+    return None
+
+
+# Picks the first format that parses every sampled value; None falls back to
+# pandas' own (slower) inference
+def detect_date_format(df):
+    date_col = find_date_column(df)
+    if date_col is None:
+        return None
+    sample = df[date_col].dropna().head(DATE_SAMPLE_ROWS).astype(str)
+    if sample.empty:
+        return None
+    for fmt in DATE_FORMATS:
+        if pd.to_datetime(sample, format=fmt, errors='coerce').notna().all():
+            return fmt
+    # What to_datetime(dayfirst=True) would guess for the whole column. Passing it
+    # explicitly stops each chunk guessing again from its own first value.
+    return guess_datetime_format(sample.iloc[0], dayfirst=True)
+
+
+# Month and Period as categoricals built from the month numbers, not strftime per row
+def month_columns(dates):
+    valid = dates.notna().to_numpy()
+    month = np.where(valid, dates.dt.month.fillna(1).to_numpy(dtype=np.int64) - 1, -1)
+    period = np.where(valid, dates.dt.year.fillna(0).to_numpy(dtype=np.int64) * 12 + month, -1)
+
+    month_cat = pd.Categorical.from_codes(month, categories=MONTH_NAMES)
+    period_codes, period_ids = pd.factorize(period[valid], sort=True)
+    codes = np.full(len(dates), -1, dtype=np.int64)
+    codes[valid] = period_codes
+    period_cat = pd.Categorical.from_codes(
+        codes, categories=[f"{p // 12:04d}-{p % 12 + 1:02d}" for p in period_ids])
+    return (pd.Series(month_cat, index=dates.index), pd.Series(period_cat, index=dates.index))
+
+
+def clean_dataset(df, date_format=None, pin_col=None):
+    # A. DATE HANDLING
+    date_col = find_date_column(df)
+
     if date_col:
-        df[date_col] = pd.to_datetime(df[date_col], dayfirst=True, errors='coerce')
-        df['Month'] = df[date_col].dt.strftime('%B')
+        if date_format:
+            dates = pd.to_datetime(df[date_col], format=date_format, errors='coerce')
+        else:
+            dates = pd.to_datetime(df[date_col], dayfirst=True, errors='coerce')
+        # Period is the year-aware key for 3_calc_severity.py --online (Month alone repeats every year)
+        df['Month'], df['Period'] = month_columns(dates)
         df.drop(columns=[date_col], inplace=True)
-        cols = ['Month'] + [c for c in df.columns if c != 'Month']
+        cols = ['Month', 'Period'] + [c for c in df.columns if c not in ('Month', 'Period')]
         df = df[cols]
 
-    # B. NAME CLEANING
-    if 'state' in df.columns:
-        df['state'] = df['state'].astype(str).str.strip().str.title()
-    if 'district' in df.columns:
-        df['district'] = df['district'].astype(str).str.strip().str.title()
-
-    state_fixes = {
-        '100000': None, 'Select': None,
-        'Westbengal': 'West Bengal', 'West Bangal': 'West Bengal',
-        'Orissa': 'Odisha', 'Pondicherry': 'Puducherry',
-        'Dadra & Nagar Haveli': 'Dadra and Nagar Haveli and Daman and Diu',
-        'Daman & Diu': 'Dadra and Nagar Haveli and Daman and Diu',
-        'Jammu & Kashmir': 'Jammu and Kashmir',
-        'Andaman & Nicobar Islands': 'Andaman and Nicobar Islands'
-    }
-    
-    district_fixes = {
-        'Namakkal *': 'Namakkal', 'Tuticorin': 'Thoothukkudi',
-        'Kancheepuram': 'Kanchipuram', 'Viluppuram': 'Villupuram',
-        'Thiruvallur': 'Tiruvallur', 'The Nilgiris': 'Nilgiris'
-    }
+    # B. PINCODE COLUMN
+    # Headers like "Pin Code" or an unnamed 6-digit column (detected per file) become 'pincode'
+    if pin_col and pin_col != 'pincode' and 'pincode' not in df.columns:
+        df = df.rename(columns={pin_col: 'pincode'})
 
+    # C. NAME CLEANING
     if 'state' in df.columns:
-        df['state'] = df['state'].replace(state_fixes)
+        df['state'] = normalize_names(df['state'], STATE_FIXES, NAME_CACHE['state'])
     if 'district' in df.columns:
-        df['district'] = df['district'].replace(district_fixes)
+        df['district'] = normalize_names(df['district'], DISTRICT_FIXES, NAME_CACHE['district'])
 
     return df
 
-# --- 3. THE PROCESSING LOOP (UPDATED) ---
-for folder in input_folders:
-    # 1. Define Input Path (Inside 'raw/')
-    input_path = os.path.join(raw_base_folder, folder)
-    
-    # 2. Define Output Path (Inside 'Cleaned_Data/')
-    save_folder = os.path.join(output_base_folder, folder)
-    os.makedirs(save_folder, exist_ok=True)
-    
-    # 3. Search for CSVs in the RAW folder
-    csv_files = glob.glob(os.path.join(input_path, "*.csv"))
-    
-    if not csv_files:
-        print(f"No CSV files found in: {input_path}")
-        continue
-        
-    print(f"Processing folder: {folder}...")
-
-    for file_path in csv_files:
+# --- 3. SINGLE FILE PROCESSING ---
+# chunksize = 0 reads the whole file at once (original behaviour).
+# chunksize > 0 streams the file: each chunk is cleaned and appended to the
+# output, so peak memory depends on the chunk size, not the file size.
+# fmt = "parquet" writes typed, Month-partitioned Parquet instead of CSV
+# (see columnar_store.py).
+def process_file(file_path, save_folder, chunksize=0, fmt="csv"):
+    filename = os.path.basename(file_path)
+    save_path = os.path.join(save_folder, filename)
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    peak_rss = current_rss_mb()
+    rows = 0
+    # (date_format, pin_col), detected on the first chunk and reused for the rest of the
+    # file. A None date format (no dates to guess from) is kept too, so detection runs
+    # once per file.
+    formats = None
+
+    # Use latin1 encoding to handle government data issues
+    if chunksize:
+        chunks = pd.read_csv(file_path, low_memory=False, encoding='latin1', chunksize=chunksize)
+    else:
+        chunks = [pd.read_csv(file_path, low_memory=False, encoding='latin1')]
+        peak_rss = max(peak_rss, current_rss_mb())
+
+    if fmt == "parquet":
+        writer = PartitionedWriter(os.path.basename(save_folder), filename)
+        try:
+            for chunk in chunks:
+                if formats is None:
+                    formats = detect_date_format(chunk), detect_pincode_column(chunk)
+                chunk_clean = clean_dataset(chunk, *formats)
+                writer.write(chunk_clean)
+                rows += len(chunk_clean)
+                peak_rss = max(peak_rss, current_rss_mb())
+        finally:
+            writer.close()
+    else:
+        # Write to a temporary file so a failed file never leaves half an output behind
+        part_path = save_path + ".part"
         try:
-            # Use latin1 encoding to handle government data issues
-            df = pd.read_csv(file_path, low_memory=False, encoding='latin1')
-            
-            df_clean = clean_dataset(df)
-            
-            filename = os.path.basename(file_path)
-            save_path = os.path.join(save_folder, filename)
-            df_clean.to_csv(save_path, index=False)
-            
-            print(f"   -> Processed: {filename}")
-            
-        except Exception as e:
-            print(f"   Error with {filename}: {e}")
-
-print("\nDONE. Files cleaned and saved to 'Cleaned_Data/'")
\ No newline at end of file
+            first_chunk = True
+            for chunk in chunks:
+                if formats is None:
+                    formats = detect_date_format(chunk), detect_pincode_column(chunk)
+                chunk_clean = clean_dataset(chunk, *formats)
+                chunk_clean.to_csv(part_path, index=False,
+                                   mode='w' if first_chunk else 'a', header=first_chunk)
+                first_chunk = False
+                rows += len(chunk_clean)
+                peak_rss = max(peak_rss, current_rss_mb())
+        except Exception:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        if not first_chunk:
+            os.replace(part_path, save_path)
+
+    seconds = time.perf_counter() - start
+    return {
+        "file": os.path.join(os.path.basename(save_folder), filename),
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "cpu_seconds": round(time.process_time() - cpu_start, 3),
+        "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+        "peak_rss_mb": round(peak_rss, 1),
+    }
+
+# --- 4. JOB DISCOVERY ---
+# Collects (folder, file_path, save_folder) for every raw CSV.
+# Largest files go first so a worker pool is not left waiting on one big shard.
+def collect_jobs():
+    jobs = []
+    for folder in input_folders:
+        # 1. Define Input Path (Inside 'raw/')
+        input_path = os.path.join(raw_base_folder, folder)
+
+        # 2. Define Output Path (Inside 'Cleaned_Data/')
+        save_folder = os.path.join(output_base_folder, folder)
+        os.makedirs(save_folder, exist_ok=True)
+
+        # 3. Search for CSVs in the RAW folder
+        csv_files = glob.glob(os.path.join(input_path, "*.csv"))
+
+        if not csv_files:
+            print(f"No CSV files found in: {input_path}")
+            continue
+
+        print(f"Found {len(csv_files)} file(s) in folder: {folder}")
+        for file_path in csv_files:
+            jobs.append((folder, file_path, save_folder))
+
+    jobs.sort(key=lambda job: os.path.getsize(job[1]), reverse=True)
+    return jobs
+
+
+def report_processed(stats):
+    print(f"   -> Processed: {stats['file']} "
+          f"({stats['rows']:,} rows, {format_rate(stats['rows'], stats['seconds'])} rows/sec, "
+          f"peak RSS {stats['peak_rss_mb']:,.0f} MB)")
+
+# --- 5. THE PROCESSING LOOP ---
+# workers = 1 runs in this process; workers > 1 cleans files in a process pool.
+# Output filenames are the same either way. Failures are collected, not just printed.
+def run_jobs(jobs, chunksize=0, workers=1, fmt="csv"):
+    results, errors = [], []
+
+    if workers <= 1:
+        for folder, file_path, save_folder in jobs:
+            try:
+                stats = process_file(file_path, save_folder, chunksize, fmt)
+                report_processed(stats)
+                results.append(stats)
+            except Exception as e:
+                print(f"   Error with {os.path.basename(file_path)}: {e}")
+                errors.append((file_path, str(e)))
+        return results, errors
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(process_file, file_path, save_folder, chunksize, fmt): (folder, file_path)
+            for folder, file_path, save_folder in jobs
+        }
+        for future in as_completed(futures):
+            folder, file_path = futures[future]
+            try:
+                stats = future.result()
+                report_processed(stats)
+                results.append(stats)
+            except Exception as e:
+                print(f"   Error with {os.path.basename(file_path)}: {e}")
+                errors.append((file_path, str(e)))
+
+    return results, errors
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Clean raw Aadhaar CSVs into Cleaned_Data/")
+    parser.add_argument("--chunksize", type=int, default=0,
+                        help="Stream each file in chunks of N rows (0 = load whole file)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes cleaning files in parallel (default: 1)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                        help="Output format for Cleaned_Data/ (parquet needs pyarrow)")
+    return parser
+
+
+# Returns (results, errors) so run_pipeline.py can drive this stage in-process
+def run(args):
+    report = RunReport("clean", vars(args))
+    if args.format == "parquet":
+        require_pyarrow()
+        print("Output format: Parquet (Cleaned_Data/parquet/source=*/Month=*)")
+
+    if args.chunksize:
+        print(f"Streaming mode: {args.chunksize:,} rows per chunk")
+
+    jobs = collect_jobs()
+    workers = max(1, min(args.workers, len(jobs)))
+    if workers > 1:
+        print(f"Parallel mode: {workers} worker processes")
+
+    start = time.perf_counter()
+    results, errors = run_jobs(jobs, args.chunksize, workers, args.format)
+    seconds = time.perf_counter() - start
+
+    # Files are timed inside the workers, so their numbers are added as-is
+    for stats in results:
+        report.add(stats['file'], stats['seconds'], rows_in=stats['rows'], rows_out=stats['rows'],
+                   peak_rss_mb=stats['peak_rss_mb'], cpu_seconds=stats['cpu_seconds'])
+    for file_path, message in errors:
+        report.add(os.path.basename(file_path), 0.0, error=message)
+
+    total_rows = sum(r['rows'] for r in results)
+    print(f"\nCleaned {len(results)} file(s), {total_rows:,} rows in {seconds:.1f}s "
+          f"({format_rate(total_rows, seconds)} rows/sec)")
+
+    if errors:
+        print(f"\n[ERR] {len(errors)} file(s) failed:")
+        for file_path, message in errors:
+            print(f"   - {file_path}: {message}")
+
+    report.finish(rows_in=total_rows, rows_out=total_rows)
+    return results, errors
+
+
+def main(argv=None):
+    results, errors = run(build_parser().parse_args(argv))
+    if errors:
+        sys.exit(1)
+
+    print("\nDONE. Files cleaned and saved to 'Cleaned_Data/'")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,86 @@
+import argparse
 import pandas as pd
 
-# 1. Load the RAW Pincode File
+from perf_utils import RunReport
+from pincode_parse import with_pincodes, detect_pincode_column
 
-df = pd.read_csv("raw_data/pincode_india.csv", low_memory=False)
+RAW_PATH = "raw_data/pincode_india.csv"
 
-# 2. Define the Columns we actually need
-# We drop 'officename', 'divisionname' etc. to make the file smaller and faster.
-required_columns = ['pincode', 'district', 'statename', 'latitude', 'longitude']
+def build_parser():
+    parser = argparse.ArgumentParser(description="Clean the raw pincode directory into a master geo file")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                        help="Output format for the master file (parquet needs pyarrow)")
+    return parser
 
-# Check if columns exist (case-sensitive safety check)
-# This handles "PinCode" vs "pincode" issues
-df.columns = df.columns.str.lower().str.strip() # Normalize headers to lowercase
-df = df[['pincode', 'district', 'statename', 'latitude', 'longitude']]
+# Returns the cleaned master frame (also written to Cleaned_Data/)
+def run(args):
+    report = RunReport("pincodes", vars(args))
 
-# 3. CLEANING LOGIC
-print(f"Original Row Count: {len(df)}")
+    # 1. Load the RAW Pincode File
+    with report.step("read") as step:
+        df = pd.read_csv(RAW_PATH, low_memory=False)
+        step.rows_out = len(df)
+    rows_in = len(df)
 
-# A. Remove rows with Missing (NaN) Lat/Long
-df = df.dropna(subset=['latitude', 'longitude'])
+    with report.step("clean", rows_in=len(df)) as step:
+        # 2. Define the Columns we actually need
+        # We drop 'officename', 'divisionname' etc. to make the file smaller and faster.
+        required_columns = ['pincode', 'district', 'statename', 'latitude', 'longitude']
 
-# B. Remove rows where Lat/Long is 0 (Common error in India datasets)
-df = df[(df['latitude'] != 0) & (df['longitude'] != 0)]
+        # Check if columns exist (case-sensitive safety check)
+        # This handles "PinCode" vs "pincode" issues
+        df.columns = df.columns.str.lower().str.strip() # Normalize headers to lowercase
+        if 'pincode' not in df.columns:
+            pin_col = detect_pincode_column(df)
+            if pin_col is not None:
+                df = df.rename(columns={pin_col: 'pincode'})
+        df = df[['pincode', 'district', 'statename', 'latitude', 'longitude']]
 
-# C. Remove Duplicate Pincodes
-# A pincode like 110001 might have 10 Post Offices. We only need the location ONCE.
-df = df.drop_duplicates(subset=['pincode'], keep='first')
+        # 3. CLEANING LOGIC
+        print(f"Original Row Count: {len(df)}")
 
-print(f"Clean Row Count: {len(df)}")
+        # A. Remove rows with Missing (NaN) Lat/Long
+        df = df.dropna(subset=['latitude', 'longitude'])
 
-# 4. DATA TYPE FIX
-# Ensure Pincode is a string (so it doesn't lose leading zeros if any, though India pincodes are 6 digits)
-df['pincode'] = df['pincode'].astype(int) 
+        # B. Remove rows where Lat/Long is 0 (Common error in India datasets)
+        df = df[(df['latitude'] != 0) & (df['longitude'] != 0)]
 
-# 5. SAVE THE PERFECT MASTER FILE
-df.to_csv("Cleaned_Data/pincode_master_clean.csv", index=False)
-print("Success! Created 'pincode_master_clean.csv'. Use this for the merger.")
\ No newline at end of file
+        # C. Parse pincodes to int32 (malformed ones are dropped) before de-duplicating,
+        # so "110001" and "110001.0" count as the same pincode
+        df = with_pincodes(df)
+
+        # D. Remove Duplicate Pincodes
+        # A pincode like 110001 might have 10 Post Offices. We only need the location ONCE.
+        df = df.drop_duplicates(subset=['pincode'], keep='first')
+
+        print(f"Clean Row Count: {len(df)}")
+
+        step.rows_out = len(df)
+
+    with report.step("save", rows_in=len(df)):
+        # 4. SAVE THE PERFECT MASTER FILE
+        if args.format == "parquet":
+            # Typed columns: int32 pincode, categorical district/state
+            from columnar_store import write_master, MASTER_PARQUET
+            write_master(df)
+            print(f"Success! Created '{MASTER_PARQUET}'. Use this for the merger.")
+        else:
+            df.to_csv("Cleaned_Data/pincode_master_clean.csv", index=False)
+            print("Success! Created 'pincode_master_clean.csv'. Use this for the merger.")
+
+    # 5. DIRECT-INDEXED LOOKUP TABLE
+    # Memory-mapped by stages 4 and 5 so the pincode join is a single array gather
+    from pincode_lookup import build_lookup, LOOKUP_PATH
+    with report.step("lookup_table", rows_in=len(df)):
+        build_lookup(df)
+    print(f"Success! Created '{LOOKUP_PATH}' (direct-indexed pincode lookup).")
+
+    report.finish(rows_in=rows_in, rows_out=len(df))
+    return df
+
+def main(argv=None):
+    run(build_parser().parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,20 @@ import pandas as pd
 import numpy as np
 import glob
 import os
-from sklearn.preprocessing import StandardScaler
+import sys
+import time
+import argparse
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from partial_cache import PartialCache, empty_partial, file_sha256, CACHE_DIR
+from severity_engine import (SeverityEngine, aggregate, ema_frame, zone_ema, pincode_zone,
+                             standard_scale, N_ZONES, save_monthly_loads, MONTHLY_LOADS_PATH)
+from perf_utils import RunReport, Step, track, peak_rss_mb
+from online_ema import OnlineEMA, STATE_PATH
+from spill_aggregate import SpillAggregator, chunk_rows_for_budget
+from pincode_parse import with_pincodes, detect_pincode_column, DETECT_SAMPLE_ROWS
+from quantile_sketch import GapSketches, SKETCH_PATH
 
 # --- CONFIGURATION ---
 FOLDERS = {
@@ -13,110 +26,402 @@ FOLDERS = {
 
 MONTH_WEIGHTS = {
     "December": 1.00, "November": 0.75, "October": 0.56, "September": 0.42,
-    "August": 0.32,   "July": 0.24,     "June": 0.18,    "May": 0.13, 
+    "August": 0.32,   "July": 0.24,     "June": 0.18,    "May": 0.13,
     "April": 0.10,    "March": 0.08,    "February": 0.06, "January": 0.04,
     # Short forms
     "Dec": 1.00, "Nov": 0.75, "Oct": 0.56, "Sep": 0.42,
-    "Aug": 0.32, "Jul": 0.24, "Jun": 0.18, "May": 0.13, 
+    "Aug": 0.32, "Jul": 0.24, "Jun": 0.18, "May": 0.13,
     "Apr": 0.10, "Mar": 0.08, "Feb": 0.06, "Jan": 0.04
 }
 
-def clean_pincode(df):
-    if 'pincode' not in df.columns: return df
-    df['pincode'] = df['pincode'].astype(str).str.split('.').str[0].str.replace(r'\D', '', regex=True)
-    return df[df['pincode'].str.len() == 6]
+# Score weights per source: score = sum(weight * age column), columns missing from
+# a file count as 0. These are also the only columns read from Parquet.
+SCORE_WEIGHTS = {
+    "enrolment": {'age_0_5': 1.5, 'age_5_17': 1.2, 'age_18_greater': 1.0},
+    "biometric": {'bio_age_5_17': 1.5, 'bio_age_17_': 1.2},
+    "demographics": {'demo_age_5_17': 1.5, 'demo_age_17_': 1.2},
+}
+SCORE_COLUMNS = {f_type: list(weights) for f_type, weights in SCORE_WEIGHTS.items()}
+
+OUTPUT_PATH = "Cleaned_Data/statistical_gap_analysis.json"
+
+# Order in which sources are fed to the engine
+SOURCE_ORDER = ("enrolment", "biometric", "demographics")
+
+def list_input_files(folder, f_type, fmt="csv"):
+    if fmt == "parquet":
+        from columnar_store import source_files
+        return source_files(os.path.basename(folder))
+    return glob.glob(os.path.join(folder, "*.csv"))
+
+# (columns to read, pincode column). CSV headers vary, so the pincode column is
+# detected on a bounded sample, and only the columns the score needs are parsed.
+def input_columns(f, f_type):
+    if f.endswith(".parquet"):
+        return ['pincode', 'Period'] + SCORE_COLUMNS[f_type], 'pincode'
+    sample = pd.read_csv(f, on_bad_lines='skip', dtype=str, nrows=DETECT_SAMPLE_ROWS)
+    pin_col = detect_pincode_column(sample)
+    wanted = {pin_col, 'Month', 'Period', *SCORE_COLUMNS[f_type]}
+    return [c for c in sample.columns if c in wanted], pin_col
+
+def read_input_file(f, columns):
+    if f.endswith(".parquet"):
+        from columnar_store import read_fragment
+        return read_fragment(f, columns=columns)
+    return pd.read_csv(f, on_bad_lines='skip', usecols=columns, dtype={'Month': str, 'Period': str})
+
+# Same frames as read_input_file, chunk_rows at a time
+def iter_input_chunks(f, columns, chunk_rows):
+    if f.endswith(".parquet"):
+        from columnar_store import iter_fragment
+        return iter_fragment(f, columns=columns, batch_rows=chunk_rows)
+    return pd.read_csv(f, on_bad_lines='skip', usecols=columns, dtype={'Month': str, 'Period': str},
+                       chunksize=chunk_rows)
+
+def prepare_frame(df, f_type, pin_col='pincode'):
+    # Rows without a valid 6-digit pincode are dropped; pincodes become int32
+    df = with_pincodes(df, pin_col)
+
+    # Numeric conversion
+    cols_to_convert = [col for col in df.columns if 'age' in col.lower()]
+    for c in cols_to_convert:
+        df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
+
+    # --- NEW: COUNT TRANSACTIONS ---
+    # Every row in the CSV is treated as 1 transaction instance
+    df['txn_count'] = 1
+    return df
+
+# (pincode, key) -> summed age columns and txn_count for one frame or chunk
+def count_frame(df, f_type, key='Month', pin_col='pincode'):
+    df = prepare_frame(df, f_type, pin_col)
+    values = {col: df[col] if col in df.columns else np.zeros(len(df)) for col in SCORE_COLUMNS[f_type]}
+    values['txn_count'] = df['txn_count']
+    return aggregate(df['pincode'], df[key], values)
 
-def load_and_score(folder, f_type):
+# --- CALCULATE SCORE ---
+# Applied to the (pincode, Month) totals, so it does not matter how the rows were chunked
+def score_counts(counts, f_type):
+    score = np.zeros(len(counts))
+    for col, weight in SCORE_WEIGHTS[f_type].items():
+        score = score + weight * counts[col].to_numpy()
+    return pd.DataFrame({
+        'pincode': counts['pincode'].to_numpy(dtype=np.int32),
+        'Month': counts['Month'].to_numpy(),
+        'score': score,
+        'txn_count': counts['txn_count'].to_numpy().astype(np.int64),
+    })
+
+# Streams the file in budget-sized chunks and spills pre-aggregated chunks to disk
+def spilled_counts(f, f_type, columns, pin_col, key, budget_mb, step=None):
+    sample = next(iter(iter_input_chunks(f, columns, 1000)), None)
+    if sample is None or key not in sample.columns:
+        return None
+    chunk_rows = chunk_rows_for_budget(sample, budget_mb)
+    spill = SpillAggregator(SCORE_COLUMNS[f_type] + ['txn_count'], budget_mb)
+    rows = chunks = 0
+    for chunk in iter_input_chunks(f, columns, chunk_rows):
+        rows += len(chunk)
+        chunks += 1
+        spill.add(count_frame(chunk, f_type, key, pin_col))
+    if step is not None:
+        step.rows_in = rows
+        step.extra.update(chunks=chunks, chunk_rows=chunk_rows, spilled_pieces=spill.pieces)
+    return spill.result()
+
+# Per-file partial aggregate: (pincode, Month) -> score, txn_count (int32 pincodes).
+# key='Period' groups by YYYY-MM instead (online mode); the column is still called 'Month'.
+# budget_mb > 0 uses the out-of-core path; the partial is identical either way.
+def file_partial(f, f_type, step=None, key='Month', budget_mb=0):
+    columns, pin_col = input_columns(f, f_type)
+    if pin_col is None:
+        print(f" [WARN] No pincode column found in {os.path.basename(f)}")
+        return empty_partial()
+
+    if budget_mb:
+        counts = spilled_counts(f, f_type, columns, pin_col, key, budget_mb, step)
+    else:
+        df = read_input_file(f, columns)
+        if step is not None:
+            step.rows_in = len(df)
+        counts = count_frame(df, f_type, key, pin_col) if key in df.columns else None
+
+    if counts is None:
+        print(f" [WARN] '{key}' column missing in {os.path.basename(f)}")
+        return empty_partial()
+
+    return score_counts(counts, f_type)
+
+# Every file is reduced to its own partial and fed to the engine in sorted file
+# order. Cached partials (--incremental) therefore give exactly the same result
+# as a cold run.
+def load_and_score(folder, f_type, engine, fmt="csv", cache=None, report=None, budget_mb=0):
     print(f"Processing {f_type}...")
-    files = glob.glob(os.path.join(folder, "*.csv"))
-    chunk_list = []
+    files = sorted(list_input_files(folder, f_type, fmt))
 
     for f in files:
         try:
-            df = pd.read_csv(f, on_bad_lines='skip', dtype=str)
-            df = clean_pincode(df)
-            
-            # Numeric conversion
-            cols_to_convert = [col for col in df.columns if 'age' in col.lower()]
-            for c in cols_to_convert:
-                df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
-
-            # --- CALCULATE SCORE ---
-            if f_type == "enrolment":
-                c0_5 = df.get('age_0_5', 0)
-                c5_17 = df.get('age_5_17', 0)
-                c18 = df.get('age_18_greater', 0)
-                df['score'] = (1.5 * c0_5) + (1.2 * c5_17) + (1.0 * c18)
-
-            elif f_type == "biometric":
-                c5_17 = df.get('bio_age_5_17', 0)
-                c17_ = df.get('bio_age_17_', 0)
-                df['score'] = (1.5 * c5_17) + (1.2 * c17_)
-
-            elif f_type == "demographics":
-                c5_17 = df.get('demo_age_5_17', 0)
-                c17_ = df.get('demo_age_17_', 0)
-                df['score'] = (1.5 * c5_17) + (1.2 * c17_)
-
-            # --- NEW: COUNT TRANSACTIONS ---
-            # Every row in the CSV is treated as 1 transaction instance
-            df['txn_count'] = 1
-
-            if 'Month' in df.columns:
-                chunk_list.append(df[['pincode', 'Month', 'score', 'txn_count']])
+            with track(report, f"{f_type}/{os.path.basename(f)}") as step:
+                part = cache.get(f, f_type) if cache is not None else None
+                step.extra['cached'] = part is not None
+                if part is None:
+                    part = file_partial(f, f_type, step, budget_mb=budget_mb)
+                    if cache is not None:
+                        cache.put(f, f_type, part)
+                engine.add_partial(f_type, part)
+                step.rows_out = len(part)
+
+        except Exception as e:
+            print(f" [ERR] {e}")
+
+# --- SHARDED MODE (--workers N) ---
+# 1. Input files are reduced to (pincode, Month) partials in a process pool.
+# 2. The partials are split by postal zone and each zone is merged, loaded and
+#    EMA-weighted by its own engine in the pool.
+# 3. The zones' EMA arrays are concatenated and standardized with standard_scale, the
+#    same two-pass StandardScaler replica as the single-process run.
+# Files and cells are added in the same order as a single-process run, so the EMA
+# values are bit-for-bit the same.
+def timed_file_partial(f, f_type, budget_mb=0):
+    step = Step(f"{f_type}/{os.path.basename(f)}")
+    start, cpu_start = time.perf_counter(), time.process_time()
+    part = file_partial(f, f_type, step, budget_mb=budget_mb)
+    step.seconds = time.perf_counter() - start
+    step.cpu_seconds = time.process_time() - cpu_start
+    step.peak_rss_mb = peak_rss_mb()
+    step.rows_out = len(part)
+    step.extra['cached'] = False
+    return part, step
+
+# [(f_type, partial)] in engine order; cached partials are never sent to the pool
+def collect_partials(pool, fmt="csv", cache=None, report=None, budget_mb=0):
+    jobs = []
+    for f_type in SOURCE_ORDER:
+        files = sorted(list_input_files(FOLDERS[f_type], f_type, fmt))
+        print(f"Processing {f_type} ({len(files)} file(s))...")
+        for f in files:
+            part = cache.get(f, f_type) if cache is not None else None
+            future = pool.submit(timed_file_partial, f, f_type, budget_mb) if part is None else None
+            jobs.append((f_type, f, part, future))
+
+    parts = []
+    for f_type, f, part, future in jobs:
+        try:
+            if future is None:
+                if report is not None:
+                    report.add(f"{f_type}/{os.path.basename(f)}", 0.0, rows_out=len(part), cached=True)
             else:
-                print(f" [WARN] 'Month' column missing in {os.path.basename(f)}")
-                
+                part, step = future.result()
+                if report is not None:
+                    report.steps.append(step)
+                if cache is not None:
+                    cache.put(f, f_type, part)
+            parts.append((f_type, part))
         except Exception as e:
             print(f" [ERR] {e}")
+    return parts
+
+# Returns (final_ema, max_nt, monthly, sketches) with the same rows as SeverityEngine.result();
+# the sketches are merged from the zones' sketches (zones never share a pincode)
+def sharded_result(pool, parts, report=None):
+    months = sorted(set().union(*(set(part['Month']) for _, part in parts)))
+    zones = [pincode_zone(part['pincode'].to_numpy()) for _, part in parts]
+
+    futures = []
+    for zone in range(N_ZONES):
+        zone_parts = [(f_type, part[z == zone]) for (f_type, part), z in zip(parts, zones)]
+        if any(len(part) for _, part in zone_parts):
+            futures.append((zone, pool.submit(zone_ema, MONTH_WEIGHTS, months, zone_parts)))
+
+    # Zones come back in zone order, so pincodes stay ascending as in a single engine
+    pins, ema, loads, nts, max_nt = [], [], [], [], 0.0
+    sketches = GapSketches()
+    for zone, future in futures:
+        zone_pins, zone_values, zone_nt, (zone_loads, zone_nts), zone_sketches, seconds = future.result()
+        if report is not None:
+            report.add(f"zone_{zone}_ema", seconds, rows_out=len(zone_values))
+        pins.append(zone_pins)
+        ema.append(zone_values)
+        loads.append(zone_loads)
+        nts.append(zone_nts)
+        max_nt = max(max_nt, zone_nt)
+        sketches.merge(zone_sketches)
+
+    ema = np.concatenate(ema) if ema else np.empty(0)
+    pins = np.concatenate(pins) if pins else np.empty(0, dtype=np.int32)
+    final_ema = ema_frame(pins, ema)
+    with track(report, "z_score", rows_in=len(final_ema)):
+        final_ema['z_score'] = standard_scale(ema)
+    monthly = (pins, months,
+               np.vstack(loads) if loads else np.empty((0, len(months))),
+               np.vstack(nts) if nts else np.empty((0, len(months))))
+    return final_ema, max_nt, monthly, sketches
+
+# --- ONLINE MODE (--online) ---
+# Only files that were never applied are read. Their rows update the persisted
+# per-pincode EMA state (online_ema.py); older files are not touched again.
+def run_online(args, report=None):
+    state = OnlineEMA() if args.rebuild_state else OnlineEMA.load()
+    new_parts, new_files, changed = [], {}, []
+
+    for f_type in SOURCE_ORDER:
+        files = sorted(list_input_files(FOLDERS[f_type], f_type, args.format))
+        for f in files:
+            st = os.stat(f)
+            entry = state.files.get(f)
+            if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                continue
+            sha = file_sha256(f)
+            if entry and entry[2] == sha:
+                state.files[f] = [st.st_size, st.st_mtime_ns, sha]
+                continue
+            if entry:
+                changed.append(f)
+                continue
+            try:
+                with track(report, f"{f_type}/{os.path.basename(f)}") as step:
+                    part = file_partial(f, f_type, step, key='Period', budget_mb=args.memory_budget)
+                    step.rows_out = len(part)
+                    step.extra['cached'] = False
+            except Exception as e:
+                print(f" [ERR] {e}")
+                continue
+            # Files without a Period column are not recorded, so they are retried
+            # after 1_data_parsing.py has been re-run
+            if len(part):
+                new_parts.append(part.rename(columns={'Month': 'Period'}).assign(f_type=f_type))
+                new_files[f] = [st.st_size, st.st_mtime_ns, sha]
+
+    print(f"Online mode: {len(new_files)} new file(s), last applied month {state.latest_period() or 'none'}")
+    if changed:
+        print(f" [WARN] {len(changed)} applied file(s) changed since; their new content is ignored. "
+              f"Run with --rebuild-state to recompute from scratch.")
+
+    with track(report, "online_update") as step:
+        if new_parts:
+            frame = pd.concat(new_parts, ignore_index=True)
+            step.rows_in = len(frame)
+            state.apply(frame)
+        state.files.update(new_files)
+        step.rows_out = len(state.pins)
+    if state.skipped_rows:
+        print(f" [WARN] {state.skipped_rows:,} pincode-month total(s) belong to months that are already closed "
+              f"and were skipped. "
+              f"Run with --rebuild-state to include them.")
+    if not len(state.pins):
+        print(" [ERR] No rows with a Period (YYYY-MM) column to apply. "
+              "Re-run 1_data_parsing.py to add Period, then run --online again.")
+        return None
+
+    state.save()
+    print(f">>> EMA state: {len(state.pins):,} pincodes up to {state.latest_period()} ({STATE_PATH})")
+    with track(report, "z_score", rows_in=len(state.pins)):
+        final_ema = state.result()
+    return (final_ema, float(state.max_nt.max()) if len(state.max_nt) else 0.0, state.monthly_loads(),
+            state.source_sketches())
+
+def export(final_ema, output_path=OUTPUT_PATH, report=None):
+    with track(report, "export", rows_in=len(final_ema)):
+        final_ema = final_ema.sort_values('z_score', ascending=False)
+        final_ema.to_json(output_path, orient='records', indent=4)
+    return final_ema
+
+def print_distribution(name, dist):
+    s = dist.summary()
+    if s['count']:
+        print(f">>> {name}: median {s['p50']:,.2f}, p99 {s['p99']:,.2f}, MAD {s['mad']:,.2f}, "
+              f"skewness {s['skewness']:.2f}, excess kurtosis {s['excess_kurtosis']:.2f}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Compute EMA-weighted gap scores and Z-Scores per pincode")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                        help="Read Cleaned_Data/ as CSV or as the Parquet store from 1_data_parsing.py")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Reuse cached per-file partials; only new or changed files are read")
+    parser.add_argument("--rebuild-cache", action="store_true",
+                        help="Discard the partial cache before an --incremental run")
+    parser.add_argument("--online", action="store_true",
+                        help="Update the persisted per-pincode EMA state with new files only (needs a Period column)")
+    parser.add_argument("--rebuild-state", action="store_true",
+                        help="Discard the online EMA state and rebuild it from all files")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Read files and compute each postal zone in N processes (default: 1)")
+    parser.add_argument("--memory-budget", type=int, default=0, metavar="MB",
+                        help="Stream each file in chunks and spill partial aggregates to disk to stay "
+                             "within about MB megabytes per process (default: read whole files)")
+    return parser
+
+# Returns the exported frame so run_pipeline.py can hand it to stages 4 and 5 in memory
+def run(args):
+    report = RunReport("severity", vars(args))
+    cache = None
+    if args.incremental:
+        if args.rebuild_cache and os.path.isdir(CACHE_DIR):
+            shutil.rmtree(CACHE_DIR)
+        cache = PartialCache()
+
+    # Distribution sketches of EMA_i and of each source's aggregated (pincode, Month) scores
+    sketches = GapSketches()
+
+    if args.online:
+        online = run_online(args, report)
+        if online is None:
+            return None
+        final_ema, max_nt, monthly, sketches.sources = online
+        sketches.ema.add(final_ema['EMA_i'])
+    elif args.workers > 1:
+        print(f"Sharded mode: {args.workers} worker processes, one shard per postal zone")
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            parts = collect_partials(pool, args.format, cache, report, args.memory_budget)
+            if cache is not None:
+                cache.save()
+                print(f">>> Partial cache: {cache.hits} file(s) reused, {cache.misses} file(s) read")
+            print(">>> Computing raw load, EMA and Z-Scores per zone...")
+            final_ema, max_nt, monthly, sketches = sharded_result(pool, parts, report)
+    else:
+        # --- STEP 1: CALCULATE SCORES & COUNTS ---
+        # Each source is accumulated straight into the engine's dense (pincode, Month) arrays
+        engine = SeverityEngine(MONTH_WEIGHTS)
+        for f_type in SOURCE_ORDER:
+            load_and_score(FOLDERS[f_type], f_type, engine, args.format, cache, report, args.memory_budget)
+
+        if cache is not None:
+            cache.save()
+            print(f">>> Partial cache: {cache.hits} file(s) reused, {cache.misses} file(s) read")
+
+        # --- STEPS 2-6: Nt, RAW LOAD, EMA & Z-SCORE ---
+        print(">>> Computing raw load, EMA and Z-Scores...")
+        final_ema = engine.result(report)
+        max_nt = engine.max_nt
+        monthly = engine.monthly
+        sketches.ema.add(final_ema['EMA_i'])
+        for f_type, scores in engine.source_scores():
+            sketches.add_scores(f_type, scores)
+
+    # --- EXPORT ---
+    final_ema = export(final_ema, report=report)
+    # Per-month loads for the rollup cube's month breakdowns
+    with track(report, "monthly_loads", rows_in=len(monthly[0])):
+        save_monthly_loads(*monthly)
+    print(f">>> Monthly loads: {len(monthly[0]):,} pincodes x {len(monthly[1])} month(s) ({MONTHLY_LOADS_PATH})")
+    # Quantile / moment sketches for the percentile and robust severity bands
+    with track(report, "sketches", rows_in=len(final_ema)):
+        sketches.save(SKETCH_PATH)
+    print_distribution("EMA_i distribution", sketches.ema)
+    for f_type in SOURCE_ORDER:
+        if f_type in sketches.sources:
+            print_distribution(f"{f_type} scores", sketches.sources[f_type])
+
+    print(f"\n>>> COMPLETE. Processed {len(final_ema)} pincodes.")
+    print(f">>> Max Transaction Count (Nt) Observed: {max_nt}")
+    rows_in = sum(s.rows_in or 0 for s in report.steps if 'cached' in s.extra)
+    report.finish(rows_in=rows_in, rows_out=len(final_ema))
+    return final_ema
+
+def main(argv=None):
+    if run(build_parser().parse_args(argv)) is None:
+        sys.exit(1)
+
 
-    if not chunk_list: return pd.DataFrame()
-    
-    combined = pd.concat(chunk_list)
-    
-    # Sum both Score AND Transaction Count
-    return combined.groupby(['pincode', 'Month'])[['score', 'txn_count']].sum().reset_index()
-
-# --- STEP 1: CALCULATE SCORES & COUNTS ---
-# Rename columns to identify source (E, B, D)
-df_E = load_and_score(FOLDERS["enrolment"], "enrolment").rename(columns={'score': 'Et', 'txn_count': 'Count_E'})
-df_B = load_and_score(FOLDERS["biometric"], "biometric").rename(columns={'score': 'Bt', 'txn_count': 'Count_B'})
-df_D = load_and_score(FOLDERS["demographics"], "demographics").rename(columns={'score': 'Dt', 'txn_count': 'Count_D'})
-
-# --- STEP 2: MERGE ---
-print(">>> Merging Datasets...")
-merged = pd.merge(df_E, df_B, on=['pincode', 'Month'], how='outer')
-merged = pd.merge(merged, df_D, on=['pincode', 'Month'], how='outer')
-merged.fillna(0, inplace=True)
-
-# --- STEP 3: CALCULATE CORRECTED Nt ---
-# Nt = Sum of all transaction counts across datasets for this month
-merged['Nt'] = merged['Count_E'] + merged['Count_B'] + merged['Count_D']
-
-# --- STEP 4: RAW LOAD CALCULATION ---
-# Formula: (1*Et + 1.2*Dt + 1.5*Bt) / (3 + 1/3 * Nt)
-numerator = (1.0 * merged['Et']) + (1.2 * merged['Dt']) + (1.5 * merged['Bt'])
-denominator = 3.0 + (merged['Nt'] / 3.0)
-
-merged['raw_load_t'] = numerator / denominator
-
-# --- STEP 5: EMA CALCULATION ---
-print(">>> Applying EMA Weights...")
-merged['Wt'] = merged['Month'].map(MONTH_WEIGHTS).fillna(1)
-merged['weighted_load'] = merged['raw_load_t'] * merged['Wt']
-
-final_ema = merged.groupby('pincode')['weighted_load'].sum().reset_index()
-final_ema.rename(columns={'weighted_load': 'EMA_i'}, inplace=True)
-
-# --- STEP 6: Z-SCORE ---
-print(">>> Calculating Z-Scores...")
-scaler = StandardScaler()
-final_ema['z_score'] = scaler.fit_transform(final_ema[['EMA_i']])
-
-# --- EXPORT ---
-output_path = "Cleaned_Data/statistical_gap_analysis.json"
-final_ema = final_ema.sort_values('z_score', ascending=False)
-final_ema.to_json(output_path, orient='records', indent=4)
-
-print(f"\n>>> COMPLETE. Processed {len(final_ema)} pincodes.")
-print(f">>> Max Transaction Count (Nt) Observed: {merged['Nt'].max()}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
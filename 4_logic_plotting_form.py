@@ -1,117 +1,303 @@
 import os
-import pandas as pd
-import folium
-from folium.plugins import HeatMap
-import requests
-from branca.element import Template, MacroElement
+import re
+import glob
 import json
-from shapely.geometry import shape, Point
-from shapely.geometry.polygon import Polygon
+import time
+import calendar
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# folium, branca and shapely (and the modules built on them) are imported by the
+# steps that use them, so --help and failed loads do not pay for them
+from geo_cache import load_boundary, simplified_geometry, VerdictCache
+from pincode_lookup import join_master, lookup_available
+from pincode_parse import parse_pincodes, PIN_MAX
+from severity_engine import load_monthly_loads, standard_scale
+from quantile_sketch import band_codes, ema_reference, BAND_METHODS
+from perf_utils import RunReport
 
 # --- 1. CONFIGURATION ---
 GEOJSON_URL = "https://raw.githubusercontent.com/datameet/maps/master/Country/india-composite.geojson"
+DATA_PATH = "Cleaned_Data/statistical_gap_analysis.json"
+OUTPUT_FILE = "visuals_graphs/India_Map_Service_Coverage.html"
+# --render months: one JSONP data chunk per month, loaded by the page on selection
+CHUNK_DIR = os.path.splitext(OUTPUT_FILE)[0] + "_data"
+
+# (min z-score, radius, opacity, color, label), worst first
+SERVICE_BANDS = [
+    (3.0, 4.0, 0.8, '#ff0033', "Underserved"),
+    (2.0, 3.0, 0.7, '#ff6600', "Moderately Served"),
+    (1.0, 2.0, 0.6, '#ffff00', "Adequately Served"),
+    (float('-inf'), 1.0, 0.4, '#00ffff', "Well Served"),
+]
+
+HEAT_OPTIONS = {'radius': 20, 'blur': 15, 'minOpacity': 0.2,
+                'gradient': {0.4: 'blue', 0.65: 'lime', 1: 'red'}}
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Render the interactive service coverage map")
+    parser.add_argument("--format", choices=["auto", "lookup", "csv", "parquet"], default="auto",
+                        help="Pincode master source: the memory-mapped lookup table, CSV or Parquet "
+                             "(auto = lookup table if 2_pincode_clean.py wrote one, else CSV)")
+    parser.add_argument("--offline", action="store_true",
+                        help="Never download the boundary; use the local cache in Cleaned_Data/geo_cache/")
+    parser.add_argument("--geojson", default=None,
+                        help="Local boundary GeoJSON to use (copied into the cache)")
+    parser.add_argument("--simplify", type=float, default=0.0,
+                        help="Test against a simplified boundary (tolerance in degrees, e.g. 0.001)")
+    parser.add_argument("--render", choices=["markers", "canvas", "months"], default="markers",
+                        help="markers: one CircleMarker + popup per point; "
+                             "canvas: one compact data layer, popups built on click (for 20k+ points); "
+                             "months: canvas layers per month, each loaded from its own data chunk when selected")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Write the --render months data chunks in N processes (default: 1)")
+    parser.add_argument("--bands", choices=BAND_METHODS, default="zscore",
+                        help="Service bands: z-score cutoffs 3/2/1, EMA_i percentiles with the same tail "
+                             "shares, or robust z-scores from the median and MAD (default: zscore)")
+    parser.add_argument("--heatmap", choices=["client", "raster", "none"], default="client",
+                        help="client: browser-side HeatMap; raster: density precomputed here and "
+                             "embedded as images (one per zoom band); none: no heat layer")
+    return parser
+
+def get_band_index(z_scores):
+    # Index into SERVICE_BANDS by z-score
+    z_scores = np.asarray(z_scores, dtype=float)
+    band = np.full(len(z_scores), len(SERVICE_BANDS) - 1)
+    for i in reversed(range(len(SERVICE_BANDS) - 1)):
+        band[z_scores >= SERVICE_BANDS[i][0]] = i
+    return band
+
+# Index into SERVICE_BANDS for --bands. The percentile and robust bands are cut from
+# reference, a QuantileSketch (quantile_sketch.py); None sketches the values given.
+def service_bands(ema, z_scores, method="zscore", reference=None):
+    if method == "zscore":
+        return get_band_index(z_scores)
+    return band_codes(ema, z_scores, method, reference)
 
 # --- 2. LOAD DATA ---
-print(" Loading Data...")
-try:
-    df_data = pd.read_json("Cleaned_Data/statistical_gap_analysis.json", orient='records')
-    df_data['pincode'] = df_data['pincode'].astype(str).str.strip()
-    
-    df_geo = pd.read_csv("Cleaned_Data/pincode_master_clean.csv", dtype=str)
-    df_geo.columns = df_geo.columns.str.lower().str.strip()
-    df_geo['pincode'] = df_geo['pincode'].str.strip().str.split('.').str[0]
-    df_geo['latitude'] = pd.to_numeric(df_geo['latitude'], errors='coerce')
-    df_geo['longitude'] = pd.to_numeric(df_geo['longitude'], errors='coerce')
-    
-    df_final = pd.merge(df_data, df_geo, on='pincode', how='inner')
-    raw_points = df_final.dropna(subset=['latitude', 'longitude', 'z_score'])
+# df_data can be handed over in memory (run_pipeline.py); otherwise it is read from disk
+def load_points(fmt="auto", df_data=None):
+    print(" Loading Data...")
+    try:
+        if df_data is None:
+            df_data = pd.read_json(DATA_PATH, orient='records')
+        df_data = df_data.copy()
+        # int32 keys on both sides of the join
+        df_data['pincode'] = parse_pincodes(df_data['pincode'])
+
+        if fmt == "lookup" or (fmt == "auto" and lookup_available()):
+            # Memory-mapped direct-indexed table: the join is one array gather
+            df_final = join_master(df_data, ['district', 'latitude', 'longitude'])
+        else:
+            if fmt == "parquet":
+                # Typed columns, only the ones the map needs
+                from columnar_store import read_master
+                df_geo = read_master(columns=['pincode', 'district', 'latitude', 'longitude'])
+            else:
+                df_geo = pd.read_csv("Cleaned_Data/pincode_master_clean.csv", dtype=str)
+                df_geo.columns = df_geo.columns.str.lower().str.strip()
+                df_geo['pincode'] = parse_pincodes(df_geo['pincode'])
+                df_geo['latitude'] = pd.to_numeric(df_geo['latitude'], errors='coerce')
+                df_geo['longitude'] = pd.to_numeric(df_geo['longitude'], errors='coerce')
+
+            df_final = pd.merge(df_data, df_geo, on='pincode', how='inner')
+        return df_final.dropna(subset=['latitude', 'longitude', 'z_score'])
 
-except Exception as e:
-    print(f" Error loading data: {e}")
-    exit()
+    except Exception as e:
+        print(f" Error loading data: {e}")
+        return None
 
 # --- 3. POLYGON FILTER ---
-print(" Filtering Points (Official Boundary Check)...")
-try:
-    resp = requests.get(GEOJSON_URL)
-    geo_data = resp.json()
-    india_shape = shape(geo_data['features'][0]['geometry'])
-    
-    def is_inside_india(row):
-        point = Point(row['longitude'], row['latitude'])
-        return india_shape.contains(point)
-
-    valid_data = raw_points[raw_points.apply(is_inside_india, axis=1)].copy()
-
-except Exception:
-    valid_data = raw_points # Fallback
-
-valid_data = valid_data.sort_values(by='z_score', ascending=True)
-
-# --- 4. MAP SETUP ---
-india_map = folium.Map(
-    location=[22.5, 82.0], 
-    zoom_start=5,
-    min_zoom=4,
-    max_bounds=True,
-    tiles='CartoDB dark_matter'
-)
-
-# --- 5. BORDER OVERLAY ---
-folium.GeoJson(
-    geo_data,
-    name="Official Boundary",
-    style_function=lambda x: {
-        'fillColor': 'transparent', 
-        'color': '#ffffff',      
-        'weight': 0.7,           
-        'opacity': 0.8
-    }
-).add_to(india_map)
+def filter_points(raw_points, args):
+    print(" Filtering Points (Official Boundary Check)...")
+    geo_data, geo_hash = load_boundary(GEOJSON_URL, local_path=args.geojson, offline=args.offline)
+
+    if geo_data is None:
+        print(" [WARN] No boundary file available. Skipping the boundary filter and border overlay.")
+        valid_data = raw_points # Fallback
+    else:
+        from shapely.geometry import shape
+        from boundary_filter import BoundaryFilter
+        india_shape = shape(geo_data['features'][0]['geometry'])
+        geometry_key = geo_hash
+        if args.simplify:
+            india_shape = simplified_geometry(india_shape, geo_hash, args.simplify)
+            geometry_key = f"{geo_hash}:simplify={args.simplify:g}"
+
+        # Reuse stored verdicts; only pincodes that are new or moved get tested
+        verdicts = VerdictCache(geometry_key)
+        lon = raw_points['longitude'].to_numpy()
+        lat = raw_points['latitude'].to_numpy()
+        inside, known = verdicts.lookup(raw_points['pincode'], lat, lon)
+
+        todo = ~known
+        if todo.any():
+            # Grid pre-classification + vectorized test against the prepared polygon
+            inside[todo] = BoundaryFilter(india_shape).contains(lon[todo], lat[todo])
+            verdicts.update(raw_points['pincode'][todo], lat[todo], lon[todo], inside[todo])
+            verdicts.save()
+        print(f" Boundary verdicts: {known.sum():,} reused, {todo.sum():,} tested")
+
+        valid_data = raw_points[inside].copy()
+
+    return valid_data.sort_values(by='z_score', ascending=True), geo_data
 
 # --- 6. PLOT POINTS (Service Terminology) ---
-print(" Rendering Map Particles...")
+def band_table():
+    return [{'radius': r, 'opacity': o, 'color': c, 'label': l} for _, r, o, c, l in SERVICE_BANDS]
 
-def get_marker_properties(z_score):
-    # Returns: Radius, Opacity, Color, Text_Label
-    if z_score >= 3.0:   return 4.0, 0.8, '#ff0033', "Underserved"
-    elif z_score >= 2.0: return 3.0, 0.7, '#ff6600', "Moderately Served"
-    elif z_score >= 1.0: return 2.0, 0.6, '#ffff00', "Adequately Served"
-    else:                return 1.0, 0.4, '#00ffff', "Well Served"
+def add_points(india_map, valid_data, args):
+    import folium
+    from folium.plugins import HeatMap
+    from map_layers import CompactPointLayer
 
-for _, row in valid_data.iterrows():
-    radius, opacity, color, label = get_marker_properties(row['z_score'])
-    
-    dist_name = str(row['district']).title()
-    
-    folium.CircleMarker(
-        location=[row['latitude'], row['longitude']],
-        radius=radius,
-        color=color,
-        weight=0, 
-        fill=True,
-        fill_color=color,
-        fill_opacity=opacity,
-        
-        # --- EMPATHY-DRIVEN POPUP ---
-        popup=f"""
-        <div style='font-family:sans-serif; width:160px;'>
-            <b>{dist_name}</b><br>
-            <span style='color:{color}; font-weight:bold;'>{label}</span><br>
-            <span style='font-size:10px; color:#aaa;'>PIN: {row['pincode']}</span>
-        </div>
-        """
+    if args.render == "months":
+        add_month_slices(india_map, valid_data, args)
+        return
+
+    if args.render == "canvas":
+        # One compact data layer on a canvas renderer, popups built on click
+        CompactPointLayer(
+            valid_data['latitude'], valid_data['longitude'], valid_data['z_score'],
+            valid_data['band'], valid_data['pincode'],
+            valid_data['district'].astype(str).str.title(), band_table(),
+            heatmap=(args.heatmap == "client"), heat_options=HEAT_OPTIONS
+        ).add_to(india_map)
+        return
+
+    for _, row in valid_data.iterrows():
+        _, radius, opacity, color, label = SERVICE_BANDS[row['band']]
+
+        dist_name = str(row['district']).title()
+
+        folium.CircleMarker(
+            location=[row['latitude'], row['longitude']],
+            radius=radius,
+            color=color,
+            weight=0,
+            fill=True,
+            fill_color=color,
+            fill_opacity=opacity,
+
+            # --- EMPATHY-DRIVEN POPUP ---
+            popup=f"""
+            <div style='font-family:sans-serif; width:160px;'>
+                <b>{dist_name}</b><br>
+                <span style='color:{color}; font-weight:bold;'>{label}</span><br>
+                <span style='font-size:10px; color:#aaa;'>PIN: {row['pincode']}</span>
+            </div>
+            """
+        ).add_to(india_map)
+
+    # --- 7. HEATMAP ---
+    if args.heatmap == "client":
+        heat_data = valid_data[['latitude', 'longitude', 'z_score']].values.tolist()
+        HeatMap(
+            heat_data, radius=20, blur=15, min_opacity=0.2,
+            gradient={0.4: 'blue', 0.65: 'lime', 1: 'red'}
+        ).add_to(india_map)
+
+# --- 7b. TIME SLICES (--render months) ---
+# Month names (batch mode) sort in calendar order, YYYY-MM periods (--online) as text
+MONTH_ORDER = {name.lower(): i for names in (calendar.month_name, calendar.month_abbr)
+               for i, name in enumerate(names) if name}
+
+def month_sort_key(month):
+    return MONTH_ORDER.get(str(month).lower(), 13), str(month)
+
+# Runs in a worker process with --workers > 1. Writes one chunk and returns its size.
+def write_chunk(path, key, lat, lon, z, band, pins, district_idx, load=None):
+    payload = {
+        'lat': np.round(lat, 5).tolist(),
+        'lon': np.round(lon, 5).tolist(),
+        'z': np.round(z, 3).tolist(),
+        'band': np.asarray(band).tolist(),
+        'pin': pins.astype(str).tolist(),
+        'district': district_idx.tolist(),
+    }
+    if load is not None:
+        payload['load'] = np.round(load, 2).tolist()
+    with open(path, 'w') as f:
+        f.write(f"gapMonthLoaded({json.dumps(key)},{json.dumps(payload, separators=(',', ':'))});\n")
+    return os.path.getsize(path)
+
+# One chunk for the EMA view (the usual z_score) plus one per month with activity.
+# A month's points are its active pincodes, banded (--bands) by that month's raw load.
+def add_month_slices(india_map, valid_data, args):
+    from map_layers import MonthSlices
+
+    lat = valid_data['latitude'].to_numpy(dtype=float)
+    lon = valid_data['longitude'].to_numpy(dtype=float)
+    pins = valid_data['pincode'].to_numpy(dtype=np.int64)
+    districts, district_idx = np.unique(np.asarray(valid_data['district'].astype(str).str.title(), dtype=str),
+                                        return_inverse=True)
+
+    # (key, label, rows of valid_data, z, band, load)
+    slices = [("ema", "All months (EMA)", np.arange(len(pins)), valid_data['z_score'].to_numpy(dtype=float),
+               valid_data['band'].to_numpy(), None)]
+    monthly = load_monthly_loads()
+    if monthly is None:
+        print(" [WARN] Cleaned_Data/monthly_loads.npz not found (run 3_calc_severity.py); only the EMA view is available")
+    else:
+        m_pins, months, loads, _ = monthly
+        row_of = np.full(PIN_MAX + 1, -1, dtype=np.int64)
+        row_of[np.asarray(m_pins, dtype=np.int64)] = np.arange(len(m_pins))
+        rows = row_of[pins]
+        for m in sorted(range(len(months)), key=lambda i: month_sort_key(months[i])):
+            load = np.where(rows >= 0, loads[np.maximum(rows, 0), m], 0.0)
+            active = np.flatnonzero(load > 0)
+            if len(active):
+                z = standard_scale(load[active])
+                slices.append((str(months[m]), str(months[m]), active, z,
+                               service_bands(load[active], z, args.bands), load[active]))
+
+    os.makedirs(CHUNK_DIR, exist_ok=True)
+    for old in glob.glob(os.path.join(CHUNK_DIR, "*.js")):
+        os.remove(old)
+    files = [re.sub(r'[^\w-]', '_', key) + ".js" for key, *_ in slices]
+    tasks = [(os.path.join(CHUNK_DIR, file), key, lat[rows], lon[rows], z, band, pins[rows], district_idx[rows], load)
+             for file, (key, _, rows, z, band, load) in zip(files, slices)]
+    if args.workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(tasks))) as pool:
+            sizes = list(pool.map(write_chunk, *zip(*tasks)))
+    else:
+        sizes = [write_chunk(*task) for task in tasks]
+    print(f" Time slices: {len(tasks)} chunk(s) in {CHUNK_DIR}/ "
+          f"(largest {max(sizes) / 1024:,.0f} KB, total {sum(sizes) / (1024 * 1024):,.1f} MB)")
+
+    # The latest month is shown first; the other chunks load when selected
+    initial = slices[-1][0]
+    MonthSlices(
+        [{'key': key, 'label': label, 'file': file, 'points': len(rows)}
+         for file, (key, label, rows, *_) in zip(files, slices)],
+        os.path.basename(CHUNK_DIR), initial, districts, band_table(),
+        heatmap=(args.heatmap == "client"), heat_options=HEAT_OPTIONS
     ).add_to(india_map)
 
-# --- 7. HEATMAP ---
-heat_data = valid_data[['latitude', 'longitude', 'z_score']].values.tolist()
-HeatMap(
-    heat_data, radius=20, blur=15, min_opacity=0.2,
-    gradient={0.4: 'blue', 0.65: 'lime', 1: 'red'}
-).add_to(india_map)
+def add_density_raster(india_map, valid_data):
+    import folium
+    from map_layers import ZoomSwitch
+    from density_raster import density_levels
+
+    # Density computed once here; one image per zoom band, swapped on zoom. Each level
+    # is encoded to PNG by ImageOverlay before the next one is built.
+    overlays = []
+    for min_zoom, max_zoom, image, (lon_min, lat_min, lon_max, lat_max) in density_levels(
+            valid_data['latitude'], valid_data['longitude'], valid_data['z_score']):
+        overlay = folium.raster_layers.ImageOverlay(
+            image, bounds=[[lat_min, lon_min], [lat_max, lon_max]],
+            mercator_project=False, pixelated=False, control=False, opacity=0.8
+        )
+        del image
+        overlay.add_to(india_map)
+        overlays.append((min_zoom, max_zoom, overlay))
+    ZoomSwitch(overlays).add_to(india_map)
 
 # --- 8. LEGEND (Service Levels) ---
-template = """
+LEGEND_TEMPLATE = """
 {% macro html(this, kwargs) %}
 <div style="
     position: fixed; 
@@ -154,16 +340,81 @@ template = """
 </div>
 {% endmacro %}
 """
-macro = MacroElement()
-macro._template = Template(template)
-india_map.get_root().add_child(macro)
-
-# --- 9. SAVE ---
-output_file = "visuals_graphs/India_Map_Service_Coverage.html"
-folder_name = os.path.dirname(output_file)
-if folder_name and not os.path.exists(folder_name):
-    os.makedirs(folder_name)
-    print(f"Created new folder: {folder_name}")
-
-india_map.save(output_file)
-print(f" SUCCESS! Service-focused map saved to {output_file}")
\ No newline at end of file
+
+def run(args, df_data=None):
+    report = RunReport("map", vars(args))
+    with report.step("load_and_merge") as step:
+        raw_points = load_points(args.format, df_data)
+        if raw_points is not None:
+            step.rows_out = len(raw_points)
+    if raw_points is None:
+        return None
+
+    with report.step("boundary_filter", rows_in=len(raw_points)) as step:
+        valid_data, geo_data = filter_points(raw_points, args)
+        step.rows_out = len(valid_data)
+    # Bands are cut against every pincode's EMA_i (the stored sketch), not only the mapped ones
+    reference = ema_reference() if args.bands != "zscore" else None
+    valid_data['band'] = service_bands(valid_data['EMA_i'], valid_data['z_score'], args.bands, reference)
+
+    # --- 4. MAP SETUP ---
+    import folium
+    from branca.element import Template, MacroElement
+    india_map = folium.Map(
+        location=[22.5, 82.0],
+        zoom_start=5,
+        min_zoom=4,
+        max_bounds=True,
+        tiles='CartoDB dark_matter'
+    )
+
+    # --- 5. BORDER OVERLAY ---
+    if geo_data is not None:
+        folium.GeoJson(
+            geo_data,
+            name="Official Boundary",
+            style_function=lambda x: {
+                'fillColor': 'transparent',
+                'color': '#ffffff',
+                'weight': 0.7,
+                'opacity': 0.8
+            }
+        ).add_to(india_map)
+
+    print(" Rendering Map Particles...")
+    render_start = time.perf_counter()
+    with report.step(f"points_{args.render}", rows_in=len(valid_data)):
+        add_points(india_map, valid_data, args)
+    if args.heatmap == "raster":
+        with report.step("density_raster", rows_in=len(valid_data)):
+            add_density_raster(india_map, valid_data)
+
+    macro = MacroElement()
+    macro._template = Template(LEGEND_TEMPLATE)
+    india_map.get_root().add_child(macro)
+
+    # --- 9. SAVE ---
+    output_file = OUTPUT_FILE
+    folder_name = os.path.dirname(output_file)
+    if folder_name and not os.path.exists(folder_name):
+        os.makedirs(folder_name)
+        print(f"Created new folder: {folder_name}")
+
+    # Folium renders the HTML for every element here, so this is most of the marker cost
+    with report.step("save_html", rows_in=len(valid_data)) as step:
+        india_map.save(output_file)
+        step.extra['html_mb'] = round(os.path.getsize(output_file) / (1024 * 1024), 2)
+    render_seconds = time.perf_counter() - render_start
+    html_bytes = os.path.getsize(output_file)
+    print(f" SUCCESS! Service-focused map saved to {output_file}")
+    print(f" Render mode: {args.render} | {len(valid_data):,} points | "
+          f"{html_bytes / (1024 * 1024):,.1f} MB HTML | generated in {render_seconds:.1f}s")
+    report.finish(rows_in=len(raw_points), rows_out=len(valid_data))
+    return output_file
+
+def main(argv=None):
+    return run(build_parser().parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
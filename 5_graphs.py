@@ -1,163 +1,279 @@
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from rollup_cube import update_cube, top_k, SEVERITY_LEVELS
+from quantile_sketch import BAND_METHODS
+from perf_utils import RunReport, reset_peak_rss, high_water_rss_mb, current_rss_mb
 
-# --- 0. FOLDER SETUP ---
 output_folder = "visuals_graphs"
-if not os.path.exists(output_folder):
-    os.makedirs(output_folder)
-    print(f"Created folder: {output_folder}/")
-else:
-    print(f"Using existing folder: {output_folder}/")
-
-# --- 1. LOAD & PREP DATA ---
-print("Loading EMA Data...")
-
-try:
-    # A. Load EMA Gap Analysis (New File)
-    df_data = pd.read_json("Cleaned_Data/statistical_gap_analysis.json", orient='records')
-    
-    # Ensure pincode is string
-    df_data['pincode'] = df_data['pincode'].astype(str).str.strip()
-    
-    # B. ASSIGN SEVERITY (Since it wasn't in the raw JSON)
-    # Logic: 3+ = Extreme, 2+ = Critical, 1+ = High, 0-1 = Moderate
-    def get_severity(z):
-        if z >= 3.0: return "Extreme"
-        if z >= 2.0: return "Critical"
-        if z >= 1.0: return "High"
-        return "Moderate"
-    
-    df_data['severity'] = df_data['z_score'].apply(get_severity)
-
-    # C. Load Master CSV for Geo-mapping
-    df_geo = pd.read_csv("Cleaned_Data/pincode_master_clean.csv", dtype=str)
-    df_geo.columns = df_geo.columns.str.lower().str.strip()
-    df_geo['pincode'] = df_geo['pincode'].str.strip().str.split('.').str[0]
-
-    # Rename 'statename' to 'state' if needed
-    if 'statename' in df_geo.columns:
-        df_geo.rename(columns={'statename': 'state'}, inplace=True)
-    
-    # Check for required columns
-    if 'state' not in df_geo.columns or 'district' not in df_geo.columns:
-        print("ERROR: Missing 'state' or 'district' columns in master CSV.")
-        exit()
-
-    # D. Merge
-    df_merged = pd.merge(df_data, df_geo, on='pincode', how='inner')
-    
-    if df_merged.empty:
-        print("Error: Merge resulted in 0 rows. Check Master CSV pincode formats.")
-        exit()
-        
-    print(f"Successfully matched {len(df_merged)} records.")
-
-except Exception as e:
-    print(f"Error loading data: {e}")
-    exit()
-
-# Set visual style
-sns.set_theme(style="whitegrid")
-plt.rcParams['font.family'] = 'sans-serif'
 
-# ==========================================
-# PART A: CALCULATE "CRITICALITY INDEX (%)"
-# ==========================================
-print("Calculating Criticality Index...")
+# Figures are written at print quality; --preview writes quick low-resolution
+# copies to visuals_graphs/preview/ and leaves the publication files alone
+PUBLICATION_DPI = 300
+PREVIEW_DPI = 72
+PREVIEW_FOLDER = os.path.join(output_folder, "preview")
 
-# Find the maximum Z-Score in the entire dataset (The "Worst Case")
-max_z = df_merged['z_score'].max()
+# Input-data hash of every saved figure, so unchanged figures are not redrawn
+FIGURE_CACHE = os.path.join("Cleaned_Data", ".figure_hashes.json")
 
-# Calculate Percentage relative to the worst case
-# 100% = The highest EMA stress observed
-df_merged['Criticality_Index'] = (df_merged['z_score'] / max_z) * 100
+def build_parser():
+    parser = argparse.ArgumentParser(description="Generate the Top 200 CSV and statistical charts")
+    parser.add_argument("--format", choices=["auto", "lookup", "csv", "parquet"], default="auto",
+                        help="Pincode master source: the memory-mapped lookup table, CSV or Parquet "
+                             "(auto = lookup table if 2_pincode_clean.py wrote one, else CSV)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Render the figures in N processes (default: 1)")
+    parser.add_argument("--preview", action="store_true",
+                        help=f"Quick {PREVIEW_DPI} dpi copies in {PREVIEW_FOLDER}/ instead of {PUBLICATION_DPI} dpi figures")
+    parser.add_argument("--force", action="store_true",
+                        help="Redraw every figure even if its data has not changed")
+    parser.add_argument("--rebuild-cube", action="store_true",
+                        help="Rebuild the rollup cube from scratch instead of reusing it")
+    parser.add_argument("--bands", choices=BAND_METHODS, default="zscore",
+                        help="Severity bands for the severity chart (see rollup_cube.py; default: zscore)")
+    return parser
 
+# ==========================================
+# PART A: LOAD THE ROLLUP CUBE
+# ==========================================
+# Severity, Criticality Index (% of the worst z-score) and the district / state
+# aggregates are materialized by rollup_cube.py. The cube is only rebuilt when the gap
+# results or the pincode master changed since it was saved.
 
 # ==========================================
 # PART B: EXPORT TOP 200 CSV (Cleaned)
 # ==========================================
-print("Generating Top 200 CSV...")
+def export_top_200(cube):
+    print("Generating Top 200 CSV...")
 
-# 1. Sort by Criticality Index Descending (Worst First)
-top_200 = df_merged.sort_values(by='Criticality_Index', ascending=False).head(200).copy()
+    # 1. Worst 200 by Criticality Index, already selected by the cube (partial selection)
+    top_200 = cube.top_pincodes(200)
 
-# 2. Round to 2 Decimals for clean reading
-top_200['Criticality_Index'] = top_200['Criticality_Index'].round(2)
+    # 2. Round to 2 Decimals for clean reading
+    top_200['Criticality_Index'] = top_200['Criticality_Index'].round(2)
 
-# 3. Select User-Friendly Columns 
-# Note: 'EMA_i' is the internal calculated score, usually we hide it or show it as 'Gap Score'
-csv_output = top_200[['pincode', 'district', 'state', 'severity', 'Criticality_Index']]
-
-# 4. Save to Folder
-csv_path = os.path.join(output_folder, 'Top_200_Critical_EMA_Pincodes.csv')
-csv_output.to_csv(csv_path, index=False)
-print(f"Saved Clean CSV: {csv_path}")
+    # 3. Select User-Friendly Columns
+    # Note: 'EMA_i' is the internal calculated score, usually we hide it or show it as 'Gap Score'
+    csv_output = top_200[['pincode', 'district', 'state', 'severity', 'Criticality_Index']]
 
+    # 4. Save to Folder
+    csv_path = os.path.join(output_folder, 'Top_200_Critical_EMA_Pincodes.csv')
+    csv_output.to_csv(csv_path, index=False)
+    print(f"Saved Clean CSV: {csv_path}")
 
 # ==========================================
 # PART C: VISUALIZATIONS (Saved to Folder)
 # ==========================================
+# Each figure is split into a 'prepare' step (the small frame it plots, built here)
+# and a 'draw' step (run in this process or in a worker process). A figure is only
+# redrawn when the hash of its plot data, the DPI or this script changes.
+
+# matplotlib and seaborn are only imported once a figure actually has to be drawn,
+# so runs where every figure is unchanged (and --help) skip them
+def set_style():
+    import matplotlib
+    matplotlib.use("Agg")  # files only; also safe in worker processes
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set_theme(style="whitegrid")
+    plt.rcParams['font.family'] = 'sans-serif'
 
 # --- VISUAL 1: SEVERITY COUNT ---
-print("Generating Visual 1 (Severity)...")
-plt.figure(figsize=(10, 6))
-order = ['Extreme', 'Critical', 'High', 'Moderate']
-colors = {'Extreme': '#ff0033', 'Critical': '#ff6600', 'High': '#ffd700', 'Moderate': '#00ffff'}
-
-existing_order = [x for x in order if x in df_merged['severity'].unique()]
-ax = sns.countplot(x='severity', data=df_merged, order=existing_order, palette=colors)
-
-for p in ax.patches:
-    if p.get_height() > 0:
-        ax.annotate(f'{int(p.get_height())}', (p.get_x() + p.get_width() / 2., p.get_height()),
-                    ha='center', va='center', fontsize=12, color='black', xytext=(0, 5),
-                    textcoords='offset points')
-
-plt.title('Severity Distribution (EMA Weighted)', fontsize=16, fontweight='bold')
-plt.xlabel('Severity Zone')
-plt.ylabel('Number of Pincodes')
-plt.tight_layout()
-plt.savefig(os.path.join(output_folder, 'Visual_1_EMA_Severity.png'), dpi=300)
+def severity_data(cube):
+    return pd.DataFrame({'severity': np.array(SEVERITY_LEVELS, dtype=object)[cube.severity]})
+
+def draw_severity(data):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig = plt.figure(figsize=(10, 6))
+    order = SEVERITY_LEVELS
+    colors = {'Extreme': '#ff0033', 'Critical': '#ff6600', 'High': '#ffd700', 'Moderate': '#00ffff'}
+
+    existing_order = [x for x in order if x in data['severity'].unique()]
+    ax = sns.countplot(x='severity', data=data, order=existing_order, palette=colors)
+
+    for p in ax.patches:
+        if p.get_height() > 0:
+            ax.annotate(f'{int(p.get_height())}', (p.get_x() + p.get_width() / 2., p.get_height()),
+                        ha='center', va='center', fontsize=12, color='black', xytext=(0, 5),
+                        textcoords='offset points')
+
+    plt.title('Severity Distribution (EMA Weighted)', fontsize=16, fontweight='bold')
+    plt.xlabel('Severity Zone')
+    plt.ylabel('Number of Pincodes')
+    plt.tight_layout()
+    return fig
 
 # --- VISUAL 2: TOP 10 STATES ---
-print("Generating Visual 2 (States)...")
-high_impact = df_merged[df_merged['severity'].isin(['Extreme', 'Critical'])]
+def states_data(cube):
+    # Extreme + Critical pincodes per state, top 10 by partial selection. Equal counts
+    # keep value_counts() order: the state whose first Extreme / Critical pincode comes
+    # first in the results (worst z-score first) wins the tie.
+    states = cube.level_frame("state")
+    states['count'] = states['Extreme'] + states['Critical']
+    high = np.isin(cube.severity, [SEVERITY_LEVELS.index('Extreme'), SEVERITY_LEVELS.index('Critical')])
+    high &= cube.pin_state >= 0
+    first = np.full(len(states), len(cube.pin), dtype=np.int64)
+    np.minimum.at(first, cube.pin_state[high], np.flatnonzero(high))
+    states = states[states['count'] > 0]
+    if states.empty:
+        return None
+    rows = top_k(states['count'].to_numpy(dtype=np.float64), 10, ties=first[states.index.to_numpy()])
+    return states.iloc[rows].set_index('state')['count']
 
-if not high_impact.empty:
-    plt.figure(figsize=(12, 8))
-    state_counts = high_impact['state'].value_counts().head(10)
+def draw_states(state_counts):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig = plt.figure(figsize=(12, 8))
     sns.barplot(x=state_counts.values, y=state_counts.index, palette="Reds_r")
-    
+
     plt.title('Top 10 States with Critical EMA Gaps', fontsize=16, fontweight='bold')
     plt.xlabel('Number of Critical Zones')
     plt.tight_layout()
-    plt.savefig(os.path.join(output_folder, 'Visual_2_EMA_State_Impact.png'), dpi=300)
+    return fig
 
 # --- VISUAL 3: TOP 15 DISTRICTS ---
-print("Generating Visual 3 (Districts)...")
-
-# Group by district
-# IMPORTANT: Using 'EMA_i' instead of 'raw_load'
-district_group = df_merged.groupby(['district', 'state']).agg({
-    'EMA_i': 'sum',               # Sum of Exponential Moving Averages
-    'Criticality_Index': 'mean',  # Average Severity
-    'pincode': 'count'
-}).reset_index()
-
-# Rename for clarity
-district_group.columns = ['District', 'State', 'Cumulative_EMA_Gap', 'Avg_Criticality', 'Critical_Pincodes_Count']
-
-# Sort by the cumulative gap
-top_districts = district_group.sort_values(by='Cumulative_EMA_Gap', ascending=False).head(15)
-
-plt.figure(figsize=(12, 8))
-sns.barplot(x='Cumulative_EMA_Gap', y='District', data=top_districts, palette="magma")
-plt.title('Top 15 Districts with Highest EMA Gap Volume', fontsize=16, fontweight='bold')
-plt.xlabel('Cumulative Weighted Demand Score (EMA)')
-plt.ylabel('District')
-plt.tight_layout()
-plt.savefig(os.path.join(output_folder, 'Visual_3_EMA_Top_Districts.png'), dpi=300)
-
-print(f"\n>>> SUCCESS! All files saved in '{output_folder}/'")
\ No newline at end of file
+def districts_data(cube):
+    # Top 15 (district, state) pairs by the cumulative gap
+    # IMPORTANT: Using 'EMA_i' instead of 'raw_load'
+    top = cube.top_groups("district", 'EMA_sum', 15)
+
+    # Rename for clarity
+    return pd.DataFrame({
+        'District': top['district'],
+        'State': top['state'],
+        'Cumulative_EMA_Gap': top['EMA_sum'],            # Sum of Exponential Moving Averages
+        'Avg_Criticality': top['Criticality_mean'],     # Average Severity
+        'Critical_Pincodes_Count': top['pincodes'],
+    })
+
+def draw_districts(top_districts):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig = plt.figure(figsize=(12, 8))
+    sns.barplot(x='Cumulative_EMA_Gap', y='District', data=top_districts, palette="magma")
+    plt.title('Top 15 Districts with Highest EMA Gap Volume', fontsize=16, fontweight='bold')
+    plt.xlabel('Cumulative Weighted Demand Score (EMA)')
+    plt.ylabel('District')
+    plt.tight_layout()
+    return fig
+
+# report step -> (file name, progress label, prepare, draw)
+FIGURES = {
+    "visual_1_severity": ('Visual_1_EMA_Severity.png', "Visual 1 (Severity)", severity_data, draw_severity),
+    "visual_2_states": ('Visual_2_EMA_State_Impact.png', "Visual 2 (States)", states_data, draw_states),
+    "visual_3_districts": ('Visual_3_EMA_Top_Districts.png', "Visual 3 (Districts)", districts_data, draw_districts),
+}
+
+# Runs in a worker process when --workers > 1. The figure is closed right after
+# saving so memory does not grow with the number of figures. Returns (seconds,
+# cpu_seconds, peak_rss_mb), measured in whichever process drew the figure.
+def render_figure(name, data, path, dpi):
+    start, cpu_start = time.perf_counter(), time.process_time()
+    reset_peak_rss()
+    set_style()
+    import matplotlib.pyplot as plt
+    fig = FIGURES[name][3](data)
+    fig.savefig(path, dpi=dpi)
+    peak_rss = max(high_water_rss_mb(), current_rss_mb())
+    plt.close(fig)
+    return time.perf_counter() - start, time.process_time() - cpu_start, peak_rss
+
+def script_hash():
+    with open(os.path.abspath(__file__), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def figure_hash(data, dpi, code_hash):
+    h = hashlib.sha256(f"{code_hash}:{dpi}".encode())
+    if isinstance(data, pd.DataFrame):
+        h.update(repr(list(data.columns)).encode())
+    h.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+def load_figure_hashes(path=FIGURE_CACHE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_figure_hashes(hashes, path=FIGURE_CACHE):
+    with open(path + ".tmp", 'w') as f:
+        json.dump(hashes, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+def render_figures(cube, folder, dpi, workers=1, force=False, report=None):
+    os.makedirs(folder, exist_ok=True)
+    hashes = load_figure_hashes()
+    code_hash = script_hash()
+
+    jobs = []
+    for name, (filename, label, prepare, _) in FIGURES.items():
+        print(f"Generating {label}...")
+        data = prepare(cube)
+        if data is None:
+            continue
+        path = os.path.join(folder, filename)
+        digest = figure_hash(data, dpi, code_hash)
+        if not force and hashes.get(path) == digest and os.path.exists(path):
+            print(f"   Unchanged, kept {path}")
+            if report is not None:
+                report.add(name, 0.0, rows_in=len(data), cached=True)
+            continue
+        jobs.append((name, data, path, digest))
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = [pool.submit(render_figure, name, data, path, dpi) for name, data, path, _ in jobs]
+            timings = [future.result() for future in futures]
+    else:
+        timings = [render_figure(name, data, path, dpi) for name, data, path, _ in jobs]
+
+    for (name, data, path, digest), (took, cpu, peak_rss) in zip(jobs, timings):
+        hashes[path] = digest
+        if report is not None:
+            report.add(name, took, rows_in=len(data), peak_rss_mb=peak_rss, cpu_seconds=cpu, cached=False)
+    save_figure_hashes(hashes)
+    print(f"Figures: {len(jobs)} drawn, {len(FIGURES) - len(jobs)} unchanged or empty ({dpi} dpi)")
+
+def run(args, df_data=None):
+    # --- 0. FOLDER SETUP ---
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+        print(f"Created folder: {output_folder}/")
+    else:
+        print(f"Using existing folder: {output_folder}/")
+
+    report = RunReport("graphs", vars(args))
+    # df_data can be handed over in memory (run_pipeline.py); otherwise it is read from disk
+    with report.step("rollup_cube") as step:
+        cube = update_cube(args.format, df_data, rebuild=args.rebuild_cube, bands=args.bands)
+        if cube is not None:
+            step.rows_out = len(cube.pin)
+    if cube is None:
+        return None
+
+    with report.step("top_200_csv", rows_in=len(cube.pin)) as step:
+        export_top_200(cube)
+        step.rows_out = min(200, len(cube.pin))
+
+    if args.preview:
+        render_figures(cube, PREVIEW_FOLDER, PREVIEW_DPI, args.workers, args.force, report)
+    else:
+        render_figures(cube, output_folder, PUBLICATION_DPI, args.workers, args.force, report)
+
+    print(f"\n>>> SUCCESS! All files saved in '{output_folder}/'")
+    report.finish(rows_in=len(cube.pin), rows_out=len(cube.pin))
+    return output_folder
+
+def main(argv=None):
+    return run(build_parser().parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+from shapely.geometry import shape, Point
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from boundary_filter import BoundaryFilter  # noqa: E402
+
+# --- BOUNDARY FILTER BENCHMARK ---
+# Compares the original row-by-row test (apply + Point + contains on the unprepared
+# polygon) with BoundaryFilter, checks both give the same mask, and reports the speedup.
+# Run from the project root:
+#   python benchmarks/bench_boundary_filter.py --geojson india-composite.geojson --extra-points 200000
+
+GEOJSON_URL = "https://raw.githubusercontent.com/datameet/maps/master/Country/india-composite.geojson"
+
+
+def load_geometry(source):
+    if os.path.exists(source):
+        with open(source) as f:
+            geo_data = json.load(f)
+    else:
+        import requests
+        geo_data = requests.get(source, timeout=60).json()
+    return shape(geo_data['features'][0]['geometry'])
+
+
+def load_points(master_csv, extra_points, bounds, seed=42):
+    df = pd.read_csv(master_csv, usecols=['latitude', 'longitude']).dropna()
+    if extra_points:
+        # Uniform points over the bounding box (post-office scale stand-in)
+        rng = np.random.default_rng(seed)
+        minx, miny, maxx, maxy = bounds
+        extra = pd.DataFrame({
+            'latitude': rng.uniform(miny, maxy, extra_points),
+            'longitude': rng.uniform(minx, maxx, extra_points),
+        })
+        df = pd.concat([df, extra], ignore_index=True)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the India boundary filter")
+    parser.add_argument("--geojson", default=GEOJSON_URL, help="Local GeoJSON path or URL")
+    parser.add_argument("--master", default="Cleaned_Data/pincode_master_clean.csv")
+    parser.add_argument("--extra-points", type=int, default=0,
+                        help="Add N uniform random points inside the bounding box")
+    parser.add_argument("--skip-baseline", action="store_true",
+                        help="Only time the fast filter (the row-by-row test can take minutes)")
+    args = parser.parse_args()
+
+    geometry = load_geometry(args.geojson)
+    points = load_points(args.master, args.extra_points, geometry.bounds)
+    print(f"Points: {len(points):,}")
+
+    start = time.perf_counter()
+    fast = BoundaryFilter(geometry)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    mask_fast = fast.contains(points['longitude'].to_numpy(), points['latitude'].to_numpy())
+    fast_seconds = time.perf_counter() - start
+    print(f"BoundaryFilter: build {build_seconds:.3f}s, test {fast_seconds:.3f}s, "
+          f"{mask_fast.sum():,} inside | grid {fast.stats()}")
+
+    if args.skip_baseline:
+        return
+
+    start = time.perf_counter()
+    mask_slow = points.apply(lambda row: geometry.contains(Point(row['longitude'], row['latitude'])), axis=1).to_numpy()
+    slow_seconds = time.perf_counter() - start
+    print(f"Row-by-row apply: {slow_seconds:.3f}s, {mask_slow.sum():,} inside")
+
+    if not np.array_equal(mask_fast, mask_slow):
+        print(f"[ERR] Masks differ on {(mask_fast != mask_slow).sum()} point(s)")
+        sys.exit(1)
+    print(f"Masks identical. Speedup: {slow_seconds / (build_seconds + fast_seconds):,.1f}x (including grid build)")
+
+
+if __name__ == "__main__":
+    main()
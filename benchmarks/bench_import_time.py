@@ -0,0 +1,94 @@
+import os
+import re
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+# --- STARTUP BENCHMARK ---
+# Runs every entry point with --help in a fresh interpreter under `python -X importtime`
+# and fails (exit code 1) when startup regresses:
+#   - a heavy dependency (scikit-learn, folium, matplotlib, ...) is imported at startup
+#     instead of by the step that needs it
+#   - the median import time is over the entry point's budget
+# Budgets are seconds on a cold container with 1 CPU; --scale adjusts them for slower hosts.
+# Run from anywhere:
+#   python benchmarks/bench_import_time.py
+#   python benchmarks/bench_import_time.py --repeat 5 --scale 1.5
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# entry point -> import-time budget in seconds (pandas alone is ~0.45 s)
+BUDGETS = {
+    "run_pipeline.py": 0.25,
+    "1_data_parsing.py": 1.0,
+    "2_pincode_clean.py": 1.0,
+    "3_calc_severity.py": 1.0,
+    "4_logic_plotting_form.py": 1.0,
+    "5_graphs.py": 1.0,
+    "rollup_cube.py": 1.0,
+    "gap_query.py": 1.0,
+}
+
+# Never imported just to start a script; the stages import them when they run
+HEAVY_MODULES = ("sklearn", "scipy", "folium", "branca", "shapely", "matplotlib", "seaborn", "requests")
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+# One fresh interpreter: (import seconds, wall seconds, top-level package names imported)
+def measure(script):
+    cmd = [sys.executable, "-X", "importtime", os.path.join(REPO_DIR, script), "--help"]
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=REPO_DIR, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{script} --help failed:\n{proc.stderr[-2000:]}")
+
+    total_us, packages = 0, set()
+    for line in proc.stderr.splitlines():
+        m = IMPORT_LINE.match(line)
+        if not m:
+            continue
+        packages.add(m.group(4).split('.')[0])
+        if len(m.group(3)) == 1:  # top-level import: its cumulative time covers the nested ones
+            total_us += int(m.group(2))
+    return total_us / 1e6, wall, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check startup import time of the pipeline scripts")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per script; the median is used (default: 3)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget by this factor")
+    parser.add_argument("--scripts", nargs="+", choices=list(BUDGETS), default=list(BUDGETS))
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'script':<26} {'import':>8} {'wall':>8} {'budget':>8}  heavy modules")
+    for script in args.scripts:
+        runs = [measure(script) for _ in range(args.repeat)]
+        seconds = statistics.median(r[0] for r in runs)
+        wall = statistics.median(r[1] for r in runs)
+        heavy = sorted(set().union(*(r[2] for r in runs)) & set(HEAVY_MODULES))
+        budget = BUDGETS[script] * args.scale
+
+        status = "ok"
+        if heavy:
+            status = "FAIL"
+            failures.append(f"{script} imports {', '.join(heavy)} at startup")
+        if seconds > budget:
+            status = "FAIL"
+            failures.append(f"{script} import time {seconds:.3f}s is over its {budget:.3f}s budget")
+        print(f"{script:<26} {seconds:7.3f}s {wall:7.3f}s {budget:7.3f}s  {', '.join(heavy) or '-'}  {status}")
+
+    if failures:
+        print("\n[ERR] Startup regressed:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print("\n>>> All entry points start within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from quantile_sketch import (QuantileSketch, MomentSketch, band_codes, PERCENTILE_CUTOFFS,  # noqa: E402
+                             MAD_TO_SIGMA, Z_CUTOFFS)
+
+# --- QUANTILE SKETCH ACCURACY CHECK ---
+# Checks the sketches in quantile_sketch.py against exact numpy results and exits
+# with code 1 if a bound is broken:
+#   - every quantile (q = 0, 0.001, ..., 1) is within alpha of the exact value (relative)
+#   - sketches of random shards merge into exactly the sketch of the whole data, and
+#     survive a JSON round trip
+#   - MAD is within alpha * (2 * |median| + MAD)
+#   - merged moments (mean, std, skewness, kurtosis) match numpy to 1e-9 (relative)
+#   - memory stays within max_buckets; past it only the values nearest zero lose accuracy
+# It also reports how many pincodes the percentile / robust bands put in another band
+# than exact quantiles would. Run from the project root:
+#   python benchmarks/bench_quantile_sketch.py
+#   python benchmarks/bench_quantile_sketch.py --size 10000000 --shards 16
+
+DATA_PATH = "Cleaned_Data/statistical_gap_analysis.json"
+MOMENT_TOLERANCE = 1e-9
+
+
+def datasets(size, seed=42):
+    rng = np.random.default_rng(seed)
+    data = {
+        "lognormal": rng.lognormal(2.0, 1.5, size),
+        "pareto (a=1.2)": rng.pareto(1.2, size) * 10,
+        "zero-inflated": np.where(rng.random(size) < 0.3, 0.0, rng.gamma(0.5, 40.0, size)),
+        "signed normal": rng.normal(5.0, 20.0, size),
+    }
+    if os.path.exists(DATA_PATH):
+        with open(DATA_PATH) as f:
+            data["EMA_i (this run)"] = np.array([row['EMA_i'] for row in json.load(f)], dtype=np.float64)
+    return data
+
+
+def exact_moments(x):
+    d = x - x.mean()
+    m2 = (d * d).mean()
+    return {'mean': x.mean(), 'std': np.sqrt(m2),
+            'skewness': (d ** 3).mean() / m2 ** 1.5, 'excess_kurtosis': (d ** 4).mean() / m2 ** 2 - 3.0}
+
+
+def close(a, b, tol):
+    return abs(a - b) <= tol * max(abs(a), abs(b), 1.0)
+
+
+def check(name, x, args, failures):
+    qs = np.linspace(0, 1, 1001)
+    start = time.perf_counter()
+    sketch = QuantileSketch.from_values(x, alpha=args.alpha)
+    seconds = time.perf_counter() - start
+
+    # Quantiles
+    exact = np.quantile(x, qs, method='lower')
+    estimate = sketch.quantile(qs)
+    rel = np.abs(estimate - exact) / np.maximum(np.abs(exact), 1e-300)
+    rel[(exact == 0) & (estimate == 0)] = 0.0
+    if rel.max() > args.alpha * (1 + 1e-9):
+        failures.append(f"{name}: quantile error {rel.max():.4%} over alpha {args.alpha:.2%}")
+
+    # Merge and round trip
+    shards = np.array_split(np.random.default_rng(7).permutation(x), args.shards)
+    merged = QuantileSketch(alpha=args.alpha)
+    moments = MomentSketch()
+    for shard in shards:
+        merged.merge(QuantileSketch.from_values(shard, alpha=args.alpha))
+        moments.merge(MomentSketch.from_values(shard))
+    restored = QuantileSketch.from_dict(json.loads(json.dumps(merged.to_dict())))
+    if not np.array_equal(restored.quantile(qs), estimate) or merged.count != sketch.count:
+        failures.append(f"{name}: merged / restored sketch differs from the single sketch")
+
+    # MAD
+    median = np.quantile(x, 0.5, method='lower')
+    mad = np.quantile(np.abs(x - median), 0.5, method='lower')
+    mad_error = abs(sketch.mad() - mad)
+    mad_bound = args.alpha * (2 * abs(median) + mad) + 1e-12
+    if mad_error > mad_bound:
+        failures.append(f"{name}: MAD error {mad_error:.4g} over its bound {mad_bound:.4g}")
+
+    # Moments
+    summary = moments.summary()
+    for key, value in exact_moments(x).items():
+        if not close(summary[key], value, MOMENT_TOLERANCE):
+            failures.append(f"{name}: merged {key} {summary[key]!r} != exact {value!r}")
+
+    # Memory
+    buckets = len(sketch.pos[1]) + len(sketch.neg[1])
+    if max(len(sketch.pos[1]), len(sketch.neg[1])) > sketch.max_buckets:
+        failures.append(f"{name}: {buckets} buckets over the {sketch.max_buckets} cap")
+
+    # Bands against exact cutoffs (informational; shares near a cutoff can move by one)
+    z = (x - x.mean()) / x.std()
+    cutoffs = np.quantile(x, PERCENTILE_CUTOFFS, method='lower')
+    exact_pct = np.select([x >= c for c in cutoffs], [0, 1, 2], 3)
+    robust = (x - median) / (MAD_TO_SIGMA * mad) if mad > 0 else x - median
+    exact_rob = np.select([robust >= c for c in Z_CUTOFFS], [0, 1, 2], 3)
+    moved_pct = np.mean(band_codes(x, z, "percentile", sketch) != exact_pct)
+    moved_rob = np.mean(band_codes(x, z, "robust", sketch) != exact_rob)
+
+    print(f"{name:<20} {len(x):>11,} {rel.max():>9.4%} {mad_error / max(mad, 1e-300):>9.4%} "
+          f"{buckets:>8,} {len(json.dumps(sketch.to_dict())) / 1024:>7.1f}K {len(x) / seconds / 1e6:>8.1f}M/s "
+          f"{moved_pct:>8.4%} {moved_rob:>8.4%}")
+
+
+# Past max_buckets the lowest buckets are folded together: values above the folded
+# range must stay within alpha
+def check_collapse(args, failures):
+    x = 10 ** np.random.default_rng(3).uniform(-8, 30, args.size)
+    sketch = QuantileSketch.from_values(x, alpha=args.alpha, max_buckets=512)
+    floor = sketch.gamma ** sketch.pos[0]
+    qs = np.linspace(0, 1, 1001)
+    exact = np.quantile(x, qs, method='lower')
+    keep = exact > floor
+    rel = np.abs(sketch.quantile(qs)[keep] - exact[keep]) / exact[keep]
+    if len(sketch.pos[1]) > 512 or rel.max() > args.alpha * (1 + 1e-9):
+        failures.append(f"collapse: {len(sketch.pos[1])} buckets, error {rel.max():.4%} above {floor:.3g}")
+    print(f"\nCapped at 512 buckets: values above {floor:.3g} ({keep.mean():.1%} of quantiles) "
+          f"within {rel.max():.4%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check quantile / moment sketch accuracy against exact numpy")
+    parser.add_argument("--size", type=int, default=1_000_000, help="Values per synthetic dataset")
+    parser.add_argument("--shards", type=int, default=8, help="Shards to sketch separately and merge")
+    parser.add_argument("--alpha", type=float, default=0.01, help="Relative accuracy of the sketch")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'dataset':<20} {'values':>11} {'q error':>9} {'MAD err':>9} {'buckets':>8} {'size':>8} "
+          f"{'update':>10} {'pct band':>8} {'rob band':>8}")
+    for name, x in datasets(args.size).items():
+        check(name, x, args, failures)
+    check_collapse(args, failures)
+
+    if failures:
+        print("\n[ERR] Sketch bounds broken:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print(f"\n>>> All sketches within bounds (alpha {args.alpha:.2%})")
+
+
+if __name__ == "__main__":
+    main()
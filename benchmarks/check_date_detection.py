@@ -0,0 +1,85 @@
+import os
+import sys
+import shutil
+import tempfile
+import importlib.util
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+# --- DATE FORMAT DETECTION CHECK ---
+# 1_data_parsing.py detects a file's date format (and pincode column) once, on its first
+# chunk. This streams two scratch files in small chunks and checks that detection ran
+# once per file and that the output matches the whole-file run:
+#   iso      - ISO dates, which no day-first format matches (detection returns None)
+#   late     - no dates in the first chunk, day-first dates after it
+# Exits with code 1 on a failure. Nothing in Cleaned_Data/ is touched.
+#   python benchmarks/check_date_detection.py
+
+ROWS = 5000
+CHUNKSIZE = 500
+
+
+def load_parsing():
+    spec = importlib.util.spec_from_file_location("parsing_stage", os.path.join(REPO_DIR, "1_data_parsing.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_raw(path, dates):
+    rng = np.random.default_rng(3)
+    pd.DataFrame({
+        'date': dates,
+        'state': rng.choice(["Delhi", "Orissa", "karnataka"], ROWS),
+        'district': rng.choice(["North", "South"], ROWS),
+        'pincode': rng.integers(110000, 860000, ROWS),
+        'age_0_5': rng.integers(0, 9, ROWS),
+    }).to_csv(path, index=False)
+
+
+def main():
+    parsing = load_parsing()
+    detect = parsing.detect_date_format
+    calls = []
+    parsing.detect_date_format = lambda df: calls.append(len(df)) or detect(df)
+
+    days = pd.date_range("2024-01-01", periods=ROWS, freq="h")
+    cases = {
+        "iso": days.strftime("%Y-%m-%d").to_numpy(dtype=object),
+        "late": np.where(np.arange(ROWS) < CHUNKSIZE, None, days.strftime("%d-%m-%Y").to_numpy(dtype=object)),
+    }
+    failures = []
+    work = tempfile.mkdtemp(prefix="date_detection_")
+    try:
+        for name, dates in cases.items():
+            raw = os.path.join(work, f"{name}.csv")
+            write_raw(raw, dates)
+            outputs = {}
+            for chunksize in (0, CHUNKSIZE):
+                folder = os.path.join(work, f"out_{chunksize}")
+                os.makedirs(folder, exist_ok=True)
+                calls.clear()
+                parsing.process_file(raw, folder, chunksize=chunksize)
+                if len(calls) != 1:
+                    failures.append(f"{name}, chunksize {chunksize}: date format detected {len(calls)} times")
+                outputs[chunksize] = pd.read_csv(os.path.join(folder, f"{name}.csv"), dtype=str)
+            if not outputs[0].equals(outputs[CHUNKSIZE]):
+                failures.append(f"{name}: chunked output differs from the whole-file run")
+            print(f"{name:<6} {ROWS:,} rows in chunks of {CHUNKSIZE}: checked")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    if failures:
+        print("\n[ERR] Date format detection:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print("\n>>> Date format detected once per file; chunked output matches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from severity_engine import SeverityEngine, ema_frame  # noqa: E402
+
+# --- EMPTY INPUT CHECK ---
+# An empty drop, or one whose rows are all filtered out, must give an empty result
+# rather than a traceback. Checks ema_frame and SeverityEngine directly, then runs
+# 3_calc_severity.py (single process and --workers 2) in a scratch directory whose
+# only input file has a header and no rows. Exits with code 1 on a failure.
+#   python benchmarks/check_empty_inputs.py
+
+HEADER = "Month,Period,state,district,pincode,age_0_5,age_5_17,age_18_greater\n"
+OUTPUT_PATH = "Cleaned_Data/statistical_gap_analysis.json"
+
+
+def check_frames(failures):
+    for ema in (np.zeros(0), np.zeros((0, 3))):
+        try:
+            frame = ema_frame(np.array([], np.int32), ema)
+        except Exception as e:
+            failures.append(f"ema_frame(empty, shape {ema.shape}) raised {type(e).__name__}: {e}")
+            continue
+        if len(frame) or list(frame.columns) != ['pincode', 'EMA_i']:
+            failures.append(f"ema_frame(empty, shape {ema.shape}) gave {list(frame.columns)}, {len(frame)} rows")
+
+    cases = {
+        "no rows": [],
+        "rows filtered out": [("enrolment", [-1, 1000000], ["January", None], [1.0, 2.0], [1, 1])],
+    }
+    for name, rows in cases.items():
+        engine = SeverityEngine({})
+        try:
+            for f_type, *columns in rows:
+                engine.add(f_type, *columns)
+            result = engine.result()
+        except Exception as e:
+            failures.append(f"SeverityEngine ({name}) raised {type(e).__name__}: {e}")
+            continue
+        if len(result) or list(result.columns) != ['pincode', 'EMA_i', 'z_score']:
+            failures.append(f"SeverityEngine ({name}) gave {list(result.columns)}, {len(result)} rows")
+
+
+def check_stage(failures):
+    work = tempfile.mkdtemp(prefix="empty_inputs_")
+    try:
+        os.makedirs(os.path.join(work, "Cleaned_Data", "Enrolment"))
+        with open(os.path.join(work, "Cleaned_Data", "Enrolment", "empty.csv"), "w") as f:
+            f.write(HEADER)
+        for argv in ([], ["--workers", "2"]):
+            label = " ".join(["3_calc_severity.py"] + argv)
+            proc = subprocess.run([sys.executable, os.path.join(REPO_DIR, "3_calc_severity.py"), *argv],
+                                  cwd=work, capture_output=True, text=True)
+            if proc.returncode != 0:
+                failures.append(f"{label} exited {proc.returncode}:\n{proc.stderr[-1500:]}")
+                continue
+            with open(os.path.join(work, OUTPUT_PATH)) as f:
+                records = json.load(f)
+            if records:
+                failures.append(f"{label} wrote {len(records)} record(s) from an empty input")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def main():
+    failures = []
+    check_frames(failures)
+    check_stage(failures)
+    if failures:
+        print("[ERR] Empty input is not handled:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print(">>> Empty and fully filtered inputs give an empty result")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import os
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from online_ema import OnlineEMA, raw_load, period_name, SOURCE_INDEX  # noqa: E402
+from severity_engine import standard_scale  # noqa: E402
+
+# --- ONLINE EMA DRIFT CHECK ---
+# Feeds OnlineEMA (3_calc_severity.py --online) many months of synthetic pincode totals,
+# one period at a time, with part of every month arriving late as a second file. The
+# result is compared with a from-scratch reference: the EMA summed directly from every
+# month's totals, standardized once. A second run also has gap months: every
+# GAP_EVERY-th month has no on-time file at all, so the next month skips it, and all of
+# its rows arrive late. Exits with code 1 if the EMA or the z-scores drift past the
+# tolerance in either run. Nothing on disk is touched.
+#   python benchmarks/check_online_drift.py
+#   python benchmarks/check_online_drift.py --months 600 --pincodes 50000
+
+TOLERANCE = 1e-8
+GAP_EVERY = 7
+
+
+def month_frames(rng, pins, period, late_share=0.2):
+    # Large, tightly spread loads: the worst case for a sum-of-squares variance
+    frames = []
+    for f_type in SOURCE_INDEX:
+        score = 1e6 + rng.gamma(2.0, 5.0, len(pins))
+        frames.append(pd.DataFrame({'pincode': pins, 'Period': period, 'f_type': f_type,
+                                    'score': score, 'txn_count': 10}))
+    frame = pd.concat(frames, ignore_index=True)
+    late = rng.random(len(frame)) < late_share
+    return frame[~late], frame[late]
+
+
+# EMA and z-scores recomputed from every month's totals
+def ema_reference(monthly_totals, decay, last):
+    ema = sum(decay ** (last - p) * raw_load(totals) for p, totals in monthly_totals.items())
+    return ema, standard_scale(ema)
+
+
+def totals_of(frame, pins):
+    slot = {p: i for i, p in enumerate(pins)}
+    totals = np.zeros((4, len(pins)))
+    codes = frame['pincode'].map(slot).to_numpy()
+    np.add.at(totals, (frame['f_type'].map(SOURCE_INDEX).to_numpy(), codes), frame['score'].to_numpy())
+    np.add.at(totals[3], codes, frame['txn_count'].to_numpy(dtype=np.float64))
+    return totals
+
+
+# Applies every month, each month's late file after the next month's on-time file.
+# Returns the relative EMA error and the z-score error against the reference.
+def run_months(months, n_pins, gaps=False):
+    rng = np.random.default_rng(42)
+    pins = np.sort(rng.choice(np.arange(110000, 860000), n_pins, replace=False)).astype(np.int32)
+    state = OnlineEMA()
+    monthly_totals = {}
+    pending_late = None
+    for i in range(months):
+        period = period_name(2000 * 12 + i)
+        on_time, late = month_frames(rng, pins, period)
+        if gaps and i % GAP_EVERY == GAP_EVERY - 1 and i < months - 1:
+            on_time, late = on_time[:0], pd.concat([on_time, late])
+        state.apply(on_time)
+        if pending_late is not None:
+            state.apply(pending_late)  # last month's late file lands after this month's
+        pending_late = late
+        monthly_totals[i] = totals_of(pd.concat([on_time, late]), pins)
+    state.apply(pending_late)
+
+    result = state.result()
+    ema, z = ema_reference(monthly_totals, state.decay, months - 1)
+    ema_error = np.max(np.abs(result['EMA_i'].to_numpy() - ema) / np.abs(ema))
+    z_error = np.max(np.abs(result['z_score'].to_numpy() - z))
+    return ema, ema_error, z_error
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the online EMA z-scores do not drift over many months")
+    parser.add_argument("--months", type=int, default=120, help="Months to apply (default: 120)")
+    parser.add_argument("--pincodes", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{args.months} months x {args.pincodes:,} pincodes")
+    failed = False
+    for label, gaps in (("late files", False), (f"late files, every {GAP_EVERY}th month only late", True)):
+        ema, ema_error, z_error = run_months(args.months, args.pincodes, gaps)
+        print(f"   {label}")
+        print(f"      EMA relative error      {ema_error:.3e}")
+        print(f"      z-score error           {z_error:.3e}")
+        if not gaps:
+            # The former one-pass formula, for comparison
+            mean = ema.mean()
+            one_pass = np.sqrt(max((ema * ema).sum() / len(ema) - mean * mean, 0.0))
+            print(f"      std: two-pass {ema.std():.10g}, sum-of-squares {one_pass:.10g}")
+        failed |= ema_error > TOLERANCE or z_error > TOLERANCE
+
+    if failed:
+        print(f"\n[ERR] Online EMA drifted past {TOLERANCE:g}")
+        sys.exit(1)
+    print("\n>>> Online EMA matches the from-scratch reference")
+
+
+if __name__ == "__main__":
+    main()
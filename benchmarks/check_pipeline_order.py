@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import run_pipeline  # noqa: E402
+
+# --- PIPELINE ORDER CHECK ---
+# Runs the run_pipeline.py scheduler with stub stages that sleep for a random time and
+# log when they start and end, then checks that no stage started before every selected
+# dependency had finished, and that nothing downstream of a failed stage ran.
+# Exits with code 1 on a violation. Nothing in Cleaned_Data/ is touched.
+#   python benchmarks/check_pipeline_order.py
+#   python benchmarks/check_pipeline_order.py --rounds 20 --jobs 1 2 4
+
+LOG_NAME = "stage_log.jsonl"
+
+
+# Stand-in for run_pipeline.run_stage (top-level so the pool can pickle it)
+def stub_stage(name, argv, df_data=None):
+    start = time.time()
+    time.sleep(random.uniform(0.01, 0.15) + (0.3 if name == "clean" else 0.0))
+    ok = name != os.environ.get("CHECK_FAIL_STAGE")
+    with open(LOG_NAME, 'a') as f:
+        f.write(json.dumps({'name': name, 'start': start, 'end': time.time(), 'ok': ok}) + "\n")
+    return ok, None, time.time() - start
+
+
+def run_once(jobs, fail_stage=None):
+    if os.path.exists(LOG_NAME):
+        os.remove(LOG_NAME)
+    os.environ["CHECK_FAIL_STAGE"] = fail_stage or ""
+    args = run_pipeline.build_parser().parse_args(["--force", "--jobs", str(jobs)])
+    run_pipeline.Pipeline(args).run()
+    with open(LOG_NAME) as f:
+        return {row['name']: row for row in map(json.loads, f)}
+
+
+def violations(log, fail_stage=None):
+    found = []
+    for name, row in log.items():
+        for dep in run_pipeline.STAGES[name]["deps"]:
+            if dep not in log:
+                found.append(f"'{name}' ran although '{dep}' did not")
+            elif row['start'] < log[dep]['end']:
+                found.append(f"'{name}' started {log[dep]['end'] - row['start']:.3f}s before '{dep}' finished")
+            elif not log[dep]['ok']:
+                found.append(f"'{name}' ran after '{dep}' failed")
+    if fail_stage is not None:
+        for name in log:
+            if name != fail_stage and fail_stage in upstream(name):
+                found.append(f"'{name}' ran although '{fail_stage}' failed")
+    return found
+
+
+def upstream(name):
+    deps = set(run_pipeline.STAGES[name]["deps"])
+    for dep in list(deps):
+        deps |= upstream(dep)
+    return deps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that run_pipeline.py never starts a stage before its dependencies finish")
+    parser.add_argument("--rounds", type=int, default=5, help="Runs per --jobs value (default: 5)")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    # Stub stages, and the pipeline state / reports go to a scratch directory
+    run_pipeline.run_stage = stub_stage
+    run_pipeline.fingerprint = lambda *a: "check"
+    work = tempfile.mkdtemp(prefix="pipeline_order_")
+    os.chdir(work)
+    # Empty stand-ins for the raw inputs, so no stage is skipped for lack of input files
+    for path in ["raw_data/Enrolment/stub.csv", "raw_data/pincode_india.csv"]:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "w").close()
+
+    failures = []
+    for jobs in args.jobs:
+        for round_ in range(args.rounds):
+            random.seed(round_)
+            log = run_once(jobs)
+            found = violations(log)
+            if len(log) != len(run_pipeline.STAGES):
+                found.append(f"only {sorted(log)} ran")
+            failures += [f"--jobs {jobs}: {v}" for v in found]
+        log = run_once(jobs, fail_stage="severity")
+        failures += [f"--jobs {jobs}, severity failing: {v}" for v in violations(log, "severity")]
+        print(f"--jobs {jobs}: {args.rounds} run(s) + 1 with a failing stage checked")
+
+    if failures:
+        print("\n[ERR] Stage order broken:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print("\n>>> No stage started before its dependencies finished")
+
+
+if __name__ == "__main__":
+    main()
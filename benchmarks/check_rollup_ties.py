@@ -0,0 +1,103 @@
+import os
+import sys
+import argparse
+import importlib.util
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from rollup_cube import RollupCube, read_results, severity_codes, SEVERITY_LEVELS  # noqa: E402
+
+# --- ROLLUP TIE-ORDER CHECK ---
+# The Top 10 states chart of 5_graphs.py reads the rollup cube. Before the cube it was
+#   df_merged[severity in (Extreme, Critical)]['state'].value_counts().head(10)
+# over the results joined with the master in results order, so equal counts are ordered
+# by the state's first Extreme / Critical pincode. This rebuilds that baseline and
+# compares it with states_data() on:
+#   synthetic - 30 states with only a handful of distinct counts, in shuffled order
+#   results   - the real results and pincode master, when run from the project root
+# Exits with code 1 if the states or their order differ.
+#   python benchmarks/check_rollup_ties.py
+
+MASTER_CSV = "Cleaned_Data/pincode_master_clean.csv"
+
+
+def load_graphs():
+    spec = importlib.util.spec_from_file_location("graphs_stage", os.path.join(REPO_DIR, "5_graphs.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# results: read_results() frame (results order); geo: pincode, district, state
+def baseline_states(results, geo):
+    merged = results.merge(geo, on='pincode', how='inner')
+    merged['severity'] = np.array(SEVERITY_LEVELS)[severity_codes(merged['EMA_i'], merged['z_score'])]
+    high = merged[merged['severity'].isin(['Extreme', 'Critical'])]
+    return high['state'].value_counts().head(10)
+
+
+def cube_states(graphs, results, geo):
+    join = lambda frame: frame.merge(geo, on='pincode', how='inner')
+    return graphs.states_data(RollupCube.build(results, join))
+
+
+def synthetic(seed=7):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for s in range(30):
+        # 2, 3 or 4 Critical / Extreme pincodes per state, plus some below the bands
+        for i in range(int(rng.integers(2, 5))):
+            rows.append((f"S{s:02d}", float(rng.choice([2.5, 3.5, rng.uniform(2.0, 6.0)]))))
+        for i in range(5):
+            rows.append((f"S{s:02d}", float(rng.uniform(-1.0, 0.9))))
+    order = rng.permutation(len(rows))
+    pins = 110000 + np.arange(len(rows), dtype=np.int32)
+    geo = pd.DataFrame({'pincode': pins, 'district': [f"D{p % 7}" for p in pins],
+                        'state': [rows[i][0] for i in order]})
+    z = np.array([rows[i][1] for i in order])
+    results = pd.DataFrame({'pincode': pins, 'EMA_i': z + 10.0, 'z_score': z})
+    # Results come worst first, as 3_calc_severity.py writes them
+    results = results.sort_values('z_score', ascending=False, kind='stable').reset_index(drop=True)
+    return results, geo
+
+
+def real():
+    if not os.path.exists(MASTER_CSV):
+        return None
+    geo = pd.read_csv(MASTER_CSV, dtype=str)
+    geo.columns = geo.columns.str.lower().str.strip()
+    geo = geo.rename(columns={'statename': 'state'})
+    geo['pincode'] = pd.to_numeric(geo['pincode'].str.strip().str.split('.').str[0], errors='coerce')
+    geo = geo.dropna(subset=['pincode']).astype({'pincode': np.int32}).drop_duplicates('pincode')
+    return read_results(), geo[['pincode', 'district', 'state']]
+
+
+def main():
+    argparse.ArgumentParser(description="Check that the cube's Top 10 states keep the baseline order on ties").parse_args()
+    graphs = load_graphs()
+    failures = []
+    cases = {"synthetic": synthetic()}
+    if (data := real()) is not None:
+        cases["results"] = data
+    for name, (results, geo) in cases.items():
+        expected = baseline_states(results, geo)
+        got = cube_states(graphs, results, geo)
+        counts = expected.to_numpy()
+        ties = int((counts[1:] == counts[:-1]).sum())
+        print(f"{name:<10} top 10: {ties} tied neighbour(s)")
+        if list(got.index) != list(expected.index) or list(got.to_numpy()) != list(counts):
+            failures.append(f"{name}: cube {list(got.items())}\n      baseline {list(expected.items())}")
+
+    if failures:
+        print("\n[ERR] Top 10 states differ from the baseline value_counts():")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print("\n>>> Top 10 states match the baseline, ties included")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+import sys
+import glob
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from quantile_sketch import GapSketches, band_codes, SKETCH_PATH  # noqa: E402
+
+# --- SKETCH RESHARDING CHECK ---
+# The source score sketches written by 3_calc_severity.py must not depend on how the raw
+# drop was split into files. This copies Cleaned_Data/{Enrolment,Demographics,Biometric}
+# into two scratch work directories:
+#   original  - the files as they are
+#   resharded - every row sent to one of N files at random, so most (pincode, Month)
+#               cells span several files
+# runs 3_calc_severity.py in each (single process, and --workers 2 on the resharded copy),
+# and checks that the source sketches are the same bucket for bucket and that the
+# percentile and robust bands give every pincode the same band. Exits 1 otherwise.
+# Run from the project root (needs the cleaned CSVs):
+#   python benchmarks/check_sketch_resharding.py --pieces 4
+
+SOURCES = ("Enrolment", "Demographics", "Biometric")
+OUTPUT_PATH = "Cleaned_Data/statistical_gap_analysis.json"
+
+
+def copy_sources(work, pieces=0, seed=42):
+    rng = np.random.default_rng(seed)
+    for source in SOURCES:
+        target = os.path.join(work, "Cleaned_Data", source)
+        os.makedirs(target)
+        for path in sorted(glob.glob(os.path.join("Cleaned_Data", source, "*.csv"))):
+            if not pieces:
+                shutil.copy(path, target)
+                continue
+            df = pd.read_csv(path, dtype=str)
+            piece = rng.integers(0, pieces, len(df))
+            stem = os.path.splitext(os.path.basename(path))[0]
+            for i in range(pieces):
+                df[piece == i].to_csv(os.path.join(target, f"{stem}_part{i}.csv"), index=False)
+
+
+def run_severity(work, *argv):
+    proc = subprocess.run([sys.executable, os.path.join(REPO_DIR, "3_calc_severity.py"), *argv],
+                          cwd=work, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"3_calc_severity.py {' '.join(argv)} failed in {work}:\n{proc.stderr[-2000:]}")
+    sketches = GapSketches.load(os.path.join(work, SKETCH_PATH))
+    results = pd.read_json(os.path.join(work, OUTPUT_PATH), orient='records').sort_values('pincode')
+    return sketches, results
+
+
+def compare(name, base, other, failures):
+    (base_sk, base_res), (sk, res) = base, other
+    for f_type, dist in base_sk.sources.items():
+        if f_type not in sk.sources:
+            failures.append(f"{name}: no {f_type} sketch")
+            continue
+        a, b = dist.quantiles.to_dict(), sk.sources[f_type].quantiles.to_dict()
+        if a != b:
+            failures.append(f"{name}: {f_type} sketch differs ({a['count']:,} vs {b['count']:,} cells)")
+    for method in ("percentile", "robust"):
+        bands = [band_codes(r['EMA_i'], r['z_score'], method, s.ema.quantiles)
+                 for s, r in ((base_sk, base_res), (sk, res))]
+        moved = int((bands[0] != bands[1]).sum())
+        if moved:
+            failures.append(f"{name}: {moved:,} pincode(s) change {method} band")
+    print(f"{name:<28} " + ", ".join(f"{f_type} {d.quantiles.count:,} cells" for f_type, d in sk.sources.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that resharding the input leaves the sketches and bands unchanged")
+    parser.add_argument("--pieces", type=int, default=3, help="Files each input file is split into (default: 3)")
+    args = parser.parse_args()
+
+    failures = []
+    root = tempfile.mkdtemp(prefix="sketch_reshard_")
+    try:
+        original, resharded = os.path.join(root, "original"), os.path.join(root, "resharded")
+        copy_sources(original)
+        copy_sources(resharded, args.pieces)
+        base = run_severity(original)
+        print(f"{'original':<28} " + ", ".join(f"{f_type} {d.quantiles.count:,} cells"
+                                               for f_type, d in base[0].sources.items()))
+        compare(f"resharded x{args.pieces}", base, run_severity(resharded), failures)
+        compare(f"resharded x{args.pieces}, --workers 2", base, run_severity(resharded, "--workers", "2"), failures)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if failures:
+        print("\n[ERR] Sketches depend on the input layout:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print("\n>>> Sketches and bands are the same however the input is split")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# --- SYNTHETIC DATA GENERATOR ---
+# Deterministic Enrolment / Demographics / Biometric CSVs at any scale, in the same
+# schema as the real drops, plus a matching raw pincode directory.
+#   --layout raw      raw_data/<Source>/*.csv (dd-mm-yyyy 'date') + raw_data/pincode_india.csv
+#   --layout cleaned  Cleaned_Data/<Source>/*.csv ('Month')      + Cleaned_Data/pincode_master_clean.csv
+# Pincodes, districts, states and coordinates come from the shipped pincode master,
+# so every generated pincode maps and plots like a real one. Pincode activity follows
+# a Zipf curve (a few very busy centres, a long quiet tail) and later months are busier.
+# Every chunk is seeded from (seed, source, chunk), so the output only depends on the
+# arguments. Run from the project root:
+#   python benchmarks/generate_synthetic.py --rows 10M --out benchmarks/.work/10M
+
+MASTER_CSV = "Cleaned_Data/pincode_master_clean.csv"
+GENERATOR_VERSION = 1
+
+# Share of the total rows per source and the columns each one carries
+SOURCES = {
+    "Enrolment": {"share": 0.20, "prefix": "enrolment", "seed": 1,
+                  "columns": {"age_0_5": 1.5, "age_5_17": 1.0, "age_18_greater": 0.4}},
+    "Demographics": {"share": 0.45, "prefix": "demographic", "seed": 2,
+                     "columns": {"demo_age_5_17": 0.8, "demo_age_17_": 4.0}},
+    "Biometric": {"share": 0.35, "prefix": "biometric", "seed": 3,
+                  "columns": {"bio_age_5_17": 2.0, "bio_age_17_": 5.0}},
+}
+
+YEAR = 2025
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June", "July",
+               "August", "September", "October", "November", "December"]
+# Linear ramp: December sees 12x the volume of January
+MONTH_SHARE = np.arange(1, 13, dtype=float) / np.arange(1, 13).sum()
+
+ZIPF_EXPONENT = 1.1
+CHUNK_ROWS = 1_000_000
+
+
+def parse_rows(text):
+    # "250k", "10M", "1.5m", "1000000"
+    text = str(text).strip().lower().replace("_", "")
+    scale = {"k": 1_000, "m": 1_000_000, "b": 1_000_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def format_rows(rows):
+    for unit, scale in (("B", 1_000_000_000), ("M", 1_000_000), ("k", 1_000)):
+        if rows >= scale and rows % scale == 0:
+            return f"{rows // scale}{unit}"
+    return str(rows)
+
+
+def load_universe(master_csv=MASTER_CSV):
+    df = pd.read_csv(master_csv, dtype={'pincode': str})
+    df.columns = df.columns.str.lower().str.strip()
+    df = df.dropna(subset=['latitude', 'longitude']).drop_duplicates('pincode')
+    return df.sort_values('pincode').reset_index(drop=True)
+
+
+def pincode_weights(n, seed):
+    # Zipf over a fixed random ranking of the pincodes
+    rng = np.random.default_rng([seed, 0])
+    ranks = rng.permutation(n) + 1
+    weights = 1.0 / ranks ** ZIPF_EXPONENT
+    return weights / weights.sum()
+
+
+def make_chunk(universe, weights, source, rows, seed, chunk_idx, layout):
+    spec = SOURCES[source]
+    rng = np.random.default_rng([seed, spec["seed"], chunk_idx])
+
+    idx = rng.choice(len(universe), size=rows, p=weights)
+    month = rng.choice(12, size=rows, p=MONTH_SHARE)
+
+    df = pd.DataFrame()
+    if layout == "raw":
+        day = rng.integers(1, 29, size=rows)
+        df['date'] = pd.Series(day).map('{:02d}'.format) + "-" + pd.Series(month + 1).map('{:02d}'.format) + f"-{YEAR}"
+    else:
+        df['Month'] = np.asarray(MONTH_NAMES, dtype=object)[month]
+    df['state'] = universe['state_title'].to_numpy()[idx]
+    df['district'] = universe['district_title'].to_numpy()[idx]
+    df['pincode'] = universe['pincode'].to_numpy()[idx]
+    for col, lam in spec["columns"].items():
+        df[col] = rng.poisson(lam, size=rows)
+    return df
+
+
+# Raw directory: several post offices per pincode, plus the bad rows
+# 2_pincode_clean.py is meant to drop (missing or zero coordinates)
+def make_raw_master(universe, seed):
+    rng = np.random.default_rng([seed, 99])
+    offices = rng.integers(1, 6, size=len(universe))
+    df = universe.loc[universe.index.repeat(offices), ['pincode', 'district', 'statename', 'latitude', 'longitude']]
+    df = df.reset_index(drop=True)
+    df['latitude'] = df['latitude'] + rng.normal(0, 0.01, len(df)) * (df.duplicated('pincode'))
+    df['officename'] = "PO " + pd.Series(np.arange(len(df))).astype(str)
+    df['officetype'] = np.where(df.duplicated('pincode'), "BO", "PO")
+
+    bad = rng.choice(len(df), size=max(1, len(df) // 200), replace=False)
+    df.loc[bad[::2], 'latitude'] = np.nan
+    df.loc[bad[1::2], 'longitude'] = 0
+    return df
+
+
+def generate(rows, out, layout="raw", seed=42, rows_per_file=5_000_000, master_csv=MASTER_CSV, quiet=False):
+    start = time.perf_counter()
+    universe = load_universe(master_csv)
+    universe['state_title'] = universe['statename'].astype(str).str.title()
+    universe['district_title'] = universe['district'].astype(str).str.title()
+    weights = pincode_weights(len(universe), seed)
+
+    base = os.path.join(out, "raw_data" if layout == "raw" else "Cleaned_Data")
+    os.makedirs(base, exist_ok=True)
+
+    files = []
+    remaining = rows
+    for i, (source, spec) in enumerate(SOURCES.items()):
+        # The last source takes the rounding remainder so totals are exact
+        n = remaining if i == len(SOURCES) - 1 else int(rows * spec["share"])
+        remaining -= n
+        folder = os.path.join(base, source)
+        os.makedirs(folder, exist_ok=True)
+
+        written, chunk_idx = 0, 0
+        while written < n:
+            # Shard names follow the real drops: <source>_<first row>_<last row>.csv
+            file_rows = min(rows_per_file, n - written)
+            first_row = (i + 1) * 1_000_000_000 + written
+            path = os.path.join(folder, f"{spec['prefix']}_{first_row}_{first_row + file_rows}.csv")
+            tmp_path = path + ".part"
+            done = 0
+            while done < file_rows:
+                chunk_rows = min(CHUNK_ROWS, file_rows - done)
+                chunk = make_chunk(universe, weights, source, chunk_rows, seed, chunk_idx, layout)
+                chunk.to_csv(tmp_path, index=False, mode='w' if done == 0 else 'a', header=done == 0)
+                done += chunk_rows
+                chunk_idx += 1
+            os.replace(tmp_path, path)
+            files.append(path)
+            written += file_rows
+        if not quiet:
+            print(f"   {source}: {n:,} rows")
+
+    if layout == "raw":
+        master_path = os.path.join(base, "pincode_india.csv")
+        make_raw_master(universe, seed).to_csv(master_path, index=False)
+    else:
+        master_path = os.path.join(base, "pincode_master_clean.csv")
+        universe[['pincode', 'district', 'statename', 'latitude', 'longitude']].to_csv(master_path, index=False)
+
+    manifest = {
+        "generator_version": GENERATOR_VERSION,
+        "rows": rows,
+        "layout": layout,
+        "seed": seed,
+        "rows_per_file": rows_per_file,
+        "pincodes": len(universe),
+        "files": len(files),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    with open(os.path.join(out, "synthetic_manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1)
+    if not quiet:
+        print(f"Generated {rows:,} rows in {len(files)} file(s) under {base}/ ({manifest['seconds']:.1f}s)")
+    return manifest
+
+
+# True when 'out' already holds data generated with the same arguments
+def is_current(out, rows, layout="raw", seed=42, rows_per_file=5_000_000):
+    path = os.path.join(out, "synthetic_manifest.json")
+    if not os.path.exists(path):
+        return False
+    with open(path) as f:
+        manifest = json.load(f)
+    return (manifest.get("generator_version") == GENERATOR_VERSION and manifest.get("rows") == rows
+            and manifest.get("layout") == layout and manifest.get("seed") == seed
+            and manifest.get("rows_per_file") == rows_per_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic Aadhaar activity data")
+    parser.add_argument("--rows", default="1M", help="Total rows over all sources, e.g. 1M, 10M, 100M")
+    parser.add_argument("--out", required=True, help="Work directory to write into")
+    parser.add_argument("--layout", choices=["raw", "cleaned"], default="raw",
+                        help="raw = input for stage 1; cleaned = input for stage 3")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rows-per-file", default="5M", help="Shard size per CSV file")
+    parser.add_argument("--master", default=MASTER_CSV, help="Pincode master to draw pincodes from")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.master):
+        sys.exit(f"[ERR] Pincode master not found: {args.master} (run from the project root)")
+    generate(parse_rows(args.rows), args.out, args.layout, args.seed, parse_rows(args.rows_per_file), args.master)
+
+
+if __name__ == "__main__":
+    main()
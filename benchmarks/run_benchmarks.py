@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import time
+import shlex
+import argparse
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+from generate_synthetic import generate, is_current, parse_rows, format_rows, MASTER_CSV  # noqa: E402
+
+# --- PIPELINE SCALING BENCHMARK ---
+# For each size: generate (or reuse) deterministic synthetic data in its own work
+# directory, run every stage there as a separate process, and record wall time, CPU
+# time and peak RSS of that process (children included), plus the stage's own step
+# breakdown from Cleaned_Data/run_reports/. Fully offline.
+# Results go to benchmarks/results/<timestamp>_<commit>.json; --compare diffs against
+# an earlier run. Run from anywhere:
+#   python benchmarks/run_benchmarks.py --sizes 1M 10M 100M
+#   python benchmarks/run_benchmarks.py --sizes 1M --compare latest
+
+WORK_DIR = os.path.join(BENCH_DIR, ".work")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# stage name -> script (run with the work directory as cwd)
+STAGES = {
+    "clean": "1_data_parsing.py",
+    "pincodes": "2_pincode_clean.py",
+    "severity": "3_calc_severity.py",
+    "map": "4_logic_plotting_form.py",
+    "graphs": "5_graphs.py",
+}
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# Runs one stage and returns wall, CPU and peak RSS of the process tree.
+# os.wait4 gives the child's own rusage; its ru_maxrss also covers worker
+# processes the child has already reaped.
+def run_stage(script, args, cwd, log_path):
+    cmd = [sys.executable, os.path.join(REPO_DIR, script)] + args
+    with open(log_path, "w") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        "command": " ".join(shlex.quote(c) for c in cmd[1:]),
+        "exit_code": proc.returncode,
+        "seconds": round(seconds, 3),
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 3),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+    }
+
+
+def stage_report(cwd, stage):
+    path = os.path.join(cwd, "Cleaned_Data", "run_reports", f"{stage}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def stage_args(stage, args):
+    return {
+        "clean": ["--chunksize", str(args.chunksize), "--workers", str(args.workers)],
+        "pincodes": [],
+        "severity": [],
+        "map": shlex.split(args.map_args),
+        "graphs": [],
+    }[stage]
+
+
+def bench_size(rows, args):
+    label = format_rows(rows)
+    cwd = os.path.join(args.workdir, label)
+    print(f"\n=== {label} rows ({cwd}) ===")
+
+    gen_seconds = None
+    if not is_current(cwd, rows, "raw", args.seed, args.rows_per_file):
+        print(">>> Generating synthetic data...")
+        gen_seconds = generate(rows, cwd, "raw", args.seed, args.rows_per_file, args.master)["seconds"]
+    else:
+        print(">>> Reusing synthetic data")
+    os.makedirs(os.path.join(cwd, "Cleaned_Data"), exist_ok=True)
+    os.makedirs(os.path.join(cwd, "logs"), exist_ok=True)
+
+    results = []
+    for stage in args.stages:
+        log_path = os.path.join(cwd, "logs", f"{stage}.log")
+        result = run_stage(STAGES[stage], stage_args(stage, args), cwd, log_path)
+        report = stage_report(cwd, stage)
+        result.update({
+            "size": label,
+            "rows": rows,
+            "stage": stage,
+            "rows_per_sec": round(rows / result["seconds"], 1) if stage in ("clean", "severity") else None,
+            "steps": report["steps"] if report else [],
+        })
+        results.append(result)
+        status = "ok" if result["exit_code"] == 0 else f"FAILED (exit {result['exit_code']}, see {log_path})"
+        print(f"   {stage:<10} {result['seconds']:9.2f}s {result['cpu_seconds']:9.2f}s CPU "
+              f"{result['peak_rss_mb']:9,.0f} MB  {status}")
+        if result["exit_code"] != 0 and not args.keep_going:
+            break
+    return results, gen_seconds
+
+
+def find_previous(compare, current_path):
+    if compare != "latest":
+        return compare
+    paths = sorted(p for p in os.listdir(RESULTS_DIR) if p.endswith(".json"))
+    paths = [os.path.join(RESULTS_DIR, p) for p in paths]
+    paths = [p for p in paths if os.path.abspath(p) != os.path.abspath(current_path)]
+    return paths[-1] if paths else None
+
+
+def compare_runs(current, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    before = {(r["size"], r["stage"]): r for r in previous["results"]}
+    print(f"\n--- COMPARED WITH {previous['commit']} ({os.path.basename(previous_path)}) ---")
+    print(f"   {'size':<6} {'stage':<10} {'time':>18} {'peak RSS':>22}")
+    for r in current["results"]:
+        old = before.get((r["size"], r["stage"]))
+        if old is None:
+            continue
+        dt = (r["seconds"] / old["seconds"] - 1) * 100 if old["seconds"] else 0.0
+        dm = (r["peak_rss_mb"] / old["peak_rss_mb"] - 1) * 100 if old["peak_rss_mb"] else 0.0
+        print(f"   {r['size']:<6} {r['stage']:<10} {r['seconds']:9.2f}s {dt:+7.1f}% "
+              f"{r['peak_rss_mb']:9,.0f} MB {dm:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic data")
+    parser.add_argument("--sizes", nargs="+", default=["1M", "10M", "100M"],
+                        help="Total rows per run, e.g. 1M 10M 100M")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--workdir", default=WORK_DIR, help="Where synthetic data and stage outputs live")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rows-per-file", default="5M", help="Shard size of the generated CSVs")
+    parser.add_argument("--master", default=os.path.join(REPO_DIR, MASTER_CSV),
+                        help="Pincode master to draw pincodes from")
+    parser.add_argument("--chunksize", type=int, default=1_000_000, help="Passed to 1_data_parsing.py")
+    parser.add_argument("--workers", type=int, default=1, help="Passed to 1_data_parsing.py")
+    parser.add_argument("--map-args", default="--offline --render canvas",
+                        help="Extra arguments for 4_logic_plotting_form.py")
+    parser.add_argument("--keep-going", action="store_true", help="Continue with later stages after a failure")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare with, or 'latest'")
+    args = parser.parse_args()
+    args.rows_per_file = parse_rows(args.rows_per_file)
+    args.workdir = os.path.abspath(args.workdir)
+
+    run = {
+        "commit": git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "options": {k: v for k, v in vars(args).items() if k not in ("compare", "master", "workdir")},
+        "generation_seconds": {},
+        "results": [],
+    }
+    for size in args.sizes:
+        rows = parse_rows(size)
+        results, gen_seconds = bench_size(rows, args)
+        run["results"].extend(results)
+        if gen_seconds is not None:
+            run["generation_seconds"][format_rows(rows)] = gen_seconds
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out_path = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{run['commit']}.json")
+    with open(out_path, "w") as f:
+        json.dump(run, f, indent=1)
+    print(f"\nResults: {out_path}")
+
+    if args.compare:
+        previous = find_previous(args.compare, out_path)
+        if previous:
+            compare_runs(run, previous)
+        else:
+            print("[WARN] No earlier results to compare with.")
+
+    if any(r["exit_code"] != 0 for r in run["results"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
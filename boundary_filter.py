@@ -0,0 +1,70 @@
+import numpy as np
+import shapely
+
+# --- 1. CONFIGURATION ---
+# Fast "is this point inside India?" test for 4_logic_plotting_form.py.
+# A coarse grid over the boundary's bounding box is classified once:
+#   INSIDE   - the whole cell lies in the interior, every point in it passes
+#   OUTSIDE  - the cell does not touch the boundary polygon, every point fails
+#   BORDER   - anything else; only these points get the exact polygon test
+# The exact test runs vectorized against a prepared geometry, so the result is
+# identical to calling shape.contains(Point(lon, lat)) row by row.
+GRID_CELLS = 128  # cells per axis
+
+OUTSIDE, INSIDE, BORDER = 0, 1, 2
+
+
+class BoundaryFilter:
+    def __init__(self, geometry, grid_cells=GRID_CELLS):
+        self.geometry = geometry
+        shapely.prepare(self.geometry)
+
+        self.minx, self.miny, self.maxx, self.maxy = geometry.bounds
+        self.nx = self.ny = grid_cells
+        self.dx = (self.maxx - self.minx) / self.nx
+        self.dy = (self.maxy - self.miny) / self.ny
+        self.cells = self._classify_cells()
+
+    def _classify_cells(self):
+        ix, iy = np.meshgrid(np.arange(self.nx), np.arange(self.ny))
+        x0 = self.minx + ix.ravel() * self.dx
+        y0 = self.miny + iy.ravel() * self.dy
+        cells = shapely.box(x0, y0, x0 + self.dx, y0 + self.dy)
+
+        # contains_properly: the closed cell (edges included) is in the interior
+        state = np.full(len(cells), BORDER, dtype=np.int8)
+        state[shapely.contains_properly(self.geometry, cells)] = INSIDE
+        state[~shapely.intersects(self.geometry, cells)] = OUTSIDE
+        return state.reshape(self.ny, self.nx)
+
+    def cell_index(self, lon, lat):
+        ix = np.clip(((lon - self.minx) / self.dx).astype(np.int64), 0, self.nx - 1)
+        iy = np.clip(((lat - self.miny) / self.dy).astype(np.int64), 0, self.ny - 1)
+        return ix, iy
+
+    # Boolean mask: True where (lon, lat) lies inside the boundary
+    def contains(self, lon, lat):
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        result = np.zeros(len(lon), dtype=bool)
+
+        in_box = (lon >= self.minx) & (lon <= self.maxx) & (lat >= self.miny) & (lat <= self.maxy)
+        idx = np.flatnonzero(in_box)
+        if len(idx) == 0:
+            return result
+
+        ix, iy = self.cell_index(lon[idx], lat[idx])
+        state = self.cells[iy, ix]
+
+        result[idx[state == INSIDE]] = True
+        border = idx[state == BORDER]
+        if len(border):
+            result[border] = shapely.contains_xy(self.geometry, lon[border], lat[border])
+        return result
+
+    def stats(self):
+        return {
+            'inside_cells': int((self.cells == INSIDE).sum()),
+            'outside_cells': int((self.cells == OUTSIDE).sum()),
+            'border_cells': int((self.cells == BORDER).sum()),
+        }
@@ -0,0 +1,179 @@
+import os
+import glob
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+from pincode_parse import parse_pincodes, MISSING_PIN
+
+# --- 1. CONFIGURATION ---
+# Optional Parquet layout for Cleaned_Data/ (needs 'pyarrow'):
+#   Cleaned_Data/parquet/source=<Folder>/Month=<Month>/<raw file stem>.parquet
+#   Cleaned_Data/pincode_master_clean.parquet
+PARQUET_ROOT = os.path.join("Cleaned_Data", "parquet")
+MASTER_PARQUET = os.path.join("Cleaned_Data", "pincode_master_clean.parquet")
+
+# Same marker pyarrow/hive use for a missing partition value
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+CATEGORY_COLUMNS = ['state', 'district', 'statename', 'Month', 'Period']
+
+
+def require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ImportError("Parquet output needs 'pyarrow'. Run: pip install pyarrow")
+
+
+# --- 2. TYPING ---
+# pincode -> int32, names -> categorical, age columns -> int32, anything else -> string.
+# Pincodes go through parse_pincodes like the CSV readers (fractional values truncated,
+# "PIN 110001" extracted), so both formats give the same pincode; invalid ones are <NA>.
+def is_age_column(col):
+    return 'age' in col.lower()
+
+
+def to_typed(df):
+    df = df.copy()
+    for col in df.columns:
+        if col == 'pincode':
+            pins = parse_pincodes(df[col])
+            df[col] = pd.arrays.IntegerArray(pins, pins == MISSING_PIN)
+        elif col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype('category')
+        elif is_age_column(col):
+            # Age columns are transaction counts
+            df[col] = pd.to_numeric(df[col], errors='coerce').round().astype('Int32')
+        elif col in ('latitude', 'longitude'):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        else:
+            df[col] = df[col].astype('string')
+    return df
+
+
+def arrow_schema(df):
+    import pyarrow as pa
+
+    # Fixed per-file schema: categorical dictionaries differ between chunks,
+    # so every chunk is cast to the same dictionary<int32, string> type.
+    fields = []
+    for col in df.columns:
+        if col == 'pincode' or is_age_column(col):
+            fields.append(pa.field(col, pa.int32()))
+        elif col in CATEGORY_COLUMNS:
+            fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+        elif col in ('latitude', 'longitude'):
+            fields.append(pa.field(col, pa.float64()))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    return pa.schema(fields)
+
+
+def partition_dir(source, month):
+    value = NULL_PARTITION if month is None or pd.isna(month) else quote(str(month), safe='')
+    return os.path.join(PARQUET_ROOT, f"source={source}", f"Month={value}")
+
+
+# --- 3. WRITING ---
+# One writer per raw file. Chunks can be written one after another (streaming
+# mode); rows are split by Month into one Parquet file per partition.
+class PartitionedWriter:
+    def __init__(self, source, filename):
+        require_pyarrow()
+        self.source = source
+        self.stem = os.path.splitext(filename)[0]
+        self.writers = {}
+        self.schema = None
+        # Drop fragments from a previous run of the same raw file
+        for old in glob.glob(os.path.join(PARQUET_ROOT, f"source={source}", "Month=*", self.stem + ".parquet")):
+            os.remove(old)
+
+    def write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        df = to_typed(df)
+        if 'Month' in df.columns:
+            groups = df.groupby('Month', observed=True, dropna=False, sort=False)
+        else:
+            groups = [(None, df)]
+
+        for month, part in groups:
+            part = part.drop(columns=['Month'], errors='ignore')
+            if self.schema is None:
+                self.schema = arrow_schema(part)
+            key = None if pd.isna(month) else str(month)
+            if key not in self.writers:
+                folder = partition_dir(self.source, key)
+                os.makedirs(folder, exist_ok=True)
+                path = os.path.join(folder, self.stem + ".parquet")
+                self.writers[key] = pq.ParquetWriter(path, self.schema)
+            table = pa.Table.from_pandas(part, preserve_index=False).cast(self.schema)
+            self.writers[key].write_table(table)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+def write_master(df, path=MASTER_PARQUET):
+    require_pyarrow()
+    df = to_typed(df)
+    df.to_parquet(path, index=False)
+
+
+# --- 4. READING ---
+# Loaders only pull the columns they ask for; missing columns are skipped.
+def source_files(source):
+    return sorted(glob.glob(os.path.join(PARQUET_ROOT, f"source={source}", "Month=*", "*.parquet")))
+
+
+def month_from_path(path):
+    value = os.path.basename(os.path.dirname(path)).split("=", 1)[1]
+    return None if value == NULL_PARTITION else unquote(value)
+
+
+def read_fragment(path, columns=None):
+    require_pyarrow()
+    import pyarrow.parquet as pq
+
+    if columns is not None:
+        available = set(pq.read_schema(path).names)
+        columns = [c for c in columns if c in available]
+    df = pq.read_table(path, columns=columns).to_pandas()
+    df['Month'] = pd.Categorical([month_from_path(path)] * len(df))
+    return df
+
+
+# Same as read_fragment, in record batches of batch_rows (out-of-core readers)
+def iter_fragment(path, columns=None, batch_rows=65536):
+    require_pyarrow()
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    if columns is not None:
+        available = set(parquet_file.schema_arrow.names)
+        columns = [c for c in columns if c in available]
+    month = month_from_path(path)
+    for batch in parquet_file.iter_batches(batch_size=batch_rows, columns=columns):
+        df = batch.to_pandas()
+        df['Month'] = pd.Categorical([month] * len(df))
+        yield df
+
+
+def read_master(columns=None, path=MASTER_PARQUET):
+    require_pyarrow()
+    import pyarrow.parquet as pq
+
+    if columns is not None:
+        available = set(pq.read_schema(path).names)
+        columns = [c for c in columns if c in available]
+    df = pq.read_table(path, columns=columns).to_pandas()
+    if 'pincode' in df.columns:
+        df = df[df['pincode'].notna()]
+        df['pincode'] = df['pincode'].astype(np.int32)
+    return df
@@ -0,0 +1,116 @@
+import numpy as np
+
+# --- 1. CONFIGURATION ---
+# Z-score weighted point density, computed once in Python and shipped as images.
+# Replaces the client-side HeatMap: the browser only shows a few fixed-size PNGs,
+# so the map's load cost no longer depends on the number of points.
+# Memory: levels are built one at a time in float32 and projected to Web Mercator
+# here, straight to uint8, so the finest level (2000 x 2134 cells) peaks at a few
+# copies of its grid (~20 MB each) instead of folium's float64 RGBA transform.
+INDIA_BOUNDS = (68.0, 6.0, 98.0, 38.0)  # lon_min, lat_min, lon_max, lat_max
+
+# (min_zoom, max_zoom, cell size in degrees, smoothing sigma in degrees)
+# Sigma roughly follows the 20px HeatMap radius at each zoom band.
+RASTER_LEVELS = [
+    (0, 6, 0.10, 0.45),
+    (7, 8, 0.04, 0.12),
+    (9, 18, 0.015, 0.04),
+]
+
+# Same colour stops as the HeatMap gradient
+GRADIENT = [(0.0, (0, 0, 255)), (0.4, (0, 0, 255)), (0.65, (0, 255, 0)), (1.0, (255, 0, 0))]
+MIN_OPACITY = 0.2
+
+
+# --- 2. BINNING + SMOOTHING ---
+def gaussian_kernel(sigma_cells):
+    radius = max(1, int(np.ceil(3 * sigma_cells)))
+    x = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (x / sigma_cells) ** 2)
+    return kernel / kernel.sum()
+
+
+def smooth(grid, sigma_cells):
+    # Separable Gaussian, one shifted multiply-add per kernel tap and axis, so only
+    # grid-sized float32 buffers are allocated (no window x grid copy)
+    kernel = gaussian_kernel(sigma_cells).astype(np.float32)
+    r = len(kernel) // 2
+    ny, nx = grid.shape
+    padded = np.pad(grid, ((0, 0), (r, r)))
+    rows = np.zeros((ny, nx), dtype=np.float32)
+    for i, k in enumerate(kernel):
+        rows += k * padded[:, i:i + nx]
+    padded = np.pad(rows, ((r, r), (0, 0)))
+    out = np.zeros((ny, nx), dtype=np.float32)
+    for i, k in enumerate(kernel):
+        out += k * padded[i:i + ny]
+    return out
+
+
+def density_grid(lat, lon, weights, cell_deg, sigma_deg, bounds=INDIA_BOUNDS):
+    lon_min, lat_min, lon_max, lat_max = bounds
+    nx = int(np.ceil((lon_max - lon_min) / cell_deg))
+    ny = int(np.ceil((lat_max - lat_min) / cell_deg))
+    grid = np.histogram2d(
+        np.asarray(lat, dtype=float), np.asarray(lon, dtype=float), bins=(ny, nx),
+        range=((lat_min, lat_min + ny * cell_deg), (lon_min, lon_min + nx * cell_deg)),
+        weights=np.clip(np.asarray(weights, dtype=float), 0, None),
+    )[0].astype(np.float32)
+    return smooth(grid, sigma_deg / cell_deg), (lon_min, lat_min, lon_min + nx * cell_deg, lat_min + ny * cell_deg)
+
+
+# --- 3. COLOURING ---
+def colorize(grid, gradient=GRADIENT, min_opacity=MIN_OPACITY, percentile=99.5, block_rows=256):
+    # RGBA uint8 image, north at the top; empty cells are fully transparent.
+    # Coloured in row blocks: np.interp works in float64
+    positive = grid[grid > 0]
+    scale = np.percentile(positive, percentile) if len(positive) else 1.0
+    del positive
+
+    stops = np.array([s for s, _ in gradient])
+    colours = [[c[channel] for _, c in gradient] for channel in range(3)]
+    rgba = np.zeros(grid.shape + (4,), dtype=np.uint8)
+    for start in range(0, grid.shape[0], block_rows):
+        rows = slice(start, start + block_rows)
+        value = np.clip(grid[rows] / np.float32(scale), 0, 1) if scale > 0 else np.zeros_like(grid[rows])
+        for channel in range(3):
+            rgba[rows, :, channel] = np.interp(value, stops, colours[channel]).astype(np.uint8)
+        alpha = np.where(value > 0.01, min_opacity + (1 - min_opacity) * value, 0)
+        rgba[rows, :, 3] = (alpha * 255).astype(np.uint8)
+    return rgba[::-1]
+
+
+def mercator(lat):
+    return np.degrees(np.arcsinh(np.tan(np.radians(lat))))
+
+
+# Reprojects a north-up RGBA image spanning lat_min..lat_max from plain latitude rows
+# to Web Mercator rows (same rows as folium's mercator_transform), in row blocks so
+# only a block is ever held as float32
+def mercator_project(rgba, lat_min, lat_max, block_rows=256):
+    height = rgba.shape[0]
+    src = rgba[::-1]  # south-up: row i sits at lats[i]
+    lats = lat_min + np.linspace(0.5 / height, 1.0 - 0.5 / height, height) * (lat_max - lat_min)
+    targets = mercator(lat_min) + np.linspace(0.5 / height, 1.0 - 0.5 / height, height) * (
+        mercator(lat_max) - mercator(lat_min))
+    pos = np.interp(targets, mercator(lats), np.arange(height, dtype=np.float64))
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, height - 1)
+    frac = (pos - lo).astype(np.float32)[:, None, None]
+
+    out = np.empty_like(rgba)
+    for start in range(0, height, block_rows):
+        rows = slice(start, start + block_rows)
+        a, b = src[lo[rows]].astype(np.float32), src[hi[rows]].astype(np.float32)
+        out[rows] = np.rint(a + (b - a) * frac[rows]).astype(np.uint8)
+    return out[::-1]
+
+
+def density_levels(lat, lon, weights, levels=RASTER_LEVELS, bounds=INDIA_BOUNDS):
+    # Yields (min_zoom, max_zoom, rgba_image, image_bounds) per resolution, one at a
+    # time; the image is already in Web Mercator (ImageOverlay mercator_project=False)
+    for min_zoom, max_zoom, cell_deg, sigma_deg in levels:
+        grid, extent = density_grid(lat, lon, weights, cell_deg, sigma_deg, bounds)
+        image = colorize(grid)
+        del grid
+        yield min_zoom, max_zoom, mercator_project(image, extent[1], extent[3]), extent
@@ -0,0 +1,401 @@
+import os
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+
+import numpy as np
+import pandas as pd
+
+from pincode_lookup import join_master, lookup_available
+from pincode_parse import parse_pincodes, PIN_MIN, PIN_MAX, MISSING_PIN
+from rollup_cube import severity_codes, SEVERITY_LEVELS
+from quantile_sketch import QuantileSketch, ema_reference, BAND_METHODS
+
+# --- 1. CONFIGURATION ---
+# Query layer over the gap results (3_calc_severity.py) joined with the pincode master.
+# Built once per version of the JSON file, then every lookup is an index hit:
+#   - pincode   -> direct-indexed array (slot = pincode - PIN_MIN)
+#   - district / state -> row ids, already sorted worst (highest z) first
+#   - lat / lon -> uniform grid; radius and bounding-box queries only scan the
+#                  cells that overlap the query
+# Results are kept in an LRU cache, which is dropped whenever the JSON changes.
+# Severity uses the same --bands as the rollup cube, the map and the charts.
+#   python gap_query.py pincode 244001
+#   python gap_query.py near 28.61 77.21 --radius 15 --limit 10
+#   python gap_query.py serve --port 8765
+DATA_PATH = "Cleaned_Data/statistical_gap_analysis.json"
+MASTER_CSV = "Cleaned_Data/pincode_master_clean.csv"
+
+GRID_DEGREES = 0.25       # grid cell size (~28 km north-south)
+EARTH_RADIUS_KM = 6371.0
+CACHE_SIZE = 4096         # cached query results
+RELOAD_CHECK_SECONDS = 1.0
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 5000          # largest ?limit= the HTTP endpoint accepts
+
+RESULT_COLUMNS = ['pincode', 'z_score', 'EMA_i', 'severity', 'district', 'state', 'latitude', 'longitude']
+
+
+# ?limit= of the HTTP endpoint: 1..MAX_LIMIT, ValueError otherwise
+def parse_limit(value):
+    limit = int(value)
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}, got {limit}")
+    return limit
+
+
+def name_key(name):
+    return str(name).strip().lower()
+
+
+def haversine_km(lat, lon, lat0, lon0):
+    lat, lon, lat0, lon0 = map(np.radians, (lat, lon, lat0, lon0))
+    a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat) * np.cos(lat0) * np.sin((lon - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+# --- 2. LOADING ---
+# One row per pincode with z_score, EMA_i, severity, district, state, latitude, longitude
+def load_results(data_path=DATA_PATH, master_csv=MASTER_CSV, bands="zscore"):
+    df = pd.read_json(data_path, orient='records')
+    # Bands are cut against every pincode's EMA_i, as in rollup_cube.py: the stored
+    # sketch of the default results, otherwise a sketch of this file
+    reference = None
+    if bands != "zscore":
+        reference = (ema_reference() if data_path == DATA_PATH else None) or QuantileSketch.from_values(df['EMA_i'])
+    df['severity'] = np.array(SEVERITY_LEVELS, dtype=object)[severity_codes(df['EMA_i'], df['z_score'], bands, reference)]
+    df['pincode'] = parse_pincodes(df['pincode'])
+    df = df[df['pincode'] != MISSING_PIN]
+
+    if lookup_available():
+        df = join_master(df, ['district', 'state', 'latitude', 'longitude'])
+        df[['district', 'state']] = df[['district', 'state']].astype(object)
+    else:
+        geo = pd.read_csv(master_csv, dtype=str)
+        geo.columns = geo.columns.str.lower().str.strip()
+        geo = geo.rename(columns={'statename': 'state'})
+        geo['pincode'] = parse_pincodes(geo['pincode'])
+        for col in ('latitude', 'longitude'):
+            geo[col] = pd.to_numeric(geo[col], errors='coerce')
+        geo = geo.drop_duplicates('pincode')
+        df = df.merge(geo[['pincode', 'district', 'state', 'latitude', 'longitude']], on='pincode', how='inner')
+
+    return df[RESULT_COLUMNS].reset_index(drop=True)
+
+
+# --- 3. INDEXES ---
+class GapIndex:
+    def __init__(self, df):
+        # Rows sorted worst first, so every "top N" is a prefix of an index list
+        df = df.sort_values('z_score', ascending=False, kind='stable').reset_index(drop=True)
+        self.df = df
+        # Built once; queries only pick rows. NaN (e.g. a pincode without a district in
+        # the master) becomes None, since a bare NaN is not valid JSON.
+        self.records = df.astype(object).where(df.notna(), None).to_dict('records')
+
+        pins = df['pincode'].to_numpy(dtype=np.int64)
+        self.pin_row = np.full(PIN_MAX - PIN_MIN + 1, -1, dtype=np.int32)
+        self.pin_row[pins - PIN_MIN] = np.arange(len(df), dtype=np.int32)
+
+        self.by_district = self._group(df['district'])
+        self.by_state = self._group(df['state'])
+        self._build_grid()
+
+    @staticmethod
+    def _group(names):
+        keys = names.map(name_key).to_numpy()
+        order = np.argsort(keys, kind='stable')  # keeps the worst-first order inside a group
+        groups = {}
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]) if len(keys) else []
+        ends = list(starts[1:]) + [len(keys)]
+        for start, end in zip(starts, ends):
+            groups[sorted_keys[start]] = order[start:end]
+        return groups
+
+    def _build_grid(self):
+        # Fixed world grid: a few bad master coordinates cannot blow up its size
+        lat = self.df['latitude'].to_numpy(dtype=np.float64)
+        lon = self.df['longitude'].to_numpy(dtype=np.float64)
+        self.lat, self.lon = lat, lon
+        self.lat0, self.lon0 = -90.0, -180.0
+        self.n_rows, self.n_cols = int(180 / GRID_DEGREES), int(360 / GRID_DEGREES)
+
+        with np.errstate(invalid='ignore'):
+            ok = (lat >= -90) & (lat < 90) & (lon >= -180) & (lon < 180)
+        rows = np.flatnonzero(ok)
+        cells = self._cell(lat[rows], lon[rows])
+        order = np.argsort(cells, kind='stable')
+        self.grid_rows = rows[order]  # row ids grouped by cell
+        self.cell_start = np.searchsorted(cells[order], np.arange(self.n_rows * self.n_cols + 1))
+
+    def _cell(self, lat, lon):
+        r = ((lat - self.lat0) // GRID_DEGREES).astype(np.int64)
+        c = ((lon - self.lon0) // GRID_DEGREES).astype(np.int64)
+        return r * self.n_cols + c
+
+    # Candidate row ids from every cell overlapping the box
+    def _box_candidates(self, south, west, north, east):
+        r0 = max(int((south - self.lat0) // GRID_DEGREES), 0)
+        r1 = min(int((north - self.lat0) // GRID_DEGREES), self.n_rows - 1)
+        c0 = max(int((west - self.lon0) // GRID_DEGREES), 0)
+        c1 = min(int((east - self.lon0) // GRID_DEGREES), self.n_cols - 1)
+        if r0 > r1 or c0 > c1:
+            return np.empty(0, dtype=np.int64)
+        parts = []
+        for r in range(r0, r1 + 1):
+            # Cells of one grid row are contiguous, so each row is a single slice
+            start, end = self.cell_start[r * self.n_cols + c0], self.cell_start[r * self.n_cols + c1 + 1]
+            parts.append(self.grid_rows[start:end])
+        return np.concatenate(parts)
+
+    # --- 4. QUERIES ---
+    # All queries return plain dicts (JSON-ready), worst first unless noted
+    def _rows(self, rows, limit=None, distances=None):
+        rows = rows[:limit] if limit else rows
+        out = []
+        for i, row in enumerate(rows):
+            record = dict(self.records[row])
+            if distances is not None:
+                record['distance_km'] = round(float(distances[i]), 3)
+            out.append(record)
+        return out
+
+    def pincode(self, pincode):
+        pin = int(parse_pincodes([pincode])[0])
+        if pin == MISSING_PIN or self.pin_row[pin - PIN_MIN] < 0:
+            return None
+        return self._rows([self.pin_row[pin - PIN_MIN]])[0]
+
+    def district(self, name, limit=DEFAULT_LIMIT):
+        return self._rows(self.by_district.get(name_key(name), np.empty(0, dtype=np.int64)), limit)
+
+    def state(self, name, limit=DEFAULT_LIMIT):
+        return self._rows(self.by_state.get(name_key(name), np.empty(0, dtype=np.int64)), limit)
+
+    def top(self, limit=DEFAULT_LIMIT):
+        return self._rows(np.arange(len(self.df)), limit)
+
+    def bbox(self, south, west, north, east, limit=DEFAULT_LIMIT):
+        rows = self._box_candidates(south, west, north, east)
+        lat, lon = self.lat[rows], self.lon[rows]
+        rows = np.sort(rows[(lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)])
+        return self._rows(rows, limit)
+
+    # Worst pincodes within radius_km of (lat, lon); order='distance' for nearest first
+    def near(self, lat, lon, radius_km=10.0, limit=DEFAULT_LIMIT, order='worst'):
+        dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+        dlon = dlat / max(np.cos(np.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+        rows = self._box_candidates(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+        dist = haversine_km(self.lat[rows], self.lon[rows], lat, lon)
+        keep = dist <= radius_km
+        rows, dist = rows[keep], dist[keep]
+        order_idx = np.lexsort((rows, dist)) if order == 'distance' else np.argsort(rows, kind='stable')
+        return self._rows(rows[order_idx], limit, dist[order_idx][:limit] if limit else dist[order_idx])
+
+
+# --- 5. SERVICE (reload + LRU cache) ---
+class GapQueryService:
+    def __init__(self, data_path=DATA_PATH, master_csv=MASTER_CSV, cache_size=CACHE_SIZE, bands="zscore"):
+        self.data_path = data_path
+        self.master_csv = master_csv
+        self.bands = bands
+        self.cache_size = cache_size
+        self.lock = threading.RLock()
+        self.cache = OrderedDict()
+        self.index = None
+        self.signature = None
+        self.last_check = 0.0
+        self.hits = self.misses = self.reloads = 0
+        self._maybe_reload(force=True)
+
+    def _file_signature(self):
+        st = os.stat(self.data_path)
+        return st.st_size, st.st_mtime_ns
+
+    # Rebuilds the indexes when the gap analysis file changed on disk
+    def _maybe_reload(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_check < RELOAD_CHECK_SECONDS:
+            return
+        self.last_check = now
+        start = time.perf_counter()
+        try:
+            signature = self._file_signature()
+            if signature == self.signature:
+                return
+            index = GapIndex(load_results(self.data_path, self.master_csv, self.bands))
+        except (ValueError, OSError) as e:
+            # e.g. the file is missing or half written while it is rewritten: keep
+            # serving the old index
+            if self.index is None:
+                raise
+            print(f" [WARN] Reload of {self.data_path} failed ({e}); keeping the previous results")
+            return
+        self.index, self.signature = index, signature
+        self.cache.clear()
+        self.reloads += 1
+        print(f">>> Gap index: {len(index.df):,} pincodes loaded in {time.perf_counter() - start:.2f}s")
+
+    def query(self, kind, *args, **kwargs):
+        key = (kind, args, tuple(sorted(kwargs.items())))
+        with self.lock:
+            self._maybe_reload()
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+            result = getattr(self.index, kind)(*args, **kwargs)
+            self.cache[key] = result
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            return result
+
+    def pincode(self, pincode):
+        return self.query('pincode', str(pincode).strip())
+
+    def district(self, name, limit=DEFAULT_LIMIT):
+        return self.query('district', name_key(name), limit=limit)
+
+    def state(self, name, limit=DEFAULT_LIMIT):
+        return self.query('state', name_key(name), limit=limit)
+
+    def top(self, limit=DEFAULT_LIMIT):
+        return self.query('top', limit=limit)
+
+    def bbox(self, south, west, north, east, limit=DEFAULT_LIMIT):
+        return self.query('bbox', float(south), float(west), float(north), float(east), limit=limit)
+
+    def near(self, lat, lon, radius_km=10.0, limit=DEFAULT_LIMIT, order='worst'):
+        return self.query('near', float(lat), float(lon), radius_km=float(radius_km), limit=limit, order=order)
+
+    def stats(self):
+        return {"pincodes": len(self.index.df), "reloads": self.reloads, "cache_hits": self.hits,
+                "cache_misses": self.misses, "cached_results": len(self.cache)}
+
+
+# --- 6. HTTP ENDPOINT ---
+#   GET /pincode/<pin>
+#   GET /district/<name>?limit=N          GET /state/<name>?limit=N
+#   GET /top?limit=N
+#   GET /near?lat=..&lon=..&radius_km=..&limit=N&order=worst|distance
+#   GET /bbox?south=..&west=..&north=..&east=..&limit=N
+#   GET /stats
+def make_handler(service):
+    class GapQueryHandler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [unquote(p) for p in url.path.strip("/").split("/") if p]
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                limit = parse_limit(q.get("limit", DEFAULT_LIMIT))
+                if parts[:1] == ["pincode"] and len(parts) == 2:
+                    result = service.pincode(parts[1])
+                    if result is None:
+                        return self._send(404, {"error": f"unknown pincode {parts[1]}"})
+                elif parts[:1] == ["district"] and len(parts) == 2:
+                    result = service.district(parts[1], limit)
+                elif parts[:1] == ["state"] and len(parts) == 2:
+                    result = service.state(parts[1], limit)
+                elif parts == ["top"]:
+                    result = service.top(limit)
+                elif parts == ["near"]:
+                    result = service.near(q["lat"], q["lon"], q.get("radius_km", 10.0), limit, q.get("order", "worst"))
+                elif parts == ["bbox"]:
+                    result = service.bbox(q["south"], q["west"], q["north"], q["east"], limit)
+                elif parts == ["stats"]:
+                    result = service.stats()
+                else:
+                    return self._send(404, {"error": f"unknown endpoint {url.path}"})
+            except (KeyError, ValueError) as e:
+                return self._send(400, {"error": f"bad request: {e}"})
+            except OSError as e:
+                return self._send(503, {"error": f"results unavailable: {e}"})
+            except Exception as e:
+                return self._send(500, {"error": f"internal error: {type(e).__name__}: {e}"})
+            self._send(200, result)
+
+        def log_message(self, format, *args):
+            pass  # one line per lookup would flood the console
+
+    return GapQueryHandler
+
+
+def serve(service, host="127.0.0.1", port=8765):
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f">>> Gap query API on http://{host}:{port}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# --- 7. CLI ---
+def build_parser():
+    parser = argparse.ArgumentParser(description="Query the gap analysis by pincode, place or area")
+    parser.add_argument("--data", default=DATA_PATH, help="Gap analysis JSON from 3_calc_severity.py")
+    parser.add_argument("--master", default=MASTER_CSV, help="Pincode master CSV (if no lookup table)")
+    parser.add_argument("--bands", choices=BAND_METHODS, default="zscore",
+                        help="Severity bands, as in rollup_cube.py (default: zscore)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("pincode", help="Scores for one pincode")
+    p.add_argument("pin")
+    for name in ("district", "state"):
+        p = sub.add_parser(name, help=f"Worst pincodes in a {name}")
+        p.add_argument("name")
+        p.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    p = sub.add_parser("top", help="Worst pincodes overall")
+    p.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    p = sub.add_parser("near", help="Worst pincodes within a radius")
+    p.add_argument("lat", type=float)
+    p.add_argument("lon", type=float)
+    p.add_argument("--radius", type=float, default=10.0, help="Radius in km (default: 10)")
+    p.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    p.add_argument("--order", choices=["worst", "distance"], default="worst")
+    p = sub.add_parser("bbox", help="Worst pincodes inside a bounding box")
+    for name in ("south", "west", "north", "east"):
+        p.add_argument(name, type=float)
+    p.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    p = sub.add_parser("serve", help="Run the local HTTP endpoint")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    service = GapQueryService(args.data, args.master, bands=args.bands)
+
+    if args.command == "serve":
+        return serve(service, args.host, args.port)
+    if args.command == "pincode":
+        result = service.pincode(args.pin)
+    elif args.command in ("district", "state"):
+        result = getattr(service, args.command)(args.name, args.limit)
+    elif args.command == "top":
+        result = service.top(args.limit)
+    elif args.command == "near":
+        result = service.near(args.lat, args.lon, args.radius, args.limit, args.order)
+    else:
+        result = service.bbox(args.south, args.west, args.north, args.east, args.limit)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
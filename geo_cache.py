@@ -0,0 +1,146 @@
+import os
+import json
+import shutil
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# --- 1. CONFIGURATION ---
+# Local cache for the India boundary used by 4_logic_plotting_form.py:
+#   <name>.geojson / <name>.sha256        - the boundary file and its content hash
+#   <name>.simplified-<tol>.wkb           - optional simplified geometry (faster tests)
+#   boundary_verdicts.npz                 - inside/outside per (pincode, lat, lon)
+# With a warm cache the map stage needs no network at all, and reruns only test
+# pincodes whose coordinates changed.
+GEO_CACHE_DIR = os.path.join("Cleaned_Data", "geo_cache")
+VERDICTS_FILE = "boundary_verdicts.npz"
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_paths(url, cache_dir=GEO_CACHE_DIR):
+    name = os.path.splitext(os.path.basename(url))[0] or "boundary"
+    base = os.path.join(cache_dir, name)
+    return base + ".geojson", base + ".sha256"
+
+
+# --- 2. BOUNDARY FILE ---
+# Returns (geo_data, sha256) or (None, None) when nothing is available.
+# Order: local file given by the user -> verified cache -> download (unless offline).
+def load_boundary(url, local_path=None, offline=False, refresh=False, cache_dir=GEO_CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    geo_path, hash_path = cache_paths(url, cache_dir)
+
+    if local_path:
+        shutil.copyfile(local_path, geo_path)
+        with open(geo_path, 'rb') as f:
+            digest = sha256_bytes(f.read())
+        with open(hash_path, 'w') as f:
+            f.write(digest)
+        print(f" Boundary cached from local file: {local_path}")
+
+    elif os.path.exists(geo_path) and not refresh:
+        with open(geo_path, 'rb') as f:
+            raw = f.read()
+        digest = sha256_bytes(raw)
+        expected = None
+        if os.path.exists(hash_path):
+            with open(hash_path) as f:
+                expected = f.read().strip()
+        if expected == digest:
+            return json.loads(raw), digest
+        print(" [WARN] Cached boundary file failed its hash check.")
+        if offline:
+            return None, None
+
+    if not local_path:
+        if offline:
+            print(" [WARN] Offline mode and no cached boundary file.")
+            return None, None
+        try:
+            import requests
+            resp = requests.get(url, timeout=60)
+            resp.raise_for_status()
+            raw = resp.content
+            json.loads(raw)  # Refuse to cache anything that is not JSON
+        except Exception as e:
+            print(f" [WARN] Could not download boundary file: {e}")
+            return None, None
+        digest = sha256_bytes(raw)
+        with open(geo_path, 'wb') as f:
+            f.write(raw)
+        with open(hash_path, 'w') as f:
+            f.write(digest)
+        print(f" Boundary downloaded and cached: {geo_path}")
+
+    with open(geo_path, 'rb') as f:
+        raw = f.read()
+    return json.loads(raw), sha256_bytes(raw)
+
+
+# Simplified copy of the geometry, cached per (boundary hash, tolerance).
+# Faster to test against, but points within ~tolerance degrees of the border may flip.
+def simplified_geometry(geometry, boundary_hash, tolerance, cache_dir=GEO_CACHE_DIR):
+    import shapely
+
+    path = os.path.join(cache_dir, f"{boundary_hash[:16]}.simplified-{tolerance:g}.wkb")
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return shapely.from_wkb(f.read())
+    simple = shapely.simplify(geometry, tolerance, preserve_topology=True)
+    with open(path, 'wb') as f:
+        f.write(shapely.to_wkb(simple))
+    return simple
+
+
+# --- 3. PERSISTED VERDICTS ---
+# Keyed by pincode + exact coordinates. The whole table is dropped when the
+# geometry key (boundary hash + simplification) changes.
+class VerdictCache:
+    def __init__(self, geometry_key, cache_dir=GEO_CACHE_DIR):
+        self.path = os.path.join(cache_dir, VERDICTS_FILE)
+        self.geometry_key = geometry_key
+        self.table = pd.DataFrame({
+            'pincode': pd.Series([], dtype=str),
+            'latitude': pd.Series([], dtype=np.float64),
+            'longitude': pd.Series([], dtype=np.float64),
+            'inside': pd.Series([], dtype=bool),
+        })
+        if os.path.exists(self.path):
+            with np.load(self.path, allow_pickle=False) as data:
+                if str(data['geometry_key']) == geometry_key:
+                    self.table = pd.DataFrame({col: data[col] for col in self.table.columns})
+
+    # Returns (inside, known): verdicts for known rows, known=False for rows to test
+    def lookup(self, pincodes, lat, lon):
+        points = pd.DataFrame({'pincode': np.asarray(pincodes, dtype=str), 'lat': lat, 'lon': lon})
+        joined = points.merge(self.table.drop_duplicates('pincode', keep='last'),
+                              on='pincode', how='left')
+        known = ((joined['latitude'] == joined['lat']) & (joined['longitude'] == joined['lon'])).to_numpy()
+        inside = joined['inside'].fillna(False).astype(bool).to_numpy() & known
+        return inside, known
+
+    def update(self, pincodes, lat, lon, inside):
+        fresh = pd.DataFrame({
+            'pincode': np.asarray(pincodes, dtype=str),
+            'latitude': np.asarray(lat, dtype=np.float64),
+            'longitude': np.asarray(lon, dtype=np.float64),
+            'inside': np.asarray(inside, dtype=bool),
+        })
+        keep = self.table[~self.table['pincode'].isin(fresh['pincode'])]
+        self.table = pd.concat([keep, fresh], ignore_index=True)
+
+    def save(self):
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            geometry_key=np.array(self.geometry_key),
+            pincode=self.table['pincode'].to_numpy(dtype=str),
+            latitude=self.table['latitude'].to_numpy(dtype=np.float64),
+            longitude=self.table['longitude'].to_numpy(dtype=np.float64),
+            inside=self.table['inside'].to_numpy(dtype=bool),
+        )
+        os.replace(tmp_path, self.path)
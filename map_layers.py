@@ -0,0 +1,228 @@
+import json
+
+import numpy as np
+from branca.element import MacroElement, Template
+from folium.elements import JSCSSMixin
+
+# --- 1. COMPACT POINT LAYER ---
+# All points go into the page as one columnar JSON block (lat, lon, z, band, pin,
+# district id) and are drawn by a single Leaflet canvas renderer. Popups are built
+# on click from those arrays, so there is no HTML per marker and the page size grows
+# by a few bytes per point instead of ~1 KB.
+# The optional heat layer is built in the browser from the same arrays.
+HEAT_JS = ('leaflet-heat.js',
+           'https://cdn.jsdelivr.net/gh/python-visualization/folium@main/folium/templates/leaflet_heat.min.js')
+
+POINT_LAYER_TEMPLATE = """
+{% macro script(this, kwargs) %}
+(function() {
+    var data = {{ this.payload }};
+    var map = {{ this._parent.get_name() }};
+    var renderer = L.canvas({padding: 0.5});
+    var layer = L.featureGroup();
+
+    for (var i = 0; i < data.lat.length; i++) {
+        var band = data.bands[data.band[i]];
+        L.circleMarker([data.lat[i], data.lon[i]], {
+            renderer: renderer, radius: band.radius, color: band.color, weight: 0,
+            fill: true, fillColor: band.color, fillOpacity: band.opacity, idx: i
+        }).addTo(layer);
+    }
+
+    layer.on('click', function(e) {
+        var i = e.layer.options.idx;
+        var band = data.bands[data.band[i]];
+        L.popup()
+            .setLatLng(e.latlng)
+            .setContent(
+                "<div style='font-family:sans-serif; width:160px;'>" +
+                "<b>" + data.districts[data.district[i]] + "</b><br>" +
+                "<span style='color:" + band.color + "; font-weight:bold;'>" + band.label + "</span><br>" +
+                "<span style='font-size:10px; color:#aaa;'>PIN: " + data.pin[i] + "</span></div>")
+            .openOn(map);
+    });
+    layer.addTo(map);
+
+    {% if this.heatmap %}
+    var heat = [];
+    for (var j = 0; j < data.lat.length; j++) { heat.push([data.lat[j], data.lon[j], data.z[j]]); }
+    L.heatLayer(heat, {{ this.heat_options }}).addTo(map);
+    {% endif %}
+})();
+{% endmacro %}
+"""
+
+
+class CompactPointLayer(JSCSSMixin, MacroElement):
+    default_js = [HEAT_JS]
+
+    # bands: list of dicts with radius / opacity / color / label, indexed by band_index
+    def __init__(self, lat, lon, z, band_index, pincodes, districts, bands,
+                 heatmap=True, heat_options=None):
+        super().__init__()
+        self._name = "CompactPointLayer"
+        self._template = Template(POINT_LAYER_TEMPLATE)
+
+        district_names, district_idx = np.unique(np.asarray(districts, dtype=str), return_inverse=True)
+        payload = {
+            'lat': np.round(np.asarray(lat, dtype=float), 5).tolist(),
+            'lon': np.round(np.asarray(lon, dtype=float), 5).tolist(),
+            'z': np.round(np.asarray(z, dtype=float), 3).tolist(),
+            'band': np.asarray(band_index, dtype=int).tolist(),
+            'pin': np.asarray(pincodes).astype(str).tolist(),
+            'district': district_idx.tolist(),
+            'districts': district_names.tolist(),
+            'bands': bands,
+        }
+        self.payload = json.dumps(payload, separators=(',', ':')).replace('</', '<\\/')
+        self.heatmap = heatmap
+        self.heat_options = json.dumps(heat_options or {})
+        if not heatmap:
+            self.default_js = []
+
+
+# --- 2. ZOOM-DEPENDENT LAYERS ---
+# Shows exactly one of several layers depending on the zoom level, e.g. the
+# density rasters from density_raster.py at different resolutions.
+ZOOM_SWITCH_TEMPLATE = """
+{% macro script(this, kwargs) %}
+(function() {
+    var map = {{ this._parent.get_name() }};
+    var levels = [
+        {% for min_zoom, max_zoom, layer in this.levels %}[{{ min_zoom }}, {{ max_zoom }}, {{ layer.get_name() }}],
+        {% endfor %}
+    ];
+    function update() {
+        var zoom = map.getZoom();
+        levels.forEach(function(level) {
+            var visible = zoom >= level[0] && zoom <= level[1];
+            if (visible && !map.hasLayer(level[2])) { map.addLayer(level[2]); }
+            if (!visible && map.hasLayer(level[2])) { map.removeLayer(level[2]); }
+        });
+    }
+    map.on('zoomend', update);
+    update();
+})();
+{% endmacro %}
+"""
+
+
+class ZoomSwitch(MacroElement):
+    # levels: [(min_zoom, max_zoom, folium layer already added to the map)]
+    def __init__(self, levels):
+        super().__init__()
+        self._name = "ZoomSwitch"
+        self._template = Template(ZOOM_SWITCH_TEMPLATE)
+        self.levels = levels
+
+
+# --- 3. TIME SLICES ---
+# One month of points per data chunk. Chunks are small JSONP files next to the HTML
+# (<chunk dir>/<month>.js calling gapMonthLoaded(key, data)), added as <script> tags
+# only when their month is selected, so they also load from file:// where fetch()
+# of local files is blocked. The page itself only carries the month list and the
+# shared district and band tables; the initial view costs one chunk.
+MONTH_SLICES_TEMPLATE = """
+{% macro script(this, kwargs) %}
+(function() {
+    var meta = {{ this.meta }};
+    var map = {{ this._parent.get_name() }};
+    var renderer = L.canvas({padding: 0.5});
+    var layers = {}, loading = {}, current = null, wanted = null;
+
+    function build(data) {
+        var points = L.featureGroup();
+        for (var i = 0; i < data.lat.length; i++) {
+            var band = meta.bands[data.band[i]];
+            L.circleMarker([data.lat[i], data.lon[i]], {
+                renderer: renderer, radius: band.radius, color: band.color, weight: 0,
+                fill: true, fillColor: band.color, fillOpacity: band.opacity, idx: i
+            }).addTo(points);
+        }
+        points.on('click', function(e) {
+            var i = e.layer.options.idx;
+            var band = meta.bands[data.band[i]];
+            var load = data.load ? "<br><span style='font-size:10px;'>Load: " + data.load[i] + "</span>" : "";
+            L.popup()
+                .setLatLng(e.latlng)
+                .setContent(
+                    "<div style='font-family:sans-serif; width:160px;'>" +
+                    "<b>" + meta.districts[data.district[i]] + "</b><br>" +
+                    "<span style='color:" + band.color + "; font-weight:bold;'>" + band.label + "</span><br>" +
+                    "<span style='font-size:10px; color:#aaa;'>PIN: " + data.pin[i] + "</span>" + load + "</div>")
+                .openOn(map);
+        });
+        var group = L.layerGroup([points]);
+        {% if this.heatmap %}
+        var heat = [];
+        for (var j = 0; j < data.lat.length; j++) { heat.push([data.lat[j], data.lon[j], data.z[j]]); }
+        group.addLayer(L.heatLayer(heat, meta.heat_options));
+        {% endif %}
+        return group;
+    }
+
+    function show(key) {
+        if (current !== null) { map.removeLayer(layers[current]); }
+        current = key;
+        layers[key].addTo(map);
+    }
+
+    window.gapMonthLoaded = function(key, data) {
+        layers[key] = build(data);
+        delete loading[key];
+        if (key === wanted) { show(key); }
+    };
+
+    function select(key) {
+        wanted = key;
+        if (layers[key]) { show(key); return; }
+        if (loading[key]) { return; }
+        loading[key] = true;
+        var script = document.createElement('script');
+        script.src = meta.base + '/' + meta.files[key];
+        document.head.appendChild(script);
+    }
+
+    var control = L.control({position: 'topright'});
+    control.onAdd = function() {
+        var div = L.DomUtil.create('div');
+        div.style.cssText = 'background:rgba(0,0,0,0.85); color:#fff; padding:8px 10px; ' +
+                            'border-radius:6px; font-family:sans-serif; font-size:13px;';
+        var options = meta.slices.map(function(s) {
+            return '<option value="' + s.key + '"' + (s.key === meta.initial ? ' selected' : '') + '>' +
+                   s.label + ' (' + s.points + ')</option>';
+        }).join('');
+        div.innerHTML = 'Period: <select>' + options + '</select>';
+        L.DomEvent.disableClickPropagation(div);
+        div.querySelector('select').addEventListener('change', function(e) { select(e.target.value); });
+        return div;
+    };
+    control.addTo(map);
+    select(meta.initial);
+})();
+{% endmacro %}
+"""
+
+
+class MonthSlices(JSCSSMixin, MacroElement):
+    default_js = [HEAT_JS]
+
+    # slices: [{'key', 'label', 'file', 'points'}] in display order; base: chunk folder
+    # relative to the HTML file; districts / bands: tables the chunks index into
+    def __init__(self, slices, base, initial, districts, bands, heatmap=True, heat_options=None):
+        super().__init__()
+        self._name = "MonthSlices"
+        self._template = Template(MONTH_SLICES_TEMPLATE)
+        meta = {
+            'slices': [{k: s[k] for k in ('key', 'label', 'points')} for s in slices],
+            'files': {s['key']: s['file'] for s in slices},
+            'base': base,
+            'initial': initial,
+            'districts': list(districts),
+            'bands': bands,
+            'heat_options': heat_options or {},
+        }
+        self.meta = json.dumps(meta, separators=(',', ':')).replace('</', '<\\/')
+        self.heatmap = heatmap
+        if not heatmap:
+            self.default_js = []
@@ -0,0 +1,197 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from severity_engine import SOURCE_INDEX, PIN_SLOTS, standard_scale, ema_frame
+from quantile_sketch import GapSketches
+
+# --- 1. CONFIGURATION ---
+# Online EMA for 3_calc_severity.py --online.
+# Instead of reweighting every month from January to December on each run, the state
+# keeps one EMA per pincode. When a new month lands:
+#   EMA_i <- DECAY ** (months elapsed) * EMA_i + raw_load_t(new month)
+# and the z-scores are standardized from the EMA array itself (two-pass, as in the batch
+# engine), in O(pincodes), so nothing drifts however many months are applied.
+# Months are keyed by Period (YYYY-MM, written by 1_data_parsing.py), so data spanning
+# several years no longer collides on the bare month name.
+# The raw totals of the last OPEN_PERIODS months are kept so late files for those
+# months still update the EMA exactly; older late data needs --rebuild-state.
+STATE_PATH = os.path.join("Cleaned_Data", "ema_state.npz")
+FILES_PATH = os.path.join("Cleaned_Data", "ema_state_files.json")
+# Source score sketches (quantile_sketch.py) of the closed periods; a period is added
+# once, when it closes, so late files never count a (pincode, period) twice
+SKETCHES_PATH = os.path.join("Cleaned_Data", "ema_state_sketches.json")
+
+DECAY = 0.75  # Same ~x0.75 per month as MONTH_WEIGHTS, without the rounding
+OPEN_PERIODS = 3
+
+
+def period_index(period):
+    # "2025-12" -> months since year 0
+    year, month = str(period).split("-")[:2]
+    return int(year) * 12 + int(month) - 1
+
+
+def period_name(index):
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+# Formula: (1*Et + 1.2*Dt + 1.5*Bt) / (3 + 1/3 * Nt), totals rows = Et, Bt, Dt, Nt
+def raw_load(totals):
+    Et, Bt, Dt, Nt = totals
+    return ((1.0 * Et) + (1.2 * Dt) + (1.5 * Bt)) / (3.0 + (Nt / 3.0))
+
+
+# --- 2. STATE ---
+class OnlineEMA:
+    def __init__(self, decay=DECAY, open_periods=OPEN_PERIODS):
+        self.decay = decay
+        self.open_periods = open_periods
+        self.pin_code = np.full(PIN_SLOTS, -1, dtype=np.int32)
+        self.pins = np.empty(0, dtype=np.int32)
+        self.ema = np.empty(0, dtype=np.float64)
+        self.max_nt = np.empty(0, dtype=np.float64)
+        self.last_period = -1
+        self.totals = {}        # period index -> [4, pins] (Et, Bt, Dt, Nt)
+        self.files = {}         # path -> [size, mtime_ns, sha256] of applied files
+        self.skipped_rows = 0   # late (pincode, period) totals for periods already closed
+        self.closed = GapSketches()  # source scores of the closed periods
+
+    @classmethod
+    def load(cls, path=STATE_PATH, files_path=FILES_PATH, sketches_path=SKETCHES_PATH):
+        state = cls()
+        if not os.path.exists(path):
+            return state
+        with np.load(path, allow_pickle=False) as data:
+            state.decay = float(data['decay'])
+            state.open_periods = int(data['open_periods'])
+            state.pins = data['pins']
+            state.ema = data['ema']
+            state.max_nt = data['max_nt']
+            state.last_period = int(data['last_period'])
+            for period, totals in zip(data['open_period_ids'], data['open_totals']):
+                state.totals[int(period)] = totals.copy()
+        state.pin_code[state.pins] = np.arange(len(state.pins), dtype=np.int32)
+        if os.path.exists(files_path):
+            with open(files_path) as f:
+                state.files = json.load(f)
+        state.closed = GapSketches.load(sketches_path) or state.closed
+        return state
+
+    def save(self, path=STATE_PATH, files_path=FILES_PATH, sketches_path=SKETCHES_PATH):
+        periods = sorted(self.totals)
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            decay=np.float64(self.decay),
+            open_periods=np.int64(self.open_periods),
+            pins=self.pins,
+            ema=self.ema,
+            max_nt=self.max_nt,
+            last_period=np.int64(self.last_period),
+            open_period_ids=np.array(periods, dtype=np.int64),
+            open_totals=np.array([self.totals[p] for p in periods]).reshape(len(periods), 4, len(self.pins)),
+        )
+        os.replace(tmp_path, path)
+        with open(files_path + ".tmp", "w") as f:
+            json.dump(self.files, f, indent=1)
+        os.replace(files_path + ".tmp", files_path)
+        self.closed.save(sketches_path)
+
+    # --- 3. UPDATES ---
+    def _codes(self, pins):
+        pins = np.asarray(pins, dtype=np.int64)
+        codes = self.pin_code[pins]
+        if (codes < 0).any():
+            # New pincodes start at EMA 0
+            new_pins = np.unique(pins[codes < 0]).astype(np.int32)
+            self.pin_code[new_pins] = np.arange(len(self.pins), len(self.pins) + len(new_pins))
+            self.pins = np.concatenate([self.pins, new_pins])
+            self.ema = np.concatenate([self.ema, np.zeros(len(new_pins))])
+            self.max_nt = np.concatenate([self.max_nt, np.zeros(len(new_pins))])
+            for period in self.totals:
+                self.totals[period] = np.pad(self.totals[period], ((0, 0), (0, len(new_pins))))
+            codes = self.pin_code[pins]
+        return codes
+
+    def _advance(self, period):
+        # Decay every pincode once per elapsed month
+        factor = self.decay ** (period - self.last_period) if self.last_period >= 0 else 1.0
+        self.ema *= factor
+        # Months skipped by this batch are opened too, so their late files still count
+        first = self.last_period + 1 if self.last_period >= 0 else period
+        for opened in range(max(first, period - self.open_periods + 1), period + 1):
+            self.totals[opened] = np.zeros((4, len(self.pins)))
+        self.last_period = period
+        for old in [p for p in self.totals if p <= period - self.open_periods]:
+            self._sketch_period(self.closed, old)
+            del self.totals[old]
+
+    # Adds one period's per-pincode source scores (cells where the source scored)
+    def _sketch_period(self, sketches, period):
+        for f_type, src in SOURCE_INDEX.items():
+            cells = self.totals[period][src]
+            sketches.add_scores(f_type, cells[cells != 0])
+
+    # frame: pincode, Period, f_type, score, txn_count (already reduced per file)
+    def apply(self, frame):
+        if frame.empty:
+            return
+        periods = frame['Period'].map(period_index)
+        for period in sorted(periods.unique()):
+            rows = frame[(periods == period).to_numpy()]
+            if period > self.last_period:
+                self._advance(period)
+            elif period not in self.totals:
+                self.skipped_rows += len(rows)
+                continue
+            self._add(period, rows)
+
+    def _add(self, period, rows):
+        codes = self._codes(rows['pincode'].to_numpy())
+        totals = self.totals[period]
+        touched = np.unique(codes)
+        before = raw_load(totals[:, touched])
+
+        src = rows['f_type'].map(SOURCE_INDEX).to_numpy()
+        np.add.at(totals, (src, codes), rows['score'].to_numpy(dtype=np.float64))
+        np.add.at(totals[3], codes, rows['txn_count'].to_numpy(dtype=np.float64))
+        self.max_nt[touched] = np.maximum(self.max_nt[touched], totals[3, touched])
+
+        # A month k steps back carries weight DECAY ** k, exactly as if it had been
+        # complete when it was first applied
+        weight = self.decay ** (self.last_period - period)
+        self.ema[touched] += weight * (raw_load(totals[:, touched]) - before)
+
+    # --- 4. RESULT ---
+    def result(self):
+        order = np.argsort(self.pins, kind='stable')
+        ema = self.ema[order]
+        final_ema = ema_frame(self.pins[order], ema)
+        # Same StandardScaler replica as the batch engine; running sums of EMA ** 2
+        # would lose precision to cancellation and drift with every update
+        final_ema['z_score'] = standard_scale(ema)
+        return final_ema
+
+    # Source score sketches over every period: the closed ones plus the open ones as they are now
+    def source_sketches(self):
+        sketches = GapSketches().merge(self.closed)
+        for period in sorted(self.totals):
+            self._sketch_period(sketches, period)
+        return sketches.sources
+
+    # Raw load and Nt of the open periods per pincode, for save_monthly_loads.
+    # Closed periods are only kept inside the EMA, so they are not listed, and neither
+    # are open months no file has reached yet (the batch engine has no column for them).
+    def monthly_loads(self):
+        order = np.argsort(self.pins, kind='stable')
+        periods = [p for p in sorted(self.totals) if self.totals[p].any()]
+        n = len(self.pins)
+        loads = np.column_stack([raw_load(self.totals[p])[order] for p in periods]) if periods else np.empty((n, 0))
+        nt = np.column_stack([self.totals[p][3][order] for p in periods]) if periods else np.empty((n, 0))
+        return self.pins[order], [period_name(p) for p in periods], loads, nt
+
+    def latest_period(self):
+        return period_name(self.last_period) if self.last_period >= 0 else None
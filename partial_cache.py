@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# --- 1. CONFIGURATION ---
+# Per-file partial aggregates for 3_calc_severity.py.
+# manifest.json records size, mtime and SHA-256 of every input file together with
+# the (pincode, Month) -> score / txn_count partial computed from it. A rerun only
+# reads files that are new or whose content changed.
+CACHE_DIR = os.path.join("Cleaned_Data", ".severity_cache")
+MANIFEST_NAME = "manifest.json"
+
+# Bump when the scoring logic changes so old partials are not reused
+CACHE_VERSION = 3
+
+PARTIAL_COLUMNS = ['pincode', 'Month', 'score', 'txn_count']
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def empty_partial():
+    return pd.DataFrame({
+        'pincode': pd.Series([], dtype=np.int32),
+        'Month': pd.Series([], dtype=object),
+        'score': pd.Series([], dtype=np.float64),
+        'txn_count': pd.Series([], dtype=np.int64),
+    })
+
+
+# --- 2. PARTIAL STORAGE ---
+# Saved as .npz so float64 scores round-trip bit for bit (no text formatting).
+def save_partial(df, path):
+    np.savez(
+        path,
+        pincode=df['pincode'].to_numpy(dtype=np.int32),
+        Month=df['Month'].to_numpy(dtype=str),
+        score=df['score'].to_numpy(dtype=np.float64),
+        txn_count=df['txn_count'].to_numpy(dtype=np.int64),
+    )
+
+
+def load_partial(path):
+    with np.load(path, allow_pickle=False) as data:
+        df = pd.DataFrame({col: data[col] for col in PARTIAL_COLUMNS})
+    df['Month'] = df['Month'].astype(object)
+    return df
+
+
+# --- 3. THE CACHE ---
+class PartialCache:
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+        self.entries = {}
+        self.seen = set()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('version') == CACHE_VERSION:
+                self.entries = manifest.get('files', {})
+            else:
+                print(" [WARN] Partial cache was built by another version; rebuilding.")
+
+    def key(self, path, f_type):
+        return f"{f_type}:{os.path.normpath(path)}"
+
+    # Returns the cached partial, or None when the file is new or changed
+    def get(self, path, f_type):
+        key = self.key(path, f_type)
+        self.seen.add(key)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stat = os.stat(path)
+        partial_path = os.path.join(self.cache_dir, entry['partial'])
+        if not os.path.exists(partial_path):
+            self.misses += 1
+            return None
+
+        if entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+            # Touched or rewritten: only trust the partial if the content is identical
+            if entry['size'] != stat.st_size or entry['sha256'] != file_sha256(path):
+                self.misses += 1
+                return None
+            entry['mtime_ns'] = stat.st_mtime_ns
+
+        self.hits += 1
+        return load_partial(partial_path)
+
+    def put(self, path, f_type, partial):
+        key = self.key(path, f_type)
+        self.seen.add(key)
+        stat = os.stat(path)
+        sha = file_sha256(path)
+        name = f"{f_type}_{sha[:32]}.npz"
+        save_partial(partial, os.path.join(self.cache_dir, name))
+        self.entries[key] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': sha,
+            'partial': name,
+        }
+
+    # Drops entries for files that no longer exist and writes the manifest
+    def save(self):
+        removed = [k for k in self.entries if k not in self.seen]
+        for key in removed:
+            del self.entries[key]
+
+        in_use = {entry['partial'] for entry in self.entries.values()}
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz') and name not in in_use:
+                os.remove(os.path.join(self.cache_dir, name))
+
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'files': self.entries}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
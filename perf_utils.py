@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import time
+from contextlib import contextmanager
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+# --- MEMORY PROBES ---
+# Small helpers so every stage reports memory the same way (values in MB).
+
+def peak_rss_mb():
+    # Highest resident set size this process has reached so far
+    if resource is None:
+        return current_rss_mb()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def current_rss_mb():
+    # Resident set size right now (Linux /proc). Falls back to 0 elsewhere.
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0.0
+
+
+def format_rate(rows, seconds):
+    # Rows/sec with a guard for very fast (0 sec) runs
+    if seconds <= 0:
+        return "n/a"
+    return f"{rows / seconds:,.0f}"
+
+
+# --- RUN REPORTS ---
+# Every stage records its steps (wall time, CPU time, peak RSS, rows in/out) and
+# writes them to Cleaned_Data/run_reports/:
+#   <stage>.json     - the latest run of that stage
+#   history.jsonl    - one line per run, for month-over-month comparisons
+# Peak RSS is per step on Linux (the VmHWM high-water mark is reset when a step
+# starts); elsewhere it is the process peak so far. CPU time covers this process only.
+REPORT_DIR = os.path.join("Cleaned_Data", "run_reports")
+
+
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def high_water_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return peak_rss_mb()
+
+
+class Step:
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_rss_mb = 0.0  # None when the step was not sampled (left out of the record)
+        self.extra = {}  # anything else worth keeping, e.g. cache hits
+
+    def record(self):
+        rows = self.rows_in if self.rows_in is not None else self.rows_out
+        out = {
+            "step": self.name,
+            "seconds": round(self.seconds, 4),
+            "cpu_seconds": round(self.cpu_seconds, 4),
+            "peak_rss_mb": round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rows_per_sec": round(rows / self.seconds, 1) if rows is not None and self.seconds > 0 else None,
+        }
+        if self.peak_rss_mb is None:
+            del out["peak_rss_mb"]
+        out.update(self.extra)
+        return out
+
+
+class RunReport:
+    def __init__(self, stage, options=None, report_dir=REPORT_DIR):
+        self.stage = stage
+        self.options = options or {}
+        self.report_dir = report_dir
+        self.steps = []
+        self.open_steps = []
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.start = time.perf_counter()
+        self.cpu_start = time.process_time()
+
+    def _update_peaks(self):
+        rss = high_water_rss_mb()
+        for step in self.open_steps:
+            step.peak_rss_mb = max(step.peak_rss_mb, rss)
+
+    @contextmanager
+    def step(self, name, rows_in=None):
+        step = Step(name, rows_in)
+        # Outer steps keep the peak reached so far before the high-water mark is reset
+        self._update_peaks()
+        reset_peak_rss()
+        self.open_steps.append(step)
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield step
+        finally:
+            step.seconds = time.perf_counter() - start
+            step.cpu_seconds = time.process_time() - cpu_start
+            self._update_peaks()
+            self.open_steps.remove(step)
+            self.steps.append(step)
+
+    # For work measured elsewhere, e.g. in a worker process
+    def add(self, name, seconds, rows_in=None, rows_out=None, peak_rss_mb=None, cpu_seconds=None, **extra):
+        step = Step(name, rows_in)
+        step.rows_out = rows_out
+        step.seconds = seconds
+        step.cpu_seconds = cpu_seconds or 0.0
+        step.peak_rss_mb = peak_rss_mb
+        step.extra = extra
+        self.steps.append(step)
+        return step
+
+    def to_dict(self, rows_in=None, rows_out=None):
+        seconds = time.perf_counter() - self.start
+        rows = rows_in if rows_in is not None else rows_out
+        return {
+            "stage": self.stage,
+            "started_at": self.started_at,
+            "options": self.options,
+            "seconds": round(seconds, 4),
+            "cpu_seconds": round(time.process_time() - self.cpu_start, 4),
+            # Resetting VmHWM also resets ru_maxrss on Linux, so fold in the step peaks
+            "peak_rss_mb": round(max([peak_rss_mb()] + [step.peak_rss_mb for step in self.steps
+                                                        if step.peak_rss_mb is not None]), 1),
+            "rows_in": rows_in,
+            "rows_out": rows_out,
+            "rows_per_sec": round(rows / seconds, 1) if rows is not None and seconds > 0 else None,
+            "steps": [step.record() for step in self.steps],
+        }
+
+    def summary(self, report, limit=12):
+        print(f"\n--- PERF: {self.stage} ({report['seconds']:.2f}s wall, "
+              f"{report['cpu_seconds']:.2f}s CPU, peak RSS {report['peak_rss_mb']:,.0f} MB) ---")
+        steps = sorted(report["steps"], key=lambda s: s["seconds"], reverse=True)
+        for s in steps[:limit]:
+            rows = s["rows_in"] if s["rows_in"] is not None else s["rows_out"]
+            rows_text = f"{rows:>12,}" if rows is not None else f"{'':>12}"
+            rss_text = f"{s['peak_rss_mb']:8,.0f} MB" if "peak_rss_mb" in s else f"{'':>11}"
+            print(f"   {s['step'][:40]:<40} {s['seconds']:8.3f}s {rss_text} {rows_text} rows "
+                  f"{format_rate(rows, s['seconds']) if rows is not None else '':>12}/s")
+        if len(steps) > limit:
+            print(f"   ... {len(steps) - limit} more step(s) in the JSON report")
+
+    # Prints the console summary and writes the JSON report; returns the report dict
+    def finish(self, rows_in=None, rows_out=None, write=True, quiet=False):
+        report = self.to_dict(rows_in, rows_out)
+        if not quiet:
+            self.summary(report)
+        if write:
+            os.makedirs(self.report_dir, exist_ok=True)
+            path = os.path.join(self.report_dir, f"{self.stage}.json")
+            with open(path + ".tmp", "w") as f:
+                json.dump(report, f, indent=1)
+            os.replace(path + ".tmp", path)
+            with open(os.path.join(self.report_dir, "history.jsonl"), "a") as f:
+                f.write(json.dumps(report, separators=(",", ":")) + "\n")
+            if not quiet:
+                print(f"   Report: {path}")
+        return report
+
+
+# Lets helpers take report=None and still use 'with track(report, ...) as step:'
+@contextmanager
+def track(report, name, rows_in=None):
+    if report is None:
+        yield Step(name, rows_in)
+    else:
+        with report.step(name, rows_in) as step:
+            yield step
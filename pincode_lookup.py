@@ -0,0 +1,97 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from pincode_parse import parse_pincodes, PIN_MIN, PIN_MAX, MISSING_PIN
+
+# --- 1. CONFIGURATION ---
+# Direct-indexed pincode table written by 2_pincode_clean.py.
+# Slot (pincode - PIN_MIN) holds latitude, longitude, district id and state id, so a
+# join is a single vectorized gather on a memory-mapped array (no string keys, no merge).
+#   pincode_lookup.npy         - structured array, one row per pincode 100000..999999
+#   pincode_lookup_names.json  - {"districts": [...], "states": [...]} for the ids
+LOOKUP_PATH = os.path.join("Cleaned_Data", "pincode_lookup.npy")
+NAMES_PATH = os.path.join("Cleaned_Data", "pincode_lookup_names.json")
+
+LOOKUP_DTYPE = np.dtype([
+    ('latitude', np.float64),
+    ('longitude', np.float64),
+    ('district_id', np.int16),
+    ('state_id', np.int16),
+])
+
+
+# --- 2. BUILD ---
+# df needs: pincode, district, statename (or state), latitude, longitude
+def build_lookup(df, path=LOOKUP_PATH, names_path=NAMES_PATH):
+    state_col = 'statename' if 'statename' in df.columns else 'state'
+    pins = parse_pincodes(df['pincode'])
+    df = df[pins != MISSING_PIN]
+    pins = pins[pins != MISSING_PIN].astype(np.int64)
+
+    district_ids, districts = pd.factorize(df['district'], sort=True)
+    state_ids, states = pd.factorize(df[state_col], sort=True)
+
+    table = np.zeros(PIN_MAX - PIN_MIN + 1, dtype=LOOKUP_DTYPE)
+    table['latitude'] = np.nan
+    table['longitude'] = np.nan
+    table['district_id'] = -1
+    table['state_id'] = -1
+
+    # Later rows win, like a dict; 2_pincode_clean.py already removed duplicates
+    slots = pins - PIN_MIN
+    table['latitude'][slots] = pd.to_numeric(df['latitude'], errors='coerce').to_numpy()
+    table['longitude'][slots] = pd.to_numeric(df['longitude'], errors='coerce').to_numpy()
+    table['district_id'][slots] = district_ids
+    table['state_id'][slots] = state_ids
+
+    np.save(path, table)
+    with open(names_path, 'w') as f:
+        json.dump({'districts': list(map(str, districts)), 'states': list(map(str, states))}, f)
+    return table
+
+
+# --- 3. LOOKUP ---
+class PincodeLookup:
+    def __init__(self, path=LOOKUP_PATH, names_path=NAMES_PATH, mmap=True):
+        self.table = np.load(path, mmap_mode='r' if mmap else None)
+        with open(names_path) as f:
+            names = json.load(f)
+        self.districts = names['districts']
+        self.states = names['states']
+
+    # Vectorized join: one row per input pincode, in input order.
+    # 'found' is False for pincodes that are malformed or missing from the master.
+    def gather(self, pincodes):
+        pins = parse_pincodes(pincodes).astype(np.int64)
+        valid = pins != MISSING_PIN
+        slots = np.where(valid, pins - PIN_MIN, 0)
+        rows = self.table[slots]
+
+        found = valid & ~np.isnan(rows['latitude'])
+        district_id = np.where(found, rows['district_id'], -1)
+        state_id = np.where(found, rows['state_id'], -1)
+        return pd.DataFrame({
+            'latitude': np.where(found, rows['latitude'], np.nan),
+            'longitude': np.where(found, rows['longitude'], np.nan),
+            'district': pd.Categorical.from_codes(district_id, categories=self.districts),
+            'state': pd.Categorical.from_codes(state_id, categories=self.states),
+            'found': found,
+        })
+
+
+def lookup_available(path=LOOKUP_PATH, names_path=NAMES_PATH):
+    return os.path.exists(path) and os.path.exists(names_path)
+
+
+# Inner join of a frame with a 'pincode' column against the lookup table
+def join_master(df, columns, lookup=None):
+    lookup = lookup or PincodeLookup()
+    geo = lookup.gather(df['pincode'])
+    keep = geo['found'].to_numpy()
+    out = df[keep].copy()
+    for col in columns:
+        out[col] = geo[col][keep].array
+    return out
@@ -0,0 +1,66 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# --- 1. CONFIGURATION ---
+# Pincode extraction shared by stages 1-5.
+# Pincodes are parsed numerically into int32 (-1 = not a pincode) instead of string
+# splitting and regex on every row. Values that are not plain numbers ("PIN 110001",
+# "110 001") fall back to the old digit extraction, on those rows only.
+PIN_MIN, PIN_MAX = 100000, 999999
+MISSING_PIN = -1
+
+# Column detection: share of 6-digit pincodes in a bounded sample of each column
+DETECT_SAMPLE_ROWS = 1000
+DETECT_MIN_SHARE = 0.10
+PINCODE_HEADER = re.compile(r'^\s*pin\s*_?\s*code\s*$', re.IGNORECASE)
+
+
+# --- 2. PARSING ---
+# values: any array-like of numbers or strings -> int32 array, MISSING_PIN where invalid
+def parse_pincodes(values):
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        nums = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        nums = pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+        other = np.isnan(nums) & series.notna().to_numpy()
+        if other.any():
+            # Digits of the integer part, as clean_pincode used to do for every row
+            digits = series[other].astype(str).str.split('.').str[0].str.replace(r'\D', '', regex=True)
+            digits = digits.where(digits.str.len() == 6)
+            nums[other] = pd.to_numeric(digits, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+    valid = (nums >= PIN_MIN) & (nums < PIN_MAX + 1)
+    return np.where(valid, np.trunc(np.where(valid, nums, 0)), MISSING_PIN).astype(np.int32)
+
+
+# Keeps rows with a valid pincode and stores it as int32 in 'pincode'
+def with_pincodes(df, column='pincode'):
+    pins = parse_pincodes(df[column])
+    keep = pins != MISSING_PIN
+    df = df[keep].copy()
+    if column != 'pincode':
+        df = df.drop(columns=[column])
+    df['pincode'] = pins[keep]
+    return df
+
+
+# --- 3. COLUMN DETECTION ---
+# A column named like "pincode" / "Pin Code" wins. Otherwise the column whose sample
+# has the largest share (above DETECT_MIN_SHARE) of 6-digit pincodes is used.
+def detect_pincode_column(df, sample_rows=DETECT_SAMPLE_ROWS):
+    for col in df.columns:
+        if PINCODE_HEADER.match(str(col)):
+            return col
+
+    best, best_share = None, DETECT_MIN_SHARE
+    sample = df.head(sample_rows)
+    if sample.empty:
+        return None
+    for col in sample.columns:
+        share = (parse_pincodes(sample[col]) != MISSING_PIN).mean()
+        if share > best_share:
+            best, best_share = col, share
+    return best
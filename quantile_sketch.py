@@ -0,0 +1,368 @@
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+
+# --- 1. CONFIGURATION ---
+# Mergeable distribution sketches for 3_calc_severity.py and the severity bands.
+#   QuantileSketch - log-bucketed counts (DDSketch style). Every quantile is within
+#                    RELATIVE_ACCURACY of the exact value, memory is capped at
+#                    MAX_BUCKETS per sign whatever the number of values, and two
+#                    sketches merge by adding their bucket counts.
+#   MomentSketch   - count, mean, central moments 2-4, min and max; merges exactly
+#                    (Chan / Pebay pairwise formulas), so shards and runs combine.
+# They are written next to the gap analysis as statistical_gap_analysis.sketch.json:
+#   ema      - EMA_i over all pincodes (quantile + moments)
+#   sources  - per source, the (pincode, Month) scores fed to the engine
+#   python quantile_sketch.py Cleaned_Data/statistical_gap_analysis.sketch.json [more ...]
+SKETCH_PATH = os.path.join("Cleaned_Data", "statistical_gap_analysis.sketch.json")
+
+RELATIVE_ACCURACY = 0.01
+MAX_BUCKETS = 2048          # per sign; at 1% this spans ~17 orders of magnitude
+MIN_INDEXABLE = 1e-12       # |x| below this counts as zero
+
+# Severity banding (worst band first, same order as the report and map bands)
+BAND_METHODS = ("zscore", "percentile", "robust")
+Z_CUTOFFS = (3.0, 2.0, 1.0)
+# Shares of a normal distribution above z = 3, 2, 1, so every method keeps the
+# meaning of the bands and only the reference distribution changes
+PERCENTILE_CUTOFFS = (0.99865, 0.97725, 0.84134)
+MAD_TO_SIGMA = 1.4826       # MAD of a normal distribution -> its standard deviation
+
+
+# --- 2. QUANTILE SKETCH ---
+class QuantileSketch:
+    def __init__(self, alpha=RELATIVE_ACCURACY, max_buckets=MAX_BUCKETS):
+        self.alpha = alpha
+        self.max_buckets = max_buckets
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = np.log(self.gamma)
+        # bucket i holds |x| in (gamma^(i-1), gamma^i]; stores are (offset, counts)
+        self.pos = (0, np.zeros(0, dtype=np.int64))
+        self.neg = (0, np.zeros(0, dtype=np.int64))
+        self.zero = 0
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @classmethod
+    def from_values(cls, values, **kwargs):
+        sketch = cls(**kwargs)
+        sketch.add(values)
+        return sketch
+
+    def _store_add(self, store, index, counts):
+        offset, buckets = store
+        if len(index) == 0:
+            return store
+        lo, hi = int(index.min()), int(index.max())
+        if len(buckets):
+            lo, hi = min(lo, offset), max(hi, offset + len(buckets) - 1)
+        grown = np.zeros(hi - lo + 1, dtype=np.int64)
+        if len(buckets):
+            grown[offset - lo:offset - lo + len(buckets)] = buckets
+        grown += np.bincount(index - lo, weights=counts, minlength=len(grown)).astype(np.int64)
+        # Over the cap: fold the lowest buckets (values nearest zero) into the first
+        # kept one, which keeps the upper tail exact to alpha
+        if len(grown) > self.max_buckets:
+            cut = len(grown) - self.max_buckets
+            grown[cut] += grown[:cut].sum()
+            grown, lo = grown[cut:], lo + cut
+        return lo, grown
+
+    def add(self, values):
+        x = np.asarray(values, dtype=np.float64).ravel()
+        x = x[~np.isnan(x)]
+        if len(x) == 0:
+            return self
+        self.count += len(x)
+        self.min = min(self.min, float(x.min()))
+        self.max = max(self.max, float(x.max()))
+        small = np.abs(x) < MIN_INDEXABLE
+        self.zero += int(small.sum())
+        for sign, store in ((1, 'pos'), (-1, 'neg')):
+            part = x[~small & (np.sign(x) == sign)]
+            index = np.ceil(np.log(np.abs(part)) / self.log_gamma).astype(np.int64)
+            index, counts = np.unique(index, return_counts=True)
+            setattr(self, store, self._store_add(getattr(self, store), index, counts))
+        return self
+
+    def merge(self, other):
+        if other.alpha != self.alpha:
+            raise ValueError(f"Cannot merge sketches with accuracy {self.alpha} and {other.alpha}")
+        for store in ('pos', 'neg'):
+            offset, buckets = getattr(other, store)
+            nonzero = np.flatnonzero(buckets)
+            setattr(self, store, self._store_add(getattr(self, store), nonzero + offset, buckets[nonzero]))
+        self.zero += other.zero
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    # Bucket representatives and counts in ascending value order
+    def _buckets(self):
+        values, counts = [], []
+        offset, buckets = self.neg
+        keep = np.flatnonzero(buckets)[::-1]
+        values.append(-self._value(keep + offset))
+        counts.append(buckets[keep])
+        values.append(np.zeros(1 if self.zero else 0))
+        counts.append(np.array([self.zero] if self.zero else [], dtype=np.int64))
+        offset, buckets = self.pos
+        keep = np.flatnonzero(buckets)
+        values.append(self._value(keep + offset))
+        counts.append(buckets[keep])
+        return np.concatenate(values), np.concatenate(counts)
+
+    def _value(self, index):
+        # Within alpha (relative) of every |x| in the bucket
+        return 2.0 * self.gamma ** index.astype(np.float64) / (self.gamma + 1.0)
+
+    # q in [0, 1] (scalar or array); the value at rank q * (count - 1)
+    def quantile(self, q):
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        values, counts = self._buckets()
+        rank = np.asarray(q, dtype=np.float64) * (self.count - 1)
+        pos = np.searchsorted(np.cumsum(counts), rank, side='right')
+        return np.clip(values[np.minimum(pos, len(values) - 1)], self.min, self.max)
+
+    # Median absolute deviation from the median, from the bucket representatives.
+    # Each value is off by at most alpha * |x|, so the error stays within about
+    # alpha * (2 * |median| + MAD).
+    def mad(self):
+        if self.count == 0:
+            return np.nan
+        values, counts = self._buckets()
+        dev = np.abs(np.clip(values, self.min, self.max) - self.quantile(0.5))
+        order = np.argsort(dev, kind='stable')
+        pos = np.searchsorted(np.cumsum(counts[order]), 0.5 * (self.count - 1), side='right')
+        return float(dev[order][min(pos, len(order) - 1)])
+
+    def to_dict(self):
+        return {
+            'alpha': self.alpha, 'max_buckets': self.max_buckets,
+            'count': self.count, 'zero': self.zero,
+            'min': self.min if self.count else None, 'max': self.max if self.count else None,
+            'pos': [self.pos[0], self.pos[1].tolist()],
+            'neg': [self.neg[0], self.neg[1].tolist()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['alpha'], data['max_buckets'])
+        sketch.count, sketch.zero = data['count'], data['zero']
+        sketch.min = data['min'] if data['min'] is not None else np.inf
+        sketch.max = data['max'] if data['max'] is not None else -np.inf
+        sketch.pos = (data['pos'][0], np.asarray(data['pos'][1], dtype=np.int64))
+        sketch.neg = (data['neg'][0], np.asarray(data['neg'][1], dtype=np.int64))
+        return sketch
+
+
+# --- 3. MOMENT SKETCH ---
+class MomentSketch:
+    def __init__(self):
+        self.n, self.mean, self.m2, self.m3, self.m4 = 0, 0.0, 0.0, 0.0, 0.0
+        self.min, self.max = np.inf, -np.inf
+
+    @classmethod
+    def from_values(cls, values):
+        sketch = cls()
+        sketch.add(values)
+        return sketch
+
+    def add(self, values):
+        x = np.asarray(values, dtype=np.float64).ravel()
+        x = x[~np.isnan(x)]
+        if len(x) == 0:
+            return self
+        # Exact moments of the batch, then a pairwise merge
+        batch = MomentSketch()
+        batch.n, batch.mean = len(x), float(x.mean())
+        d = x - batch.mean
+        d2 = d * d
+        batch.m2, batch.m3, batch.m4 = float(d2.sum()), float((d2 * d).sum()), float((d2 * d2).sum())
+        batch.min, batch.max = float(x.min()), float(x.max())
+        return self.merge(batch)
+
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.__dict__.update(other.__dict__)
+            return self
+        na, nb = self.n, other.n
+        n = na + nb
+        d = other.mean - self.mean
+        d2 = d * d
+        m2 = self.m2 + other.m2 + d2 * na * nb / n
+        m3 = (self.m3 + other.m3 + d2 * d * na * nb * (na - nb) / (n * n)
+              + 3.0 * d * (na * other.m2 - nb * self.m2) / n)
+        m4 = (self.m4 + other.m4 + d2 * d2 * na * nb * (na * na - na * nb + nb * nb) / (n ** 3)
+              + 6.0 * d2 * (na * na * other.m2 + nb * nb * self.m2) / (n * n)
+              + 4.0 * d * (na * other.m3 - nb * self.m3) / n)
+        self.mean += d * nb / n
+        self.n, self.m2, self.m3, self.m4 = n, m2, m3, m4
+        self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        return self
+
+    def summary(self):
+        if self.n == 0:
+            return {'count': 0}
+        var = self.m2 / self.n
+        return {
+            'count': self.n, 'mean': self.mean, 'std': float(np.sqrt(var)),
+            'skewness': float(np.sqrt(self.n) * self.m3 / self.m2 ** 1.5) if self.m2 > 0 else 0.0,
+            'excess_kurtosis': float(self.n * self.m4 / self.m2 ** 2 - 3.0) if self.m2 > 0 else 0.0,
+            'min': self.min, 'max': self.max,
+        }
+
+    def to_dict(self):
+        return {'n': self.n, 'mean': self.mean, 'm2': self.m2, 'm3': self.m3, 'm4': self.m4,
+                'min': self.min if self.n else None, 'max': self.max if self.n else None}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls()
+        sketch.n, sketch.mean = data['n'], data['mean']
+        sketch.m2, sketch.m3, sketch.m4 = data['m2'], data['m3'], data['m4']
+        sketch.min = data['min'] if data['min'] is not None else np.inf
+        sketch.max = data['max'] if data['max'] is not None else -np.inf
+        return sketch
+
+
+# --- 4. DISTRIBUTION (quantiles + moments of one quantity) ---
+class Distribution:
+    def __init__(self, quantiles=None, moments=None):
+        self.quantiles = quantiles or QuantileSketch()
+        self.moments = moments or MomentSketch()
+
+    @classmethod
+    def from_values(cls, values):
+        return cls().add(values)
+
+    def add(self, values):
+        self.quantiles.add(values)
+        self.moments.add(values)
+        return self
+
+    def merge(self, other):
+        self.quantiles.merge(other.quantiles)
+        self.moments.merge(other.moments)
+        return self
+
+    def summary(self):
+        out = self.moments.summary()
+        if out['count']:
+            for q, value in zip((0.5, 0.9, 0.99, 0.999), self.quantiles.quantile([0.5, 0.9, 0.99, 0.999])):
+                out[f'p{q * 100:g}'] = float(value)
+            out['mad'] = self.quantiles.mad()
+        return out
+
+    def to_dict(self):
+        return {'quantiles': self.quantiles.to_dict(), 'moments': self.moments.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(QuantileSketch.from_dict(data['quantiles']), MomentSketch.from_dict(data['moments']))
+
+
+# --- 5. GAP SKETCHES (persisted with the gap analysis) ---
+class GapSketches:
+    def __init__(self):
+        self.ema = Distribution()
+        self.sources = {}
+
+    def add_scores(self, f_type, scores):
+        self.sources.setdefault(f_type, Distribution()).add(scores)
+
+    def merge(self, other):
+        self.ema.merge(other.ema)
+        for f_type, dist in other.sources.items():
+            self.sources.setdefault(f_type, Distribution()).merge(dist)
+        return self
+
+    def save(self, path=SKETCH_PATH):
+        data = {'ema': self.ema.to_dict(),
+                'sources': {f_type: dist.to_dict() for f_type, dist in self.sources.items()}}
+        with open(path + ".tmp", 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path=SKETCH_PATH):
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        sketches = cls()
+        sketches.ema = Distribution.from_dict(data['ema'])
+        sketches.sources = {f_type: Distribution.from_dict(d) for f_type, d in data['sources'].items()}
+        return sketches
+
+
+# --- 6. SEVERITY BANDS ---
+# Band per pincode, 0 = worst (Extreme / Underserved) .. 3:
+#   zscore     - z_score >= 3 / 2 / 1 (mean and std of EMA_i; the default)
+#   percentile - EMA_i above its 99.865th / 97.725th / 84.134th percentile
+#   robust     - (EMA_i - median) / (1.4826 * MAD) >= 3 / 2 / 1
+# sketch: QuantileSketch of the reference EMA_i values (built from ema if None)
+def band_codes(ema, z, method="zscore", sketch=None):
+    if method == "zscore":
+        score, cutoffs = np.asarray(z, dtype=np.float64), Z_CUTOFFS
+    else:
+        ema = np.asarray(ema, dtype=np.float64)
+        sketch = sketch or QuantileSketch.from_values(ema)
+        if method == "percentile":
+            score, cutoffs = ema, tuple(sketch.quantile(PERCENTILE_CUTOFFS))
+        elif method == "robust":
+            score, cutoffs = robust_z(ema, sketch), Z_CUTOFFS
+        else:
+            raise ValueError(f"Unknown band method '{method}' (choose from {', '.join(BAND_METHODS)})")
+    return np.select([score >= c for c in cutoffs], [0, 1, 2], 3).astype(np.int8)
+
+
+def robust_z(values, sketch):
+    scale = MAD_TO_SIGMA * sketch.mad()
+    if not scale > 10 * np.finfo(np.float64).eps:
+        scale = 1.0  # as StandardScaler does for constant columns
+    return (np.asarray(values, dtype=np.float64) - sketch.quantile(0.5)) / scale
+
+
+# Stored EMA_i sketch for the band reference, or None to sketch the values at hand
+def ema_reference(path=SKETCH_PATH):
+    sketches = GapSketches.load(path)
+    return sketches.ema.quantiles if sketches is not None and sketches.ema.quantiles.count else None
+
+
+# --- 7. CLI ---
+# Merges one or more sketch files (e.g. runs over different regions) and prints the summary
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize (and merge) gap analysis sketches")
+    parser.add_argument("paths", nargs="*", default=[SKETCH_PATH])
+    parser.add_argument("--output", help="Write the merged sketch here")
+    args = parser.parse_args(argv)
+
+    merged = None
+    for path in args.paths:
+        sketches = GapSketches.load(path)
+        if sketches is None:
+            print(f"[ERR] No sketch file at {path}")
+            sys.exit(1)
+        merged = sketches if merged is None else merged.merge(sketches)
+
+    for name, dist in [("EMA_i", merged.ema)] + sorted(merged.sources.items()):
+        summary = dist.summary()
+        print(f"\n--- {name} ---")
+        for key, value in summary.items():
+            print(f"   {key:<16} {value:,.4f}" if isinstance(value, float) else f"   {key:<16} {value:,}")
+    if args.output:
+        merged.save(args.output)
+        print(f"\n>>> Merged sketch saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from partial_cache import file_sha256
+from pincode_lookup import join_master, lookup_available
+from pincode_parse import parse_pincodes, PIN_MIN, PIN_MAX, MISSING_PIN
+from severity_engine import load_monthly_loads, MONTHLY_LOADS_PATH
+from perf_utils import RunReport
+from quantile_sketch import QuantileSketch, band_codes, ema_reference, BAND_METHODS, SKETCH_PATH
+
+# --- 1. CONFIGURATION ---
+# Rollup cube over the gap results (3_calc_severity.py) joined with the pincode master.
+# A few bincounts materialize, at the pincode, district and state levels:
+#   - EMA sum, z-score and Criticality Index sums, pincode count per severity band
+#   - raw load and transactions per Month (Cleaned_Data/monthly_loads.npz)
+#   - top-K lists: the global Top 200 and the worst pincodes of every district / state
+# Top-K uses np.argpartition, so only the K selected rows are sorted, never all pincodes.
+# The cube is one .npz of typed arrays; 5_graphs.py reads its CSV and figures from it.
+# It records the SHA-256 of the files it was built from:
+#   - same results and master -> the stored cube is used as is
+#   - new results, same master -> pincodes already in the cube keep their district and
+#     state, only new pincodes are joined against the master
+# Severity bands follow --bands (quantile_sketch.band_codes); the percentile and robust
+# bands use the EMA_i sketch of all pincodes written by 3_calc_severity.py.
+CUBE_PATH = os.path.join("Cleaned_Data", "rollup_cube.npz")
+DATA_PATH = "Cleaned_Data/statistical_gap_analysis.json"
+MASTER_CSV = "Cleaned_Data/pincode_master_clean.csv"
+MASTER_FILES = [
+    MASTER_CSV,
+    "Cleaned_Data/pincode_master_clean.parquet",
+    "Cleaned_Data/pincode_lookup.npy",
+    "Cleaned_Data/pincode_lookup_names.json",
+]
+CUBE_VERSION = 1
+
+TOP_PINCODES = 200   # global list, Top_200_Critical_EMA_Pincodes.csv
+GROUP_TOP_K = 20     # stored per district and per state
+
+# Logic (zscore bands): 3+ = Extreme, 2+ = Critical, 1+ = High, 0-1 = Moderate
+SEVERITY_LEVELS = ["Extreme", "Critical", "High", "Moderate"]
+
+
+# reference: QuantileSketch of EMA_i over all pincodes (not needed for zscore)
+def severity_codes(ema, z, bands="zscore", reference=None):
+    return band_codes(ema, z, bands, reference)
+
+
+# Row ids of the k largest values, largest first. Ties go to the lower ties[row] (by
+# default the row id), so the result does not depend on how argpartition splits equal values.
+def top_k(values, k, rows=None, ties=None):
+    rows = np.arange(len(values)) if rows is None else np.asarray(rows)
+    if k <= 0:
+        return rows[:0]
+    key = rows if ties is None else np.asarray(ties)[rows]
+    v = values[rows]
+    if len(rows) > k:
+        kth = np.partition(v, len(v) - k)[len(v) - k]
+        above = np.flatnonzero(v > kth)
+        tied = np.flatnonzero(v == kth)
+        tied = tied[np.argsort(key[tied], kind='stable')]
+        keep = np.concatenate([above, tied[:k - len(above)]])
+        rows, v, key = rows[keep], v[keep], key[keep]
+    return rows[np.lexsort((key, -v))]
+
+
+def file_signature(paths):
+    return ";".join(f"{p}:{file_sha256(p)}" for p in paths if os.path.exists(p))
+
+
+# --- 2. LOADING ---
+# pincode (int32), EMA_i, z_score; df_data can be handed over in memory (run_pipeline.py)
+def read_results(df_data=None, data_path=DATA_PATH):
+    if df_data is None:
+        df_data = pd.read_json(data_path, orient='records')
+    df = pd.DataFrame({
+        'pincode': parse_pincodes(df_data['pincode']),
+        'EMA_i': df_data['EMA_i'].to_numpy(dtype=np.float64),
+        'z_score': df_data['z_score'].to_numpy(dtype=np.float64),
+    })
+    return df[df['pincode'] != MISSING_PIN].reset_index(drop=True)
+
+
+# Inner join of a frame with an int32 'pincode' column against the pincode master.
+# fmt: "lookup" (memory-mapped table), "csv", "parquet" or "auto" (lookup if present).
+def join_geo(df, fmt="auto"):
+    if fmt == "lookup" or (fmt == "auto" and lookup_available()):
+        # One array gather on the direct-indexed table
+        df_merged = join_master(df, ['district', 'state'])
+        df_merged[['district', 'state']] = df_merged[['district', 'state']].astype(object)
+        return df_merged
+
+    if fmt == "parquet":
+        # Typed columns, only the ones the reports need
+        from columnar_store import read_master
+        df_geo = read_master(columns=['pincode', 'district', 'statename'])
+        df_geo[['district', 'statename']] = df_geo[['district', 'statename']].astype(str)
+    else:
+        df_geo = pd.read_csv(MASTER_CSV, dtype=str)
+        df_geo.columns = df_geo.columns.str.lower().str.strip()
+        df_geo['pincode'] = parse_pincodes(df_geo['pincode'])
+
+    if 'statename' in df_geo.columns:
+        df_geo = df_geo.rename(columns={'statename': 'state'})
+    if 'state' not in df_geo.columns or 'district' not in df_geo.columns:
+        print("ERROR: Missing 'state' or 'district' columns in master CSV.")
+        return None
+    return pd.merge(df, df_geo[['pincode', 'district', 'state']], on='pincode', how='inner')
+
+
+# --- 3. THE CUBE ---
+class RollupCube:
+    # Arrays written to the .npz (names are all str arrays)
+    FIELDS = (
+        'source_sig', 'master_sig',
+        'district_names', 'state_names', 'months',
+        # pincode level, one row per matched pincode in results order
+        'pin', 'pin_dname', 'pin_state', 'pin_district', 'ema', 'z', 'crit', 'severity',
+        'pin_load', 'pin_txn',
+        # district level (district name, state) and state level
+        'd_name', 'd_state', 'd_n', 'd_ema', 'd_z', 'd_crit', 'd_sev', 'd_load', 'd_txn',
+        's_n', 's_ema', 's_z', 's_crit', 's_sev', 's_load', 's_txn',
+        # top-K: global rows, and CSR lists (offsets, rows) per district / state
+        'top_rows', 'd_top_offsets', 'd_top_rows', 's_top_offsets', 's_top_rows',
+    )
+
+    def __init__(self, **arrays):
+        for name in self.FIELDS:
+            setattr(self, name, arrays[name])
+
+    # --- BUILD ---
+    # results: read_results() frame. join(frame) -> frame with district, state (inner
+    # join) or None. monthly: load_monthly_loads() tuple or None. previous: older cube
+    # built against the same master, whose pincode -> district / state is reused.
+    # reference: band reference sketch; None sketches every pincode of results.
+    @classmethod
+    def build(cls, results, join, monthly=None, previous=None, source_sig="", master_sig="",
+              bands="zscore", reference=None):
+        pins = results['pincode'].to_numpy(dtype=np.int32)
+        if bands != "zscore" and reference is None:
+            reference = QuantileSketch.from_values(results['EMA_i'])
+        district = np.full(len(pins), np.nan, dtype=object)
+        state = np.full(len(pins), np.nan, dtype=object)
+        matched = np.zeros(len(pins), dtype=bool)
+
+        if previous is not None:
+            rows = previous.pin_rows(pins)
+            known = rows >= 0
+            district[known] = previous.names('district_names', previous.pin_dname[rows[known]])
+            state[known] = previous.names('state_names', previous.pin_state[rows[known]])
+            matched |= known
+
+        new = ~matched
+        if new.any():
+            joined = join(results.loc[new, ['pincode']])
+            if joined is None:
+                return None
+            slot = np.full(PIN_MAX - PIN_MIN + 1, -1, dtype=np.int64)
+            joined = joined.drop_duplicates('pincode')
+            slot[joined['pincode'].to_numpy(dtype=np.int64) - PIN_MIN] = np.arange(len(joined))
+            hit = slot[pins[new].astype(np.int64) - PIN_MIN]
+            idx = np.flatnonzero(new)[hit >= 0]
+            district[idx] = joined['district'].to_numpy(dtype=object)[hit[hit >= 0]]
+            state[idx] = joined['state'].to_numpy(dtype=object)[hit[hit >= 0]]
+            matched[idx] = True
+            print(f"Looked up {int(new.sum())} pincode(s) in the master ({len(idx)} found), "
+                  f"{int((~new).sum())} reused from the previous cube")
+
+        if not matched.any():
+            print("Error: Merge resulted in 0 rows. Check Master CSV pincode formats.")
+            return None
+
+        pins, district, state = pins[matched], district[matched], state[matched]
+        ema = results['EMA_i'].to_numpy(dtype=np.float64)[matched]
+        z = results['z_score'].to_numpy(dtype=np.float64)[matched]
+        print(f"Successfully matched {len(pins)} records.")
+
+        # Criticality Index: percentage of the worst (highest) z-score
+        crit = z / z.max() * 100
+        severity = severity_codes(ema, z, bands, reference)
+
+        # Missing names get -1 and are left out of that level, like groupby / value_counts
+        pin_dname, district_names = pd.factorize(district, sort=True)
+        pin_state, state_names = pd.factorize(state, sort=True)
+        pair = np.where((pin_dname >= 0) & (pin_state >= 0),
+                        pin_dname.astype(np.int64) * max(len(state_names), 1) + pin_state, -1)
+        pin_district, pair_keys = pd.factorize(pair, sort=True)
+        if len(pair_keys) and pair_keys[0] == -1:
+            # -1 sorts first; shift it out so district ids start at 0
+            pin_district = pin_district - 1
+            pair_keys = pair_keys[1:]
+        pair_keys = np.asarray(pair_keys, dtype=np.int64)
+        n_states = max(len(state_names), 1)
+
+        arrays = dict(
+            source_sig=np.array(source_sig), master_sig=np.array(master_sig),
+            district_names=np.asarray(district_names, dtype=str),
+            state_names=np.asarray(state_names, dtype=str),
+            pin=pins, pin_dname=pin_dname.astype(np.int32), pin_state=pin_state.astype(np.int32),
+            pin_district=pin_district.astype(np.int32),
+            ema=ema, z=z, crit=crit, severity=severity,
+            d_name=(pair_keys // n_states).astype(np.int32),
+            d_state=(pair_keys % n_states).astype(np.int32),
+        )
+
+        # Pincode x Month loads, aligned to the cube's pincode rows
+        months, pin_load, pin_txn = [], np.zeros((len(pins), 0)), np.zeros((len(pins), 0))
+        if monthly is not None:
+            m_pins, months, load, txn = monthly
+            row_of = np.full(PIN_MAX - PIN_MIN + 1, -1, dtype=np.int64)
+            row_of[pins.astype(np.int64) - PIN_MIN] = np.arange(len(pins))
+            m_pins = np.asarray(m_pins, dtype=np.int64)
+            ok = (m_pins >= PIN_MIN) & (m_pins <= PIN_MAX)
+            rows = np.where(ok, row_of[np.where(ok, m_pins - PIN_MIN, 0)], -1)
+            keep = rows >= 0
+            pin_load = np.zeros((len(pins), len(months)))
+            pin_txn = np.zeros((len(pins), len(months)))
+            pin_load[rows[keep]] = load[keep]
+            pin_txn[rows[keep]] = txn[keep]
+        arrays.update(months=np.asarray(months, dtype=str), pin_load=pin_load, pin_txn=pin_txn)
+
+        for prefix, groups, size in (('d', pin_district, len(pair_keys)), ('s', pin_state, len(state_names))):
+            arrays.update(rollup(prefix, groups, size, ema, z, crit, severity, pin_load, pin_txn))
+
+        arrays['top_rows'] = top_k(crit, TOP_PINCODES)
+        for prefix, groups, size in (('d', pin_district, len(pair_keys)), ('s', pin_state, len(state_names))):
+            offsets, rows = group_top_k(z, groups, size, GROUP_TOP_K)
+            arrays[f'{prefix}_top_offsets'], arrays[f'{prefix}_top_rows'] = offsets, rows
+        return cls(**arrays)
+
+    # --- STORAGE ---
+    def save(self, path=CUBE_PATH):
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, version=np.array(CUBE_VERSION), **{name: getattr(self, name) for name in self.FIELDS})
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data['version']) != CUBE_VERSION:
+                    return None
+                return cls(**{name: data[name] for name in cls.FIELDS})
+        except (OSError, KeyError, ValueError) as e:
+            print(f" [WARN] Ignoring unreadable rollup cube {path}: {e}")
+            return None
+
+    # --- QUERIES ---
+    # Names for ids into district_names / state_names; -1 -> NaN
+    def names(self, field, ids):
+        names = np.append(getattr(self, field).astype(object), np.nan)
+        ids = np.asarray(ids)
+        return names[np.where(ids >= 0, ids, len(names) - 1)]
+
+    # Cube row of every pincode, -1 if it is not in the cube
+    def pin_rows(self, pins):
+        row_of = np.full(PIN_MAX - PIN_MIN + 1, -1, dtype=np.int64)
+        row_of[self.pin.astype(np.int64) - PIN_MIN] = np.arange(len(self.pin))
+        pins = np.asarray(pins, dtype=np.int64)
+        ok = (pins >= PIN_MIN) & (pins <= PIN_MAX)
+        return np.where(ok, row_of[np.where(ok, pins - PIN_MIN, 0)], -1)
+
+    def pincode_frame(self, rows=None):
+        rows = np.arange(len(self.pin)) if rows is None else np.asarray(rows)
+        return pd.DataFrame({
+            'pincode': self.pin[rows],
+            'district': self.names('district_names', self.pin_dname[rows]),
+            'state': self.names('state_names', self.pin_state[rows]),
+            'severity': np.array(SEVERITY_LEVELS, dtype=object)[self.severity[rows]],
+            'EMA_i': self.ema[rows],
+            'z_score': self.z[rows],
+            'Criticality_Index': self.crit[rows],
+        })
+
+    # Worst pincodes by Criticality Index; the stored list covers k <= TOP_PINCODES
+    def top_pincodes(self, k=TOP_PINCODES):
+        rows = self.top_rows[:k] if k <= TOP_PINCODES else top_k(self.crit, k)
+        return self.pincode_frame(rows)
+
+    # One row per district (with its state) or per state
+    def level_frame(self, level):
+        p = 'd' if level == "district" else 's'
+        n = getattr(self, f'{p}_n')
+        if level == "district":
+            frame = pd.DataFrame({'district': self.names('district_names', self.d_name),
+                                  'state': self.names('state_names', self.d_state)})
+        else:
+            frame = pd.DataFrame({'state': self.state_names.astype(object)})
+        frame['pincodes'] = n
+        frame['EMA_sum'] = getattr(self, f'{p}_ema')
+        safe_n = np.maximum(n, 1)
+        frame['z_mean'] = getattr(self, f'{p}_z') / safe_n
+        frame['Criticality_mean'] = getattr(self, f'{p}_crit') / safe_n
+        sev = getattr(self, f'{p}_sev')
+        for i, name in enumerate(SEVERITY_LEVELS):
+            frame[name] = sev[:, i]
+        return frame
+
+    # Top k groups of a level by a level_frame() column
+    def top_groups(self, level, column, k):
+        frame = self.level_frame(level)
+        rows = top_k(frame[column].to_numpy(dtype=np.float64), k)
+        return frame.iloc[rows].reset_index(drop=True)
+
+    # Group id of a district / state name (case-insensitive), or -1
+    def group_id(self, level, name, state=None):
+        key = str(name).strip().lower()
+        if level == "state":
+            matches = np.flatnonzero(np.char.lower(self.state_names) == key)
+        else:
+            matches = np.flatnonzero(np.char.lower(self.district_names[self.d_name]) == key)
+            if state is not None:
+                s_key = str(state).strip().lower()
+                matches = matches[np.char.lower(self.state_names[self.d_state[matches]]) == s_key]
+        return int(matches[0]) if len(matches) else -1
+
+    # Worst pincodes (by z-score) of one district / state
+    def group_top(self, level, group, k=GROUP_TOP_K):
+        p = 'd' if level == "district" else 's'
+        offsets, rows = getattr(self, f'{p}_top_offsets'), getattr(self, f'{p}_top_rows')
+        if k <= GROUP_TOP_K:
+            picked = rows[offsets[group]:offsets[group + 1]][:k]
+        else:
+            ids = self.pin_district if level == "district" else self.pin_state
+            picked = top_k(self.z, k, np.flatnonzero(ids == group))
+        return self.pincode_frame(picked)
+
+    # Raw load and transactions per Month for one group (group=None: all pincodes)
+    def monthly(self, level=None, group=None):
+        if level is None:
+            load, txn = self.pin_load.sum(axis=0), self.pin_txn.sum(axis=0)
+        else:
+            p = 'd' if level == "district" else 's'
+            load, txn = getattr(self, f'{p}_load')[group], getattr(self, f'{p}_txn')[group]
+        return pd.DataFrame({'Month': self.months.astype(object), 'raw_load': load, 'transactions': txn})
+
+
+# Sums per group: count, EMA, z, Criticality Index, severity bands and monthly loads
+def rollup(prefix, groups, size, ema, z, crit, severity, pin_load, pin_txn):
+    ok = groups >= 0
+    g = groups[ok]
+    sev = np.zeros((size, len(SEVERITY_LEVELS)), dtype=np.int64)
+    for i in range(len(SEVERITY_LEVELS)):
+        sev[:, i] = np.bincount(g, weights=(severity[ok] == i), minlength=size)
+    months = pin_load.shape[1]
+    load = np.zeros((size, months))
+    txn = np.zeros((size, months))
+    for m in range(months):
+        load[:, m] = np.bincount(g, weights=pin_load[ok, m], minlength=size)
+        txn[:, m] = np.bincount(g, weights=pin_txn[ok, m], minlength=size)
+    return {
+        f'{prefix}_n': np.bincount(g, minlength=size).astype(np.int64),
+        f'{prefix}_ema': np.bincount(g, weights=ema[ok], minlength=size),
+        f'{prefix}_z': np.bincount(g, weights=z[ok], minlength=size),
+        f'{prefix}_crit': np.bincount(g, weights=crit[ok], minlength=size),
+        f'{prefix}_sev': sev,
+        f'{prefix}_load': load,
+        f'{prefix}_txn': txn,
+    }
+
+
+# Top k rows by value inside every group, as CSR (offsets [size + 1], rows)
+def group_top_k(values, groups, size, k):
+    rows = np.flatnonzero(groups >= 0)
+    rows = rows[np.argsort(groups[rows], kind='stable')]
+    counts = np.bincount(groups[rows], minlength=size)
+    starts = np.concatenate([[0], np.cumsum(counts)])
+    picked = [top_k(values, k, rows[starts[g]:starts[g + 1]]) for g in range(size)]
+    offsets = np.concatenate([[0], np.cumsum([len(p) for p in picked])]).astype(np.int64)
+    flat = np.concatenate(picked).astype(np.int64) if picked else np.empty(0, dtype=np.int64)
+    return offsets, flat
+
+
+# --- 4. UPDATE ---
+# Returns an up-to-date cube: the stored one if its sources are unchanged, otherwise a
+# rebuild that reuses the stored pincode -> district / state when the master is the same
+def update_cube(fmt="auto", df_data=None, path=CUBE_PATH, rebuild=False, bands="zscore"):
+    source_sig = f"{bands}|" + file_signature([DATA_PATH, MONTHLY_LOADS_PATH, SKETCH_PATH])
+    master_sig = f"{fmt}|" + file_signature(MASTER_FILES)
+    previous = None if rebuild else RollupCube.load(path)
+    if previous is not None and str(previous.source_sig) == source_sig and str(previous.master_sig) == master_sig:
+        print(f"Rollup cube is up to date ({path})")
+        return previous
+    if previous is not None and str(previous.master_sig) != master_sig:
+        previous = None
+
+    print("Loading EMA Data...")
+    try:
+        results = read_results(df_data)
+        reference = ema_reference() if bands != "zscore" else None
+        cube = RollupCube.build(results, lambda df: join_geo(df, fmt), load_monthly_loads(), previous,
+                                source_sig, master_sig, bands, reference)
+    except Exception as e:
+        print(f"Error loading data: {e}")
+        return None
+    if cube is None:
+        return None
+    cube.save(path)
+    print(f">>> Rollup cube: {len(cube.pin):,} pincodes, {len(cube.d_n):,} districts, "
+          f"{len(cube.s_n):,} states, {len(cube.months)} month(s) ({path})")
+    return cube
+
+
+# --- 5. CLI ---
+def build_parser():
+    parser = argparse.ArgumentParser(description="Build the pincode / district / state rollup cube")
+    parser.add_argument("--format", choices=["auto", "lookup", "csv", "parquet"], default="auto",
+                        help="Pincode master source: the memory-mapped lookup table, CSV or Parquet "
+                             "(auto = lookup table if 2_pincode_clean.py wrote one, else CSV)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Ignore the stored cube and join every pincode again")
+    parser.add_argument("--bands", choices=BAND_METHODS, default="zscore",
+                        help="Severity bands: z-score cutoffs 3/2/1, EMA_i percentiles with the same tail "
+                             "shares, or robust z-scores from the median and MAD (default: zscore)")
+    parser.add_argument("--state", help="Print the worst pincodes and monthly load of this state")
+    parser.add_argument("--district", help="Print the worst pincodes and monthly load of this district")
+    parser.add_argument("--top", type=int, default=10, help="Rows to print (default: 10)")
+    return parser
+
+
+def print_group(cube, level, name, k):
+    group = cube.group_id(level, name)
+    if group < 0:
+        print(f" [WARN] No {level} named '{name}' in the cube")
+        return
+    print(f"\n--- {level.title()}: {name} ---")
+    print(cube.level_frame(level).iloc[[group]].to_string(index=False))
+    print(cube.group_top(level, group, k).to_string(index=False))
+    if len(cube.months):
+        print(cube.monthly(level, group).to_string(index=False))
+
+
+# Returns the cube so run_pipeline.py can treat an empty result as a failure
+def run(args, df_data=None):
+    report = RunReport("rollup", vars(args))
+    with report.step("cube") as step:
+        cube = update_cube(args.format, df_data, rebuild=args.rebuild, bands=args.bands)
+        if cube is not None:
+            step.rows_out = len(cube.pin)
+    if cube is None:
+        return None
+
+    if args.state:
+        print_group(cube, "state", args.state, args.top)
+    if args.district:
+        print_group(cube, "district", args.district, args.top)
+    report.finish(rows_out=len(cube.pin))
+    return cube
+
+
+def main(argv=None):
+    return run(build_parser().parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+import os
+import re
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from perf_utils import RunReport
+
+# --- 1. CONFIGURATION ---
+# Stages 1-5 as a dependency graph, run in one process.
+#   - The severity table is handed to the map and the charts as a DataFrame
+#     instead of being re-parsed from statistical_gap_analysis.json.
+#   - A stage is skipped when its code (script + local modules it imports), its
+#     input files (by SHA-256) and its options match the last successful run and
+#     its outputs still exist.
+#   - Stages whose dependencies are done run side by side with --jobs > 1
+#     (e.g. the map and the charts).
+STATE_PATH = os.path.join("Cleaned_Data", ".pipeline_state.json")
+SEVERITY_JSON = "Cleaned_Data/statistical_gap_analysis.json"
+MONTHLY_LOADS = "Cleaned_Data/monthly_loads.npz"
+SEVERITY_SKETCH = "Cleaned_Data/statistical_gap_analysis.sketch.json"
+ROLLUP_CUBE = "Cleaned_Data/rollup_cube.npz"
+
+RAW_SOURCES = ["Biometric", "Demographics", "Enrolment"]
+MASTER_INPUTS = [
+    "Cleaned_Data/pincode_master_clean.csv",
+    "Cleaned_Data/pincode_master_clean.parquet",
+    "Cleaned_Data/pincode_lookup.npy",
+    "Cleaned_Data/pincode_lookup_names.json",
+]
+
+# name -> script, dependencies, input globs, output globs. Each output glob must match
+# something; an (output, input) pair only when its input glob does (a dataset without
+# Biometric files has no cleaned Biometric folder either).
+STAGES = {
+    "clean": {
+        "script": "1_data_parsing.py",
+        "deps": [],
+        "inputs": [f"raw_data/{folder}/*.csv" for folder in RAW_SOURCES],
+        "outputs": {
+            "csv": [(f"Cleaned_Data/{folder}/*.csv", f"raw_data/{folder}/*.csv") for folder in RAW_SOURCES],
+            "parquet": ["Cleaned_Data/parquet/source=*/Month=*/*.parquet"],
+        },
+    },
+    "pincodes": {
+        "script": "2_pincode_clean.py",
+        "deps": [],
+        "inputs": ["raw_data/pincode_india.csv"],
+        "outputs": {
+            "csv": ["Cleaned_Data/pincode_master_clean.csv", "Cleaned_Data/pincode_lookup.npy"],
+            "parquet": ["Cleaned_Data/pincode_master_clean.parquet", "Cleaned_Data/pincode_lookup.npy"],
+        },
+    },
+    "severity": {
+        "script": "3_calc_severity.py",
+        "deps": ["clean"],
+        "inputs": {
+            "csv": [f"Cleaned_Data/{folder}/*.csv" for folder in RAW_SOURCES],
+            "parquet": ["Cleaned_Data/parquet/source=*/Month=*/*.parquet"],
+        },
+        "outputs": [SEVERITY_JSON, MONTHLY_LOADS, SEVERITY_SKETCH],
+    },
+    "rollup": {
+        "script": "rollup_cube.py",
+        "deps": ["severity", "pincodes"],
+        "inputs": [SEVERITY_JSON, MONTHLY_LOADS, SEVERITY_SKETCH] + MASTER_INPUTS,
+        "outputs": [ROLLUP_CUBE],
+    },
+    "map": {
+        "script": "4_logic_plotting_form.py",
+        "deps": ["severity", "pincodes"],
+        "inputs": [SEVERITY_JSON, MONTHLY_LOADS, SEVERITY_SKETCH] + MASTER_INPUTS,
+        "outputs": ["visuals_graphs/India_Map_Service_Coverage.html"],
+    },
+    "graphs": {
+        "script": "5_graphs.py",
+        "deps": ["rollup"],
+        "inputs": [ROLLUP_CUBE, SEVERITY_JSON] + MASTER_INPUTS,
+        "outputs": ["visuals_graphs/Top_200_Critical_EMA_Pincodes.csv", "visuals_graphs/Visual_1_EMA_Severity.png"],
+    },
+}
+
+# Stages that accept the severity DataFrame in memory
+CONSUMERS = ("rollup", "map", "graphs")
+
+
+# --- 2. STAGE ARGUMENTS ---
+# Each stage is driven through its own build_parser(), so defaults stay in one place
+def stage_argv(name, args):
+    if name == "clean":
+        return ["--format", args.format, "--workers", str(args.workers), "--chunksize", str(args.chunksize)]
+    if name == "pincodes":
+        return ["--format", args.format]
+    if name == "severity":
+        argv = ["--format", args.format, "--workers", str(args.workers)]
+        argv += ["--memory-budget", str(args.memory_budget)] if args.memory_budget else []
+        argv += ["--incremental"] if args.incremental else []
+        return argv + (["--online"] if args.online else [])
+    # The severity bands only show up in the options when they are not the default
+    bands = ["--bands", args.bands] if args.bands != "zscore" else []
+    if name == "map":
+        argv = ["--render", args.render, "--heatmap", args.heatmap] + bands
+        if args.offline:
+            argv.append("--offline")
+        if args.geojson:
+            argv += ["--geojson", args.geojson]
+        if args.render == "months":
+            argv += ["--workers", str(args.workers)]
+        return argv
+    if name in ("rollup", "graphs"):
+        return bands
+    return []
+
+
+def stage_patterns(spec, key, fmt):
+    patterns = spec[key]
+    return patterns[fmt] if isinstance(patterns, dict) else patterns
+
+
+def load_stage(script):
+    # The numbered scripts are not importable by name
+    name = "stage_" + re.sub(r'\W', '_', os.path.splitext(script)[0])
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, script)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# Top-level so it can be sent to a worker process
+def run_stage(name, argv, df_data=None):
+    module = load_stage(STAGES[name]["script"])
+    stage_args = module.build_parser().parse_args(argv)
+    start = time.perf_counter()
+
+    if name in CONSUMERS:
+        result = module.run(stage_args, df_data)
+        ok = result is not None
+    elif name == "clean":
+        _, errors = module.run(stage_args)
+        result, ok = None, not errors
+    elif name == "severity":
+        result = module.run(stage_args)
+        ok = result is not None
+    else:
+        result = module.run(stage_args)
+        ok = True
+
+    # Only the severity table is worth sending back to the runner
+    return ok, (result if name == "severity" else None), time.perf_counter() - start
+
+
+# --- 3. FINGERPRINTS ---
+class FileHashes:
+    # sha256 per file, recomputed only when size or mtime changes
+    def __init__(self, known):
+        self.known = known
+
+    def sha256(self, path):
+        st = os.stat(path)
+        entry = self.known.get(path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self.known[path] = [st.st_size, st.st_mtime_ns, digest.hexdigest()]
+        return self.known[path][2]
+
+
+def code_files(script):
+    # The script plus every local module it imports, transitively
+    seen, todo = [], [script]
+    while todo:
+        path = todo.pop()
+        if path in seen:
+            continue
+        seen.append(path)
+        with open(path) as f:
+            for module in re.findall(r'^\s*(?:from|import)\s+(\w+)', f.read(), re.MULTILINE):
+                if os.path.exists(module + ".py"):
+                    todo.append(module + ".py")
+    return sorted(seen)
+
+
+def fingerprint(name, argv, fmt, hashes):
+    spec = STAGES[name]
+    digest = hashlib.sha256()
+    digest.update(json.dumps(argv).encode())
+    for path in code_files(spec["script"]):
+        digest.update(f"code:{path}:{hashes.sha256(path)}".encode())
+    for pattern in stage_patterns(spec, "inputs", fmt):
+        for path in sorted(glob.glob(pattern)):
+            digest.update(f"input:{path}:{hashes.sha256(path)}".encode())
+    return digest.hexdigest()
+
+
+# Output globs that match nothing although they should
+def missing_outputs(name, fmt):
+    missing = []
+    for pattern in stage_patterns(STAGES[name], "outputs", fmt):
+        pattern, source = pattern if isinstance(pattern, tuple) else (pattern, None)
+        if not glob.glob(pattern) and (source is None or glob.glob(source)):
+            missing.append(pattern)
+    return missing
+
+
+def outputs_exist(name, fmt):
+    return not missing_outputs(name, fmt)
+
+
+def has_files(name, key, fmt):
+    patterns = stage_patterns(STAGES[name], key, fmt)
+    return any(glob.glob(p[0] if isinstance(p, tuple) else p) for p in patterns)
+
+
+def load_state():
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH) as f:
+            return json.load(f)
+    return {"files": {}, "stages": {}}
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+    tmp_path = STATE_PATH + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, STATE_PATH)
+
+
+# --- 4. SCHEDULER ---
+class Pipeline:
+    def __init__(self, args):
+        self.args = args
+        self.selected = [name for name in STAGES if name in args.stages]
+        self.state = load_state()
+        self.hashes = FileHashes(self.state["files"])
+        self.severity = None  # DataFrame handed to the map and the charts
+        self.fingerprints = {}
+        self.done, self.failed = [], []
+        self.running = set()  # submitted to the pool, not finished yet
+        self.kept = set()  # no input files: the outputs of an earlier build are used as-is
+        self.would_run = []  # --dry-run only
+        self.summary = []
+        self.perf = RunReport("pipeline", vars(args))
+
+    def ready(self, pending):
+        # Dependencies that are not selected count as satisfied (their outputs are used as-is).
+        # A dependency that is still running blocks too: its outputs are not written yet.
+        blocked = set(pending) | self.running | set(self.failed)
+        return [name for name in pending
+                if not any(dep in blocked for dep in STAGES[name]["deps"])]
+
+    # A selected stage with no selected dependency reads files that must already be there
+    # (e.g. raw_data/pincode_india.csv is not shipped). Without any input file it keeps
+    # the outputs of an earlier build; with no outputs either the run stops before any
+    # stage starts.
+    def check_inputs(self):
+        fmt = self.args.format
+        missing = []
+        for name in self.selected:
+            if any(dep in self.selected for dep in STAGES[name]["deps"]) or has_files(name, "inputs", fmt):
+                continue
+            if has_files(name, "outputs", fmt):
+                self.kept.add(name)
+            else:
+                missing.append(name)
+        for name in missing:
+            print(f"[ERR] Stage '{name}' has no input files and no earlier outputs. It needs: "
+                  f"{', '.join(stage_patterns(STAGES[name], 'inputs', fmt))}")
+        return not missing
+
+    def severity_table(self):
+        if self.severity is None and os.path.exists(SEVERITY_JSON):
+            import pandas as pd
+            self.severity = pd.read_json(SEVERITY_JSON, orient='records')
+        return self.severity
+
+    # Returns the stage arguments, or None when the stage is unchanged and skipped.
+    # The fingerprint is taken before the run, so inputs edited mid-run trigger a rerun next time.
+    def launch(self, name):
+        if name in self.kept:
+            print(f">>> Stage '{name}' has no input files, keeping its existing outputs")
+            for pattern in missing_outputs(name, self.args.format):
+                print(f" [WARN] No earlier output for {pattern}")
+            self.done.append(name)
+            self.summary.append((name, "kept", 0.0))
+            return None
+
+        argv = stage_argv(name, self.args)
+        fp = fingerprint(name, argv, self.args.format, self.hashes)
+        # In a dry run, a stage whose dependency would run is stale even if its inputs match
+        upstream = any(dep in self.would_run for dep in STAGES[name]["deps"])
+        if not upstream and not self.args.force and self.state["stages"].get(name) == fp and outputs_exist(name, self.args.format):
+            print(f">>> Stage '{name}' unchanged, skipped")
+            self.done.append(name)
+            self.summary.append((name, "skipped", 0.0))
+            return None
+
+        if self.args.dry_run:
+            print(f">>> Stage '{name}' would run ({STAGES[name]['script']})")
+            self.would_run.append(name)
+            self.done.append(name)
+            self.summary.append((name, "pending", 0.0))
+            return None
+
+        print(f"\n>>> Stage '{name}' ({STAGES[name]['script']})")
+        self.fingerprints[name] = fp
+        # A selected severity stage must have finished, or the table on disk may be stale
+        severity_ready = "severity" in self.done or "severity" not in self.selected
+        df_data = self.severity_table() if name in CONSUMERS and severity_ready else None
+        return argv, df_data
+
+    def finish(self, name, ok, result, seconds):
+        if not ok:
+            print(f"[ERR] Stage '{name}' failed after {seconds:.1f}s")
+            self.failed.append(name)
+            self.summary.append((name, "failed", seconds))
+            return
+        if name == "severity":
+            self.severity = result
+        self.state["stages"][name] = self.fingerprints[name]
+        save_state(self.state)
+        self.done.append(name)
+        self.summary.append((name, "ran", seconds))
+
+    def run(self):
+        if not self.check_inputs():
+            return False
+        pending = list(self.selected)
+        if self.args.jobs <= 1:
+            while self.ready(pending):
+                name = self.ready(pending)[0]
+                pending.remove(name)
+                launched = self.launch(name)
+                if launched is None:
+                    continue
+                start = time.perf_counter()
+                try:
+                    self.finish(name, *run_stage(name, *launched))
+                except Exception as e:
+                    print(f"[ERR] Stage '{name}': {e}")
+                    self.finish(name, False, None, time.perf_counter() - start)
+            return self.report(pending)
+
+        with ProcessPoolExecutor(max_workers=self.args.jobs) as pool:
+            running = {}
+            while True:
+                for name in self.ready(pending):
+                    pending.remove(name)
+                    launched = self.launch(name)
+                    if launched is not None:
+                        running[pool.submit(run_stage, name, *launched)] = (name, time.perf_counter())
+                        self.running.add(name)
+                if not running:
+                    # Either everything is done, or the rest is blocked by a failure
+                    if not self.ready(pending):
+                        break
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, start = running.pop(future)
+                    self.running.discard(name)
+                    try:
+                        self.finish(name, *future.result())
+                    except Exception as e:
+                        print(f"[ERR] Stage '{name}': {e}")
+                        self.finish(name, False, None, time.perf_counter() - start)
+        return self.report(pending)
+
+    def report(self, pending):
+        print("\n--- PIPELINE SUMMARY ---")
+        for name, status, seconds in self.summary:
+            print(f"   {name:<10} {status:<8} {seconds:7.1f}s")
+        for name in pending:
+            print(f"   {name:<10} blocked")
+
+        # Each stage writes its own report; this one only records the stage timings
+        for name, status, seconds in self.summary:
+            self.perf.add(name, seconds, status=status)
+        self.perf.finish(quiet=True)
+        return not self.failed and not pending
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run stages 1-5 as one pipeline, skipping unchanged stages")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES),
+                        help="Stages to run (default: all). Unselected dependencies use their existing outputs")
+    parser.add_argument("--force", action="store_true",
+                        help="Run every selected stage even if nothing changed")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only report which stages would run; no stage script is imported")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Run up to N independent stages in parallel processes (default: 1)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                        help="Cleaned_Data/ format for stages 1-3")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Passed to 1_data_parsing.py and 3_calc_severity.py (and 4_logic_plotting_form.py "
+                             "with --render months)")
+    parser.add_argument("--chunksize", type=int, default=0, help="Passed to 1_data_parsing.py")
+    parser.add_argument("--memory-budget", type=int, default=0, metavar="MB", help="Passed to 3_calc_severity.py")
+    parser.add_argument("--incremental", action="store_true", help="Passed to 3_calc_severity.py")
+    parser.add_argument("--online", action="store_true", help="Passed to 3_calc_severity.py")
+    parser.add_argument("--offline", action="store_true", help="Passed to 4_logic_plotting_form.py")
+    parser.add_argument("--geojson", default=None, help="Passed to 4_logic_plotting_form.py")
+    parser.add_argument("--render", choices=["markers", "canvas", "months"], default="markers",
+                        help="Passed to 4_logic_plotting_form.py")
+    parser.add_argument("--heatmap", choices=["client", "raster", "none"], default="client",
+                        help="Passed to 4_logic_plotting_form.py")
+    parser.add_argument("--bands", choices=["zscore", "percentile", "robust"], default="zscore",
+                        help="Severity bands, passed to rollup_cube.py, 4_logic_plotting_form.py and 5_graphs.py")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    start = time.perf_counter()
+    ok = Pipeline(args).run()
+    print(f"\n>>> Pipeline {'finished' if ok else 'FAILED'} in {time.perf_counter() - start:.1f}s")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from perf_utils import track
+from quantile_sketch import GapSketches
+
+# --- 1. CONFIGURATION ---
+# Integer-keyed aggregation for 3_calc_severity.py.
+# Pincodes are direct-indexed (6 digits -> 0..999999) into an int32 code table and
+# months get a small integer code, so Et/Bt/Dt and the transaction counts live in
+# dense arrays [source, pincode code, month code]. No string groupby, no merges.
+PIN_SLOTS = 1000000
+
+# Source order inside the dense arrays
+SOURCE_INDEX = {"enrolment": 0, "biometric": 1, "demographics": 2}
+
+
+# --- 2. PER-FILE REDUCTION ---
+# Sums every value column per (pincode, Month). Pincodes are int32.
+# Integer-valued columns (transaction counts) sum exactly in float64, so aggregating
+# chunk by chunk and then combining gives the same totals as one pass over the file.
+def aggregate(pincodes, months, values):
+    pins = np.asarray(pincodes, dtype=np.int64)
+    month_codes, month_names = pd.factorize(pd.Series(months, dtype=object), sort=True)
+
+    keep = month_codes >= 0  # rows without a Month are dropped, as groupby did
+    pins, month_codes = pins[keep], month_codes[keep]
+
+    n_months = max(len(month_names), 1)
+    keys, inverse = np.unique(pins * n_months + month_codes, return_inverse=True)
+    out = pd.DataFrame({
+        'pincode': (keys // n_months).astype(np.int32),
+        'Month': np.asarray(month_names, dtype=object)[keys % n_months],
+    })
+    for name, column in values.items():
+        column = np.asarray(column, dtype=np.float64)[keep]
+        out[name] = np.bincount(inverse, weights=column, minlength=len(keys))
+    return out
+
+
+# --- 3. THE ENGINE ---
+class SeverityEngine:
+    def __init__(self, month_weights):
+        self.month_weights = month_weights
+        self.pin_code = np.full(PIN_SLOTS, -1, dtype=np.int32)
+        self.pins = np.empty(0, dtype=np.int32)   # code -> pincode
+        self.month_code = {}                       # name -> code
+        self.months = []                           # code -> name
+        self.score = np.zeros((3, 0, 0))
+        self.count = np.zeros((3, 0, 0))
+
+    def _grow(self, n_pins, n_months):
+        pin_cap, month_cap = self.score.shape[1], self.score.shape[2]
+        if n_pins <= pin_cap and n_months <= month_cap:
+            return
+        new_pin_cap = max(n_pins, pin_cap * 2, 1024)
+        new_month_cap = max(n_months, month_cap, 16)
+        for name in ('score', 'count'):
+            old = getattr(self, name)
+            new = np.zeros((3, new_pin_cap, new_month_cap))
+            new[:, :pin_cap, :month_cap] = old
+            setattr(self, name, new)
+
+    # Adds scored rows (or per-file partials) for one source in a single pass
+    def add(self, f_type, pincodes, months, score, txn_count):
+        src = SOURCE_INDEX[f_type]
+        pins = np.asarray(pincodes, dtype=np.int64)
+        month_idx, month_names = pd.factorize(pd.Series(months, dtype=object))
+
+        keep = (month_idx >= 0) & (pins >= 0) & (pins < PIN_SLOTS)
+        pins, month_idx = pins[keep], month_idx[keep]
+        score = np.asarray(score, dtype=np.float64)[keep]
+        txn_count = np.asarray(txn_count, dtype=np.float64)[keep]
+        if len(pins) == 0:
+            return
+
+        # Register unseen pincodes and months
+        codes = self.pin_code[pins]
+        if (codes < 0).any():
+            new_pins = np.unique(pins[codes < 0]).astype(np.int32)
+            self.pin_code[new_pins] = np.arange(len(self.pins), len(self.pins) + len(new_pins))
+            self.pins = np.concatenate([self.pins, new_pins])
+            codes = self.pin_code[pins]
+        self.register_months(month_names)
+        month_codes = np.array([self.month_code[name] for name in month_names], dtype=np.int64)[month_idx]
+
+        self._grow(len(self.pins), len(self.months))
+        pin_cap, month_cap = self.score.shape[1], self.score.shape[2]
+        flat = codes.astype(np.int64) * month_cap + month_codes
+        size = pin_cap * month_cap
+        self.score[src] += np.bincount(flat, weights=score, minlength=size).reshape(pin_cap, month_cap)
+        self.count[src] += np.bincount(flat, weights=txn_count, minlength=size).reshape(pin_cap, month_cap)
+
+    def add_partial(self, f_type, partial):
+        self.add(f_type, partial['pincode'].to_numpy(), partial['Month'].to_numpy(),
+                 partial['score'].to_numpy(), partial['txn_count'].to_numpy())
+
+    # Aggregated score per (pincode, Month) of each source, for the distribution
+    # sketches. Only cells where the source scored: how the rows were split across
+    # files does not matter, and zero cells add nothing to the load.
+    def source_scores(self):
+        n, m = len(self.pins), len(self.months)
+        for f_type, src in SOURCE_INDEX.items():
+            cells = self.score[src, :n, :m]
+            yield f_type, cells[cells != 0]
+
+    # Dense views, rows in ascending pincode order, months in name order
+    def _dense(self):
+        n, m = len(self.pins), len(self.months)
+        pin_order = np.argsort(self.pins, kind='stable')
+        month_order = np.argsort(np.array(self.months, dtype=object), kind='stable')
+        score = self.score[:, :n, :m][:, pin_order][:, :, month_order]
+        count = self.count[:, :n, :m][:, pin_order][:, :, month_order]
+        months = [self.months[i] for i in month_order]
+        return self.pins[pin_order], months, score, count
+
+    # raw_load_t per (pincode, month); cells with no transactions are 0
+    def raw_loads(self):
+        pins, months, score, count = self._dense()
+        Et, Bt, Dt = score[0], score[1], score[2]
+        Nt = count[0] + count[1] + count[2]
+
+        # Formula: (1*Et + 1.2*Dt + 1.5*Bt) / (3 + 1/3 * Nt)
+        numerator = (1.0 * Et) + (1.2 * Dt) + (1.5 * Bt)
+        denominator = 3.0 + (Nt / 3.0)
+        return pins, months, numerator / denominator, Nt
+
+    # Months every shard must carry, so shard arrays have the same columns as a
+    # single engine that saw all the data
+    def register_months(self, names):
+        for name in names:
+            if name not in self.month_code:
+                self.month_code[name] = len(self.months)
+                self.months.append(name)
+
+    # Per-pincode EMA (pincodes ascending) and Nt, before any global statistics
+    def ema(self, report=None):
+        with track(report, "raw_load") as step:
+            pins, months, raw_load_t, Nt = self.raw_loads()
+            step.rows_out = raw_load_t.size
+
+        # Weighted EMA: unknown month names get weight 1 (as before)
+        with track(report, "ema", rows_in=raw_load_t.size) as step:
+            Wt = np.array([self.month_weights.get(name, 1) for name in months], dtype=np.float64)
+            ema = (raw_load_t * Wt).sum(axis=1)
+            step.rows_out = len(ema)
+        # Kept for save_monthly_loads (rollup cube month breakdowns)
+        self.monthly = (pins, months, raw_load_t, Nt)
+        return pins, ema, Nt
+
+    # report: optional perf_utils.RunReport that gets one step per phase
+    def result(self, report=None):
+        pins, ema, Nt = self.ema(report)
+        final_ema = ema_frame(pins, ema)
+
+        with track(report, "z_score", rows_in=len(final_ema)) as step:
+            final_ema['z_score'] = standard_scale(ema)
+            step.rows_out = len(final_ema)
+
+        self.max_nt = float(Nt.max()) if Nt.size else 0.0
+        return final_ema
+
+
+# Empty input (every file empty or filtered out) gives an empty frame with the same
+# columns; np.char.zfill cannot size a zero-length array
+def ema_frame(pins, ema):
+    pins = np.asarray(pins)
+    codes = np.char.zfill(pins.astype(str), 6) if len(pins) else np.empty(0, dtype='<U6')
+    return pd.DataFrame({
+        'pincode': codes,
+        'EMA_i': np.asarray(ema, dtype=np.float64).reshape(len(pins)),
+    })
+
+
+# --- 4. SHARDED EXECUTION ---
+# Pincodes do not interact until the z-score, so the engine work splits by postal
+# zone (the first pincode digit). Each zone runs its own engine and sends back its EMA
+# array; the parent concatenates them and standardizes the whole array with
+# standard_scale, exactly as a single engine does.
+N_ZONES = 10
+
+
+def pincode_zone(pincodes):
+    return np.asarray(pincodes) // 100000
+
+
+# Bit-for-bit the z-scores of StandardScaler().fit_transform on one column, without
+# importing scikit-learn: sum along axis 0 of an (n, 1) array, the corrected two-pass
+# variance, and scale 1 for columns that are constant within rounding error.
+def standard_scale(values):
+    X = np.asarray(values, dtype=np.float64).reshape(-1, 1)
+    n = X.shape[0]
+    if n == 0:
+        return np.empty(0)
+    mean = X.sum(axis=0) / n
+    temp = X - mean
+    correction = temp.sum(axis=0)
+    var = ((temp ** 2).sum(axis=0) - correction ** 2 / n) / n
+    eps = np.finfo(np.float64).eps
+    scale = np.sqrt(var)
+    scale[var <= n * eps * var + (n * mean * eps) ** 2] = 1.0
+    return ((X - mean) / scale).ravel()
+
+
+# Worker for one zone. parts: [(f_type, partial)] in the single-engine order, months:
+# every month seen in any zone. Returns pins, EMA, max Nt, the zone's
+# (raw load, Nt) per month, its EMA and source score sketches (GapSketches) and seconds.
+def zone_ema(month_weights, months, parts):
+    start = time.perf_counter()
+    engine = SeverityEngine(month_weights)
+    engine.register_months(months)
+    for f_type, part in parts:
+        engine.add_partial(f_type, part)
+    pins, ema, Nt = engine.ema()
+    max_nt = float(Nt.max()) if Nt.size else 0.0
+    _, _, raw_load_t, _ = engine.monthly
+    sketches = GapSketches()
+    sketches.ema.add(ema)
+    for f_type, scores in engine.source_scores():
+        sketches.add_scores(f_type, scores)
+    return pins, ema, max_nt, (raw_load_t, Nt), sketches, time.perf_counter() - start
+
+
+# --- 5. MONTHLY LOADS ---
+# raw_load_t and Nt per (pincode, month), written next to the gap analysis so the
+# rollup cube (rollup_cube.py) can break results down by month without re-reading
+# any input file. Months are names (batch) or YYYY-MM periods (--online).
+MONTHLY_LOADS_PATH = os.path.join("Cleaned_Data", "monthly_loads.npz")
+
+
+def save_monthly_loads(pins, months, raw_load, nt, path=MONTHLY_LOADS_PATH):
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, pins=np.asarray(pins, dtype=np.int32), months=np.asarray(months, dtype=str),
+             raw_load=np.asarray(raw_load, dtype=np.float64), nt=np.asarray(nt, dtype=np.float64))
+    os.replace(tmp_path, path)
+
+
+# (pins, months, raw_load [pins, months], nt [pins, months]) or None
+def load_monthly_loads(path=MONTHLY_LOADS_PATH):
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        return data['pins'], list(data['months']), data['raw_load'], data['nt']
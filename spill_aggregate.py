@@ -0,0 +1,103 @@
+import os
+import glob
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from severity_engine import aggregate
+
+# --- 1. CONFIGURATION ---
+# Out-of-core (pincode, Month) aggregation for inputs larger than RAM.
+# A file is streamed in chunks sized from the memory budget. Each chunk is
+# pre-aggregated, and the aggregates are buffered; when the buffer outgrows its
+# share of the budget it is spilled to disk, partitioned by pincode prefix:
+#   Cleaned_Data/.spill/agg-XXXX/prefix=<NN>/piece_<n>.npz
+# The final reduce then loads one prefix partition at a time. The value columns
+# are transaction counts, which sum exactly, so the totals are identical to
+# aggregating the whole file in memory.
+SPILL_DIR = os.path.join("Cleaned_Data", ".spill")
+PREFIX_DIVISOR = 10000  # first two pincode digits -> 90 partitions
+
+# A cleaned chunk briefly exists in several copies (string ops, numeric columns)
+WORKING_COPIES = 4
+BUFFER_SHARE = 0.25  # share of the budget for buffered aggregates
+MIN_CHUNK_ROWS = 10000
+
+
+def chunk_rows_for_budget(sample, budget_mb):
+    # Rows per chunk so a chunk and its working copies stay inside the budget
+    bytes_per_row = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+    rows = int(budget_mb * 1024 * 1024 * (1 - BUFFER_SHARE) / (bytes_per_row * WORKING_COPIES))
+    return max(rows, MIN_CHUNK_ROWS)
+
+
+def combine(frames, value_columns):
+    frame = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    return aggregate(frame['pincode'].to_numpy(), frame['Month'].to_numpy(),
+                     {col: frame[col].to_numpy() for col in value_columns})
+
+
+# --- 2. SPILLING AGGREGATOR ---
+class SpillAggregator:
+    def __init__(self, value_columns, budget_mb, spill_root=SPILL_DIR):
+        self.value_columns = list(value_columns)
+        self.buffer_limit = budget_mb * 1024 * 1024 * BUFFER_SHARE
+        self.spill_root = spill_root
+        self.dir = None
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.pieces = 0
+
+    # counts: output of severity_engine.aggregate for one chunk
+    def add(self, counts):
+        if counts.empty:
+            return
+        self.buffer.append(counts)
+        self.buffered_bytes += counts.memory_usage(deep=True).sum()
+        if self.buffered_bytes > self.buffer_limit:
+            self.spill()
+
+    def spill(self):
+        if not self.buffer:
+            return
+        if self.dir is None:
+            os.makedirs(self.spill_root, exist_ok=True)
+            self.dir = tempfile.mkdtemp(prefix="agg-", dir=self.spill_root)
+        combined = combine(self.buffer, self.value_columns)
+        prefixes = combined['pincode'].to_numpy() // PREFIX_DIVISOR
+        for prefix in np.unique(prefixes):
+            part = combined[prefixes == prefix]
+            folder = os.path.join(self.dir, f"prefix={prefix:02d}")
+            os.makedirs(folder, exist_ok=True)
+            np.savez(
+                os.path.join(folder, f"piece_{self.pieces}.npz"),
+                pincode=part['pincode'].to_numpy(dtype=np.int32),
+                Month=part['Month'].to_numpy(dtype=str),
+                **{col: part[col].to_numpy(dtype=np.float64) for col in self.value_columns},
+            )
+        self.pieces += 1
+        self.buffer = []
+        self.buffered_bytes = 0
+
+    def result(self):
+        # Everything fitted in the buffer: no disk round trip at all
+        if self.dir is None:
+            if not self.buffer:
+                return None
+            return combine(self.buffer, self.value_columns)
+
+        self.spill()
+        try:
+            out = []
+            for folder in sorted(glob.glob(os.path.join(self.dir, "prefix=*"))):
+                frames = []
+                for path in sorted(glob.glob(os.path.join(folder, "*.npz"))):
+                    with np.load(path, allow_pickle=False) as data:
+                        frames.append(pd.DataFrame({col: data[col] for col in data.files}))
+                out.append(combine(frames, self.value_columns))
+            return pd.concat(out, ignore_index=True)
+        finally:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            self.dir = None